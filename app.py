@@ -21,9 +21,19 @@ from routes import (
     chatProxy_bp
 )
 
+from model.indexes import ensure_indexes
+from model import mongo_instrumentation
+from utils import identity
+
 app = Flask(__name__)
 app.secret_key = os.urandom(24)  # Secret key for session management
 
+# Count Mongo round trips per request and report them via Server-Timing
+mongo_instrumentation.init_app(app)
+
+# Memoize the signed-in user's profile/study data/ACL per request and report memo hits
+identity.init_app(app)
+
 # Register blueprints with sensible URL prefixes per feature
 # auth kept at root to preserve /login and /logout paths
 app.register_blueprint(auth_bp)
@@ -40,6 +50,16 @@ app.register_blueprint(streak_bp, url_prefix='/streak')
 app.register_blueprint(timer_bp, url_prefix='/timer')
 app.register_blueprint(chatProxy_bp, url_prefix='/api/chat-proxy')
 
+# Create/drop MongoDB indexes on startup (no-op once the stored version is current).
+# Set MONGO_ENSURE_INDEXES=0 to leave it to `python -m model.indexes`.
+if os.environ.get('MONGO_ENSURE_INDEXES', '1') != '0':
+    try:
+        for _name, _res in ensure_indexes().items():
+            for _err in _res['errors']:
+                print(f"ensure_indexes: {_name}: {_err}")
+    except Exception as e:
+        print(f"ensure_indexes: skipped ({e})")
+
 
 
 
@@ -52,4 +72,8 @@ def index():
 
 
 if __name__ == '__main__':
+    from model.maintenance import start_jobs
+    # the debug reloader runs this file twice; only the serving child starts jobs
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_jobs()
     app.run(debug=True, port=5000)
\ No newline at end of file
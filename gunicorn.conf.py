@@ -0,0 +1,30 @@
+"""Gunicorn settings: `gunicorn -c gunicorn.conf.py app:app`.
+
+Each worker builds its own MongoDB pool after fork (see model/mongo.py) and
+opens MONGO_MIN_POOL_SIZE connections before it starts taking requests, so
+recycled workers do not all open sockets on their first request.
+"""
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', '2'))
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+preload_app = True
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', '0'))
+
+
+def post_worker_init(worker):
+    from model.mongo import warm_up
+    from model.maintenance import start_jobs
+    opened = warm_up()
+    worker.log.info("mongo pool warmed with %s connection(s)", opened)
+    # background threads do not survive fork, so jobs start per worker
+    jobs = start_jobs()
+    if jobs:
+        worker.log.info("maintenance jobs started: %s", ", ".join(jobs))
+
+
+def worker_exit(server, worker):
+    from model.mongo import close_client
+    close_client()
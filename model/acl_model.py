@@ -0,0 +1,244 @@
+"""Materialized per-user deck access-control lists.
+
+Each user's ACL is a small dict of deck_id sets::
+
+    {'owner': {...}, 'editor': {...}, 'reviewer': {...}, 'exists': bool}
+
+built from one indexed query over `user_permissions` and cached per
+process.  Decks shared with the "all" wildcard are kept once in a shared
+wildcard ACL (loaded lazily on first use) instead of being copied into
+every user's sets.
+
+The permission writers in studyData_model (and account creation and
+deletion in login_model) call the `on_*` hooks, which bump a per-user
+stamp in `acl_versions` ({'_id': username, 'v': n}; the wildcard ACL
+uses the 'all' key).  Every check reads the user's and the
+wildcard's stamps in one `_id` lookup and reloads a cached ACL whose stamp
+no longer matches, so a revocation made on any worker applies to the very
+next check everywhere.  Entries also expire after ``ACL_CACHE_TTL``
+seconds (default 30) as a backstop.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from .mongo import get_db
+
+_db = get_db()
+_profiles_col = _db.profiles
+_permissions_col = _db.user_permissions
+_versions_col = _db.acl_versions
+
+WILDCARD = 'all'
+ROLES = ('owner', 'editor', 'reviewer')
+
+ACL_CACHE_TTL = float(os.environ.get('ACL_CACHE_TTL', '30'))
+ACL_CACHE_SIZE = int(os.environ.get('ACL_CACHE_SIZE', '10000'))
+
+_lock = threading.Lock()
+_cache: "OrderedDict[str, Dict]" = OrderedDict()
+_wildcard: Optional[Dict] = None
+
+
+def _role(field: str) -> Optional[str]:
+    """Map a permission-doc field ('editors', 'reviewers', 'owner') to an ACL role."""
+    f = (field or '').lower()
+    if f in ('editor', 'editors'):
+        return 'editor'
+    if f in ('reviewer', 'reviewers'):
+        return 'reviewer'
+    if f == 'owner':
+        return 'owner'
+    return None
+
+
+def _empty() -> Dict:
+    return {'owner': set(), 'editor': set(), 'reviewer': set(), 'exists': True, 'loaded': time.monotonic()}
+
+
+def _valid(acl: Optional[Dict], stamp: int) -> bool:
+    return acl is not None and acl['v'] == stamp and time.monotonic() - acl['loaded'] < ACL_CACHE_TTL
+
+
+def _stamps(names: Iterable[str]) -> Dict[str, int]:
+    """Current ACL stamps for `names` (0 for users whose access never changed)."""
+    return {d['_id']: d.get('v', 0) for d in _versions_col.find({'_id': {'$in': list(names)}})}
+
+
+def _bump(names: Iterable[str]) -> None:
+    names = [n for n in dict.fromkeys(names) if n]
+    if not names:
+        return
+    _versions_col.bulk_write([UpdateOne({'_id': n}, {'$inc': {'v': 1}}, upsert=True) for n in names], ordered=False)
+
+
+def _load_user(username: str) -> Dict:
+    acl = _empty()
+    acl['exists'] = _profiles_col.find_one({'username': username}, {'_id': 1}) is not None
+    docs = _permissions_col.find(
+        {'$or': [{'reviewers': username}, {'editors': username}, {'owner': username}]},
+        {'_id': 0, 'deck_id': 1, 'reviewers': 1, 'editors': 1, 'owner': 1},
+    )
+    for d in docs:
+        did = d.get('deck_id')
+        if not did:
+            continue
+        if username in (d.get('reviewers') or []):
+            acl['reviewer'].add(did)
+        if username in (d.get('editors') or []):
+            acl['editor'].add(did)
+        if d.get('owner') == username:
+            acl['owner'].add(did)
+    return acl
+
+
+def _load_wildcard() -> Dict:
+    acl = _empty()
+    docs = _permissions_col.find(
+        {'$or': [{'reviewers': WILDCARD}, {'editors': WILDCARD}]},
+        {'_id': 0, 'deck_id': 1, 'reviewers': 1, 'editors': 1},
+    )
+    for d in docs:
+        did = d.get('deck_id')
+        if not did:
+            continue
+        if WILDCARD in (d.get('reviewers') or []):
+            acl['reviewer'].add(did)
+        if WILDCARD in (d.get('editors') or []):
+            acl['editor'].add(did)
+    return acl
+
+
+def _newer(fresh: Dict, cached: Optional[Dict]) -> bool:
+    return cached is None or cached['v'] <= fresh['v']
+
+
+def _acls(username: str) -> Tuple[Dict, Dict]:
+    """Return (user ACL, wildcard ACL), reloading whichever is stale.
+
+    Stamps are read before loading, so a change that lands mid-load leaves
+    a mismatched stamp and is picked up by the next check.  Loads run
+    outside the lock (a miss never blocks other threads' checks); a loaded
+    ACL is installed only if no entry with a newer stamp got there first.
+    """
+    global _wildcard
+    stamps = _stamps([username, WILDCARD])
+    user_v, wild_v = stamps.get(username, 0), stamps.get(WILDCARD, 0)
+    with _lock:
+        acl = _cache.get(username)
+        if _valid(acl, user_v):
+            _cache.move_to_end(username)
+        else:
+            acl = None
+        wild = _wildcard if _valid(_wildcard, wild_v) else None
+    if acl is not None and wild is not None:
+        return acl, wild
+
+    if acl is None:
+        acl = _load_user(username)
+        acl['v'] = user_v
+    if wild is None:
+        wild = _load_wildcard()
+        wild['v'] = wild_v
+    with _lock:
+        if _newer(acl, _cache.get(username)):
+            _cache[username] = acl
+            _cache.move_to_end(username)
+            while len(_cache) > ACL_CACHE_SIZE:
+                _cache.popitem(last=False)
+        if _newer(wild, _wildcard):
+            _wildcard = wild
+    return acl, wild
+
+
+def _holds(acl: Dict, wild: Dict, sid: str, role: str) -> bool:
+    if not acl['exists']:
+        return False
+    if sid in acl[role]:
+        return True
+    return role != 'owner' and sid in wild[role]
+
+
+def can_edit(username: str, deck_id) -> bool:
+    if not username:
+        return False
+    acl, wild = _acls(username)
+    sid = str(deck_id)
+    return _holds(acl, wild, sid, 'owner') or _holds(acl, wild, sid, 'editor')
+
+
+def can_review(username: str, deck_id) -> bool:
+    if not username:
+        return False
+    acl, wild = _acls(username)
+    sid = str(deck_id)
+    return _holds(acl, wild, sid, 'owner') or _holds(acl, wild, sid, 'reviewer')
+
+
+def get_permissions(username: str):
+    """Deck id lists per role, with wildcard decks expanded, or False for unknown users."""
+    if not username:
+        return False
+    acl, wild = _acls(username)
+    if not acl['exists']:
+        return False
+    return {
+        'reviewer': list(acl['reviewer'] | wild['reviewer']),
+        'editor': list(acl['editor'] | wild['editor']),
+        'owner': list(acl['owner']),
+    }
+
+
+def _changed(usernames: Iterable[str]) -> None:
+    """Record an access change: bump the stamps every worker checks and drop local copies."""
+    global _wildcard
+    names = [u for u in usernames if u]
+    with _lock:
+        for u in names:
+            if u == WILDCARD:
+                _wildcard = None
+            else:
+                _cache.pop(u, None)
+    _bump(names)
+
+
+def on_grant(deck_id, field: str, username: str) -> None:
+    if _role(field) and username:
+        _changed([username])
+
+
+def on_revoke(deck_id, field: str, username: str) -> None:
+    if _role(field) and username:
+        _changed([username])
+
+
+def on_deck_created(deck_id, owner, reviewers=None, editors=None) -> None:
+    _changed([owner, *(reviewers or []), *(editors or [])])
+
+
+def on_deck_deleted(deck_id, members=None) -> None:
+    """`members`: everyone named on the deck's permission doc before it was deleted."""
+    _changed(members or [])
+
+
+def on_user_changed(username: str) -> None:
+    """A user was created or deleted: every worker reloads (or forgets) their ACL."""
+    if username:
+        _changed([username])
+
+
+def invalidate(username: Optional[str] = None) -> None:
+    """Drop one user's cached ACL, or everything when `username` is None."""
+    global _wildcard
+    with _lock:
+        if username is None:
+            _cache.clear()
+            _wildcard = None
+        elif username == WILDCARD:
+            _wildcard = None
+        else:
+            _cache.pop(username, None)
@@ -0,0 +1,163 @@
+"""Atomic id allocation backed by a `counters` collection.
+
+Each sequence is one document ``{'_id': name, 'seq': last_issued}`` bumped
+with ``find_one_and_update`` + ``$inc``, so concurrent requests never hand
+out the same id.  Sequences in use:
+
+- ``decks``: deck ids
+- ``users``: profile ids
+- ``cards:<deck_id>``: card ids within one deck
+
+A sequence that does not exist yet is seeded from the data it guards (the
+current max numeric id) the first time it is used; `backfill_counters()`
+does the same for every sequence up front:
+
+    python -m model.counters_model --backfill
+"""
+import argparse
+import os
+import threading
+from typing import Dict, List, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from .mongo import get_db
+
+_db = get_db()
+_counters_col = _db.counters
+_decks_col = _db.decks
+_cards_col = _db.cards
+_profiles_col = _db.profiles
+
+DECKS = 'decks'
+USERS = 'users'
+
+# per-process blocks: name -> [next id to hand out, last id reserved]
+_blocks: Dict[str, List[int]] = {}
+_lock = threading.Lock()
+
+
+def card_seq(deck_id) -> str:
+    return f'cards:{deck_id}'
+
+
+def _numeric_max(col, match: Dict, field: str = 'id') -> int:
+    """Largest integer value of `field` among documents matching `match` (0 if none)."""
+    pipeline = [
+        {'$match': match},
+        {'$group': {'_id': None, 'max': {'$max': {
+            '$convert': {'input': f'${field}', 'to': 'long', 'onError': 0, 'onNull': 0},
+        }}}},
+    ]
+    doc = next(col.aggregate(pipeline), None)
+    return int(doc['max']) if doc and doc.get('max') else 0
+
+
+def _current_max(name: str) -> int:
+    if name == DECKS:
+        return _numeric_max(_decks_col, {})
+    if name == USERS:
+        # older profiles were numbered by document count; never go below it
+        return max(_numeric_max(_profiles_col, {}), _profiles_col.estimated_document_count())
+    if name.startswith('cards:'):
+        return _numeric_max(_cards_col, {'deck_id': name[len('cards:'):]})
+    return 0
+
+
+def observe_id(name: str, value) -> None:
+    """Make sure sequence `name` never issues `value` or anything below it."""
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return
+    _counters_col.update_one({'_id': name}, {'$max': {'seq': value}}, upsert=True)
+
+
+def _seed(name: str) -> None:
+    try:
+        _counters_col.update_one({'_id': name}, {'$max': {'seq': _current_max(name)}}, upsert=True)
+    except DuplicateKeyError:
+        # another worker created it between our update and upsert; its value is fine
+        pass
+
+
+def reserve_ids(name: str, count: int = 1) -> range:
+    """Reserve `count` consecutive ids from sequence `name` in one round trip."""
+    count = max(1, int(count))
+    doc = _counters_col.find_one_and_update(
+        {'_id': name}, {'$inc': {'seq': count}}, return_document=ReturnDocument.AFTER,
+    )
+    if doc is None:
+        _seed(name)
+        doc = _counters_col.find_one_and_update(
+            {'_id': name}, {'$inc': {'seq': count}}, upsert=True, return_document=ReturnDocument.AFTER,
+        )
+    last = int(doc['seq'])
+    return range(last - count + 1, last + 1)
+
+
+def next_id(name: str, block_size: int = 1) -> int:
+    """Return the next id from `name`.
+
+    With `block_size` > 1 this worker reserves ids in blocks and serves them
+    locally, trading gaps in the sequence for fewer round trips.
+    """
+    if block_size <= 1:
+        return reserve_ids(name, 1)[0]
+    with _lock:
+        block = _blocks.get(name)
+        if not block or block[0] > block[1]:
+            reserved = reserve_ids(name, block_size)
+            block = _blocks[name] = [reserved.start, reserved.stop - 1]
+        nid = block[0]
+        block[0] += 1
+        return nid
+
+
+def drop_sequence(name: str) -> None:
+    """Remove a sequence (e.g. the card counter of a deleted deck)."""
+    _counters_col.delete_one({'_id': name})
+    with _lock:
+        _blocks.pop(name, None)
+
+
+def backfill_counters() -> Dict[str, int]:
+    """Seed every sequence from existing data; safe to run repeatedly."""
+    seeds = {DECKS: _current_max(DECKS), USERS: _current_max(USERS)}
+    per_deck = _cards_col.aggregate([
+        {'$group': {'_id': '$deck_id', 'max': {'$max': {
+            '$convert': {'input': '$id', 'to': 'long', 'onError': 0, 'onNull': 0},
+        }}}},
+    ])
+    for row in per_deck:
+        if row.get('_id') is not None:
+            seeds[card_seq(row['_id'])] = int(row.get('max') or 0)
+    ops = [UpdateOne({'_id': name}, {'$max': {'seq': seq}}, upsert=True) for name, seq in seeds.items()]
+    _counters_col.bulk_write(ops, ordered=False)
+    return seeds
+
+
+def _reset_blocks_after_fork() -> None:
+    # a forked worker must not reuse ids its parent already reserved
+    global _lock
+    _lock = threading.Lock()
+    _blocks.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_blocks_after_fork)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Manage id sequences in the counters collection.')
+    parser.add_argument('--backfill', action='store_true', help='seed every sequence from existing data')
+    args = parser.parse_args(argv)
+    if args.backfill:
+        for name, seq in sorted(backfill_counters().items()):
+            print(f'{name}: {seq}')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
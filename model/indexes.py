@@ -0,0 +1,225 @@
+"""Central index declarations and migration runner for every collection.
+
+Every index a model query relies on is declared in `INDEXES`.  Bump
+`INDEX_VERSION` whenever the declarations change; `ensure_indexes()` then
+creates the missing ones, drops indexes that are no longer declared and
+records the applied version in the `_migrations` collection so later
+startups skip the work.
+
+Run at startup (see app.py) or from the command line:
+
+    python -m model.indexes            # apply if the stored version is behind
+    python -m model.indexes --force    # re-check every collection
+    python -m model.indexes --report   # print index sizes only
+"""
+import argparse
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure, PyMongoError
+
+from .mongo import get_db
+
+INDEX_VERSION = 7
+
+_MIGRATIONS_COL = '_migrations'
+_MIGRATION_ID = 'indexes'
+
+# (keys, options) per collection; names follow pymongo's default `field_dir` scheme
+INDEXES: Dict[str, List[Tuple[List[Tuple[str, int]], Dict]]] = {
+    'profiles': [
+        ([('username', ASCENDING)], {'unique': True}),
+    ],
+    'authentication': [
+        ([('username', ASCENDING)], {'unique': True}),
+    ],
+    'relationships': [
+        ([('follower', ASCENDING), ('following', ASCENDING)], {'unique': True}),
+        ([('following', ASCENDING)], {}),
+    ],
+    'user_permissions': [
+        ([('username', ASCENDING), ('deck_id', ASCENDING)], {'unique': True}),
+        ([('deck_id', ASCENDING)], {}),
+        ([('owner', ASCENDING)], {}),
+        # multikey: array membership lookups for sharing / "all" wildcard
+        ([('reviewers', ASCENDING)], {}),
+        ([('editors', ASCENDING)], {}),
+    ],
+    'decks': [
+        ([('id', ASCENDING)], {'unique': True}),
+        ([('owner', ASCENDING)], {}),
+    ],
+    'cards': [
+        ([('deck_id', ASCENDING), ('id', ASCENDING)], {'unique': True}),
+        # deck deltas: cards written after a given deck version
+        ([('deck_id', ASCENDING), ('v', ASCENDING)], {}),
+    ],
+    'card_tombstones': [
+        ([('deck_id', ASCENDING), ('v', ASCENDING)], {}),
+    ],
+    'card_progress': [
+        ([('user', ASCENDING), ('deck_id', ASCENDING), ('card_id', ASCENDING)], {'unique': True}),
+        # SM-2 due queue: range scans on due_at within one user's deck(s)
+        ([('user', ASCENDING), ('deck_id', ASCENDING), ('due_at', ASCENDING)], {}),
+        # newest write per user and deck: cache marker for per-user deck stats
+        ([('user', ASCENDING), ('deck_id', ASCENDING), ('updated_at', ASCENDING)], {}),
+        # cleanup when cards or decks are deleted
+        ([('deck_id', ASCENDING), ('card_id', ASCENDING)], {}),
+    ],
+    'token_revocations': [
+        # TTL: an entry is dropped once no token it matches can still be valid
+        ([('until', ASCENDING)], {'expireAfterSeconds': 0}),
+        # workers poll for revocations written since their last look
+        ([('created', ASCENDING)], {}),
+    ],
+    'review_events': [
+        # append-only; only the rollup job reads it, by time range
+        ([('ts', ASCENDING)], {}),
+    ],
+    'review_daily': [
+        ([('scope', ASCENDING), ('key', ASCENDING), ('day', ASCENDING)], {}),
+    ],
+    'deck_tags': [
+        ([('deck_id', ASCENDING), ('tag', ASCENDING)], {}),
+    ],
+    'ai_generation_logs': [
+        ([('created_at', DESCENDING)], {}),
+        ([('user', ASCENDING), ('created_at', DESCENDING)], {}),
+    ],
+    'posts': [
+        ([('timestamp', DESCENDING)], {}),
+        ([('author', ASCENDING)], {}),
+    ],
+    'notes': [
+        ([('title', ASCENDING)], {}),
+        ([('author', ASCENDING)], {}),
+    ],
+    'interactions': [
+        ([('entity_type', ASCENDING), ('entity_id', ASCENDING)], {}),
+    ],
+    'study_sessions': [
+        ([('user', ASCENDING), ('timestamp', DESCENDING)], {}),
+    ],
+}
+
+
+def index_name(keys: List[Tuple[str, int]]) -> str:
+    """Return the default MongoDB name for an index key spec."""
+    return '_'.join(f'{field}_{direction}' for field, direction in keys)
+
+
+def get_applied_version() -> int:
+    doc = get_db()[_MIGRATIONS_COL].find_one({'_id': _MIGRATION_ID}) or {}
+    return int(doc.get('version') or 0)
+
+
+def _sync_collection(name: str, specs, drop_obsolete: bool) -> Dict[str, List[str]]:
+    col = get_db()[name]
+    result = {'created': [], 'dropped': [], 'errors': []}
+    try:
+        existing = {ix['name'] for ix in col.list_indexes()}
+    except PyMongoError as e:
+        result['errors'].append(f'list_indexes: {e}')
+        return result
+
+    wanted = set()
+    for keys, opts in specs:
+        iname = index_name(keys)
+        wanted.add(iname)
+        if iname in existing:
+            continue
+        try:
+            # `background` is ignored by MongoDB >= 4.2 (builds never block) but keeps older servers online
+            col.create_index(keys, name=iname, background=True, **opts)
+            result['created'].append(iname)
+        except OperationFailure as e:
+            result['errors'].append(f'{iname}: {e}')
+
+    if drop_obsolete:
+        for iname in existing - wanted - {'_id_'}:
+            try:
+                col.drop_index(iname)
+                result['dropped'].append(iname)
+            except OperationFailure as e:
+                result['errors'].append(f'drop {iname}: {e}')
+    return result
+
+
+def ensure_indexes(force: bool = False, drop_obsolete: bool = True) -> Dict[str, Dict[str, List[str]]]:
+    """Bring every collection's indexes in line with `INDEXES`.
+
+    Does nothing when the stored version already matches `INDEX_VERSION`
+    unless `force` is set.  Returns a per-collection summary of created,
+    dropped and failed indexes.
+    """
+    if not force and get_applied_version() >= INDEX_VERSION:
+        return {}
+
+    summary = {}
+    for name, specs in INDEXES.items():
+        summary[name] = _sync_collection(name, specs, drop_obsolete)
+
+    if not any(r['errors'] for r in summary.values()):
+        get_db()[_MIGRATIONS_COL].update_one(
+            {'_id': _MIGRATION_ID},
+            {'$set': {'version': INDEX_VERSION, 'applied_at': datetime.utcnow().isoformat()}},
+            upsert=True,
+        )
+    return summary
+
+
+def index_report() -> Dict[str, Dict]:
+    """Return document count and per-index size (bytes) for each managed collection."""
+    report = {}
+    db = get_db()
+    for name in INDEXES:
+        try:
+            stats = next(db[name].aggregate([{'$collStats': {'storageStats': {}}}]), {})
+            storage = stats.get('storageStats') or {}
+        except PyMongoError as e:
+            report[name] = {'error': str(e)}
+            continue
+        report[name] = {
+            'count': storage.get('count', 0),
+            'total_index_size': storage.get('totalIndexSize', 0),
+            'index_sizes': storage.get('indexSizes', {}),
+        }
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Create/drop MongoDB indexes for the BookMe collections.')
+    parser.add_argument('--force', action='store_true', help='re-sync even if the stored version is current')
+    parser.add_argument('--keep-obsolete', action='store_true', help='do not drop undeclared indexes')
+    parser.add_argument('--report', action='store_true', help='only print index sizes')
+    args = parser.parse_args(argv)
+
+    if not args.report:
+        summary = ensure_indexes(force=args.force, drop_obsolete=not args.keep_obsolete)
+        if not summary:
+            print(f'indexes already at version {INDEX_VERSION}')
+        failed = False
+        for name, res in summary.items():
+            for iname in res['created']:
+                print(f'  + {name}.{iname}')
+            for iname in res['dropped']:
+                print(f'  - {name}.{iname}')
+            for err in res['errors']:
+                failed = True
+                print(f'  ! {name}: {err}')
+        if failed:
+            return 1
+
+    for name, info in index_report().items():
+        if 'error' in info:
+            print(f'{name}: {info["error"]}')
+            continue
+        print(f'{name}: {info["count"]} docs, {info["total_index_size"]} bytes of indexes')
+        for iname, size in info['index_sizes'].items():
+            print(f'    {iname}: {size}')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -5,7 +5,9 @@ Functions here now read from split collections (profiles, authentication,
 relationships, user_permissions) instead of a single users collection.
 """
 from .mongo import get_db
-from typing import Optional, Dict, List
+from . import acl_model, progress_model, user_directory
+from .counters_model import USERS, next_id
+from typing import Optional, Dict, Iterable, List
 from datetime import datetime as dt
 from utils.auth import (
     get_current_pepper_version,
@@ -21,22 +23,7 @@ _auth_col = _db.authentication
 _relationships_col = _db.relationships
 _permissions_col = _db.user_permissions
 
-# ensure a unique index on username where possible (best-effort)
-for col in (_profiles_col, _auth_col):
-    try:
-        col.create_index('username', unique=True)
-    except Exception:
-        pass
-
-try:
-    _relationships_col.create_index([('follower', 1), ('following', 1)], unique=True)
-except Exception:
-    pass
-
-try:
-    _permissions_col.create_index([('username', 1), ('deck_id', 1)], unique=True)
-except Exception:
-    pass
+# indexes for these collections are declared in model/indexes.py
 
 
 def create_user(username: str, email: str, password_hash: str, pepper_version: str, name: str) -> bool:
@@ -54,7 +41,7 @@ def create_user(username: str, email: str, password_hash: str, pepper_version: s
         return False
 
     try:
-        nid = str(_profiles_col.estimated_document_count() + 1)
+        nid = str(next_id(USERS))
         profile_doc = {
             'id': nid,
             'username': username,
@@ -72,6 +59,8 @@ def create_user(username: str, email: str, password_hash: str, pepper_version: s
         }
         _profiles_col.insert_one(profile_doc)
         _auth_col.insert_one(auth_doc)
+        acl_model.on_user_changed(username)
+        user_directory.invalidate(username)
         print(f"create_user (login_model): inserted user with id {nid}")
         return True
     except Exception as e:
@@ -135,6 +124,29 @@ def get_user_by_username(username: str) -> Optional[Dict]:
     return None
 
 
+def get_users_by_usernames(usernames: Iterable[str], fields: Iterable[str] = ('profile_pic',)) -> Dict[str, Dict]:
+    """Return {username: profile} for many users with one `$in` query.
+
+    Only `fields` (plus `username`) are read from `profiles`; there is no
+    authentication join.  Unknown usernames are left out of the result.
+    utils.identity.get_profiles adds a request-scoped memo on top.
+    """
+    wanted = set(fields) | {'username'}
+    names = list({u for u in usernames if u})
+    if not names:
+        return {}
+    projection = {f: 1 for f in wanted}
+    projection['_id'] = 0
+    try:
+        return {
+            doc['username']: {f: doc.get(f) for f in wanted}
+            for doc in _profiles_col.find({'username': {'$in': names}}, projection)
+        }
+    except Exception as e:
+        print(f"get_users_by_usernames (login_model): error loading {len(names)} profile(s): {e}")
+        return {}
+
+
 def verify_user(username: str, pepperedPassword: str) -> Optional[Dict]:
     """Verify credentials against the users collection.
 
@@ -150,26 +162,12 @@ def verify_user(username: str, pepperedPassword: str) -> Optional[Dict]:
 
 
 def get_all_users() -> List[Dict]:
-    """Return a list of users for admin/debug uses.
+    """Return every user's public directory entry (id, username, name, profile_pic).
 
-    Note: callers should avoid exposing passwords in production.
+    Served from the cached user directory: one projection-only query per
+    TTL, no per-user authentication lookup, and no password hashes.
     """
-    docs = list(_profiles_col.find({}, {'_id': 0}))
-    out = []
-    for d in docs:
-        auth = _auth_col.find_one({'username': d.get('username')}) or {}
-        out.append(_doc_to_user(d, auth))
-
-    # fallback to in-memory list if DB empty
-    if not out:
-        try:
-            from .login_model import USERS as _USERS  # type: ignore
-            for u in _USERS:
-                out.append({'id': u.get('id'), 'username': u.get('username'), 'email': u.get('email')})
-        except Exception:
-            pass
-
-    return out
+    return [dict(u) for u in user_directory.get_user_directory()]
 
 
 def delete_user_by_username(username: str) -> bool:
@@ -181,7 +179,10 @@ def delete_user_by_username(username: str) -> bool:
         _relationships_col.delete_many({'follower': username})
         _relationships_col.delete_many({'following': username})
         _permissions_col.delete_many({'username': username})
+        progress_model.forget_user(username)
         res = _profiles_col.delete_one({'username': username})
+        acl_model.on_user_changed(username)
+        user_directory.invalidate(username)
         return res.deleted_count > 0
     except Exception as e:
         print(f"delete_user_by_username (login_model): error deleting user: {e}")
@@ -401,6 +402,7 @@ def update_user_profile_pic(username: str, profile_pic_url: Optional[str]) -> bo
         
         # Success if we matched the user (modified_count can be 0 if value was already the same)
         if res.matched_count > 0:
+            user_directory.invalidate(username)
             # Verify the update by reading back
             updated_user = _profiles_col.find_one({'username': username})
             if updated_user:
@@ -0,0 +1,118 @@
+"""Periodic background jobs and their command-line entry point.
+
+Jobs run in a daemon thread per worker process.  Each run first takes a
+lease in the `_jobs` collection, so with several gunicorn workers a job
+still runs once per interval rather than once per worker.
+
+Start them with `start_jobs()` (gunicorn.conf.py does this per worker),
+or run one job by hand:
+
+    python -m model.maintenance reconcile-lengths [--dry-run]
+    python -m model.maintenance review-rollups [--full]
+"""
+import argparse
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from .mongo import get_db
+
+_db = get_db()
+_jobs_col = _db['_jobs']
+
+# name -> (interval seconds env var, default seconds, callable)
+_JOBS: Dict[str, tuple] = {}
+_started = False
+
+
+def register_job(name: str, env_var: str, default_seconds: int, fn: Callable[[], object]) -> None:
+    """Declare a periodic job; an interval of 0 in `env_var` disables it."""
+    _JOBS[name] = (env_var, default_seconds, fn)
+
+
+def _acquire_lease(name: str, interval: int) -> bool:
+    now = datetime.utcnow()
+    try:
+        # matches only when due; otherwise the upsert collides on _id
+        _jobs_col.find_one_and_update(
+            {'_id': name, '$or': [{'next_run': {'$lte': now}}, {'next_run': {'$exists': False}}]},
+            {'$set': {'next_run': now + timedelta(seconds=interval), 'pid': os.getpid()}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # the job doc exists and is not due yet: another worker has the lease
+        return False
+    return True
+
+
+def _loop(name: str, interval: int, fn: Callable[[], object]) -> None:
+    while True:
+        time.sleep(interval)
+        try:
+            if _acquire_lease(name, interval):
+                fn()
+        except Exception as e:
+            print(f"maintenance: job '{name}' failed: {e}")
+
+
+def start_jobs() -> List[str]:
+    """Start every registered job with a non-zero interval; returns their names."""
+    global _started
+    if _started:
+        return []
+    _started = True
+    started = []
+    for name, (env_var, default, fn) in _JOBS.items():
+        try:
+            interval = int(os.environ.get(env_var, default))
+        except ValueError:
+            interval = default
+        if interval <= 0:
+            continue
+        threading.Thread(target=_loop, args=(name, interval, fn), name=f'job-{name}', daemon=True).start()
+        started.append(name)
+    return started
+
+
+def _reconcile_lengths():
+    from .studyData_model import reconcile_deck_lengths
+    drift = reconcile_deck_lengths(fix=True)
+    if drift:
+        print(f"maintenance: repaired card count on {len(drift)} deck(s)")
+    return drift
+
+
+def _rollup_reviews():
+    from .review_log_model import rollup_reviews
+    return rollup_reviews()
+
+
+register_job('reconcile-lengths', 'DECK_LEN_RECONCILE_SECONDS', 3600, _reconcile_lengths)
+register_job('review-rollups', 'REVIEW_ROLLUP_SECONDS', 300, _rollup_reviews)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Run a BookMe maintenance job once.')
+    parser.add_argument('job', choices=sorted(_JOBS))
+    parser.add_argument('--dry-run', action='store_true', help='report without writing (where supported)')
+    parser.add_argument('--full', action='store_true', help='review-rollups: rebuild every day from the first event')
+    args = parser.parse_args(argv)
+    if args.job == 'reconcile-lengths':
+        from .studyData_model import reconcile_deck_lengths
+        for deck_id, (stored, actual) in reconcile_deck_lengths(fix=not args.dry_run).items():
+            print(f'deck {deck_id}: stored={stored!r} actual={actual}')
+        return 0
+    if args.job == 'review-rollups':
+        from .review_log_model import rollup_reviews
+        print(rollup_reviews(full=args.full) or 'no review events')
+        return 0
+    _JOBS[args.job][2]()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,16 +1,317 @@
+"""MongoDB connection manager shared by every model module.
+
+Models grab collection handles at import time (``_db = get_db()`` followed
+by ``_db.profiles`` etc).  Under gunicorn ``--preload`` that import happens
+in the master, so handing out real pymongo objects would leak the master's
+sockets into every forked worker.  Instead ``get_db()`` returns a light
+proxy that resolves the per-process ``MongoClient`` on every access; the
+client itself is dropped after ``fork()`` and rebuilt lazily in the child.
+
+Pool and timeout settings come from the environment:
+
+- ``MONGO_URI`` / ``MONGO_DB``: connection string and database name
+- ``MONGO_MAX_POOL_SIZE`` / ``MONGO_MIN_POOL_SIZE``: pool bounds per worker
+- ``MONGO_MAX_IDLE_TIME_MS``: close pooled connections idle for this long
+- ``MONGO_WAIT_QUEUE_TIMEOUT_MS``: max time a request waits for a connection
+- ``MONGO_CONNECT_TIMEOUT_MS`` / ``MONGO_SOCKET_TIMEOUT_MS``
+- ``MONGO_SERVER_SELECTION_TIMEOUT_MS``
+- ``MONGO_COMPRESSORS``: comma separated wire compressors (e.g. ``zstd,zlib``)
+- ``MONGO_APP_NAME``: reported to the server for log/profiler correlation
+"""
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
 from pymongo import MongoClient
+from pymongo.database import Database
+from pymongo.monitoring import ConnectionCheckOutFailedReason, ConnectionPoolListener
+
+_client: Optional[MongoClient] = None
+_client_pid: Optional[int] = None
+_lock = threading.Lock()
+
+
+def _env_int(name: str, default: Optional[int] = None) -> Optional[int]:
+    raw = os.environ.get(name)
+    if raw is None or raw == '':
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        print(f"mongo: ignoring non-integer {name}={raw!r}")
+        return default
+
+
+def get_client_options() -> Dict[str, Any]:
+    """Return the MongoClient keyword options derived from the environment."""
+    opts: Dict[str, Any] = {
+        'maxPoolSize': _env_int('MONGO_MAX_POOL_SIZE', 50),
+        'minPoolSize': _env_int('MONGO_MIN_POOL_SIZE', 0),
+        'maxIdleTimeMS': _env_int('MONGO_MAX_IDLE_TIME_MS'),
+        'waitQueueTimeoutMS': _env_int('MONGO_WAIT_QUEUE_TIMEOUT_MS'),
+        'connectTimeoutMS': _env_int('MONGO_CONNECT_TIMEOUT_MS', 10000),
+        'socketTimeoutMS': _env_int('MONGO_SOCKET_TIMEOUT_MS'),
+        'serverSelectionTimeoutMS': _env_int('MONGO_SERVER_SELECTION_TIMEOUT_MS', 10000),
+        'appname': os.environ.get('MONGO_APP_NAME') or 'bookme',
+    }
+    compressors = os.environ.get('MONGO_COMPRESSORS')
+    if compressors:
+        opts['compressors'] = compressors
+    return {k: v for k, v in opts.items() if v is not None}
+
+
+class _PoolStats(ConnectionPoolListener):
+    """Connection pool listener keeping cheap counters for `get_pool_stats`."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.open = 0
+            self.checked_out = 0
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.checkout_timeouts = 0
+            self.wait_time_total = 0.0
+            self.wait_time_max = 0.0
+            self.created = 0
+            self.closed = 0
+            self.pool_clears = 0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
 
-_client = None
-_db = None
+    def connection_created(self, event):
+        with self._lock:
+            self.created += 1
+            self.open += 1
 
+    def connection_ready(self, event):
+        pass
 
-def get_db():
-    global _client, _db
-    if _db is not None:
-        return _db
+    def connection_closed(self, event):
+        with self._lock:
+            self.closed += 1
+            self.open = max(0, self.open - 1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+            if event.reason == ConnectionCheckOutFailedReason.TIMEOUT:
+                self.checkout_timeouts += 1
+
+    def connection_checked_out(self, event):
+        waited = float(getattr(event, 'duration', 0.0) or 0.0)
+        with self._lock:
+            self.checked_out += 1
+            self.checkouts += 1
+            self.wait_time_total += waited
+            if waited > self.wait_time_max:
+                self.wait_time_max = waited
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            avg = self.wait_time_total / self.checkouts if self.checkouts else 0.0
+            return {
+                'open': self.open,
+                'checked_out': self.checked_out,
+                'checkouts': self.checkouts,
+                'checkout_failures': self.checkout_failures,
+                'checkout_timeouts': self.checkout_timeouts,
+                'wait_time_total_ms': round(self.wait_time_total * 1000, 3),
+                'wait_time_avg_ms': round(avg * 1000, 3),
+                'wait_time_max_ms': round(self.wait_time_max * 1000, 3),
+                'connections_created': self.created,
+                'connections_closed': self.closed,
+                'pool_clears': self.pool_clears,
+            }
+
+
+_pool_stats = _PoolStats()
+
+
+def _build_client() -> MongoClient:
     uri = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
-    db_name = os.environ.get('MONGO_DB', 'bookme')
-    _client = MongoClient(uri)
-    _db = _client[db_name]
-    return _db
+    listeners = [_pool_stats]
+    from .mongo_instrumentation import ENABLED as _instrument, command_listener
+    if _instrument:
+        listeners.append(command_listener)
+    return MongoClient(uri, event_listeners=listeners, **get_client_options())
+
+
+def get_client() -> MongoClient:
+    """Return the MongoClient owned by the current process, creating it if needed."""
+    global _client, _client_pid
+    pid = os.getpid()
+    client = _client
+    if client is not None and _client_pid == pid:
+        return client
+    with _lock:
+        if _client is None or _client_pid != pid:
+            _client = _build_client()
+            _client_pid = pid
+        return _client
+
+
+def get_db_name() -> str:
+    return os.environ.get('MONGO_DB', 'bookme')
+
+
+class _CollectionProxy:
+    """Stand-in for a pymongo Collection that resolves the live client on each use."""
+
+    __slots__ = ('_db_name', '_name', '_client', '_collection')
+
+    def __init__(self, db_name: str, name: str):
+        self._db_name = db_name
+        self._name = name
+        self._client = None
+        self._collection = None
+
+    def _resolve(self):
+        client = get_client()
+        if client is not self._client:
+            self._collection = client[self._db_name][self._name]
+            self._client = client
+        return self._collection
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def __getattr__(self, attr):
+        return getattr(self._resolve(), attr)
+
+    def __getitem__(self, key):
+        return self._resolve()[key]
+
+    def __repr__(self):
+        return f"<_CollectionProxy {self._db_name}.{self._name}>"
+
+
+class _DatabaseProxy:
+    """Stand-in for a pymongo Database; attribute access yields collection proxies."""
+
+    __slots__ = ('_name',)
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def _resolve(self) -> Database:
+        return get_client()[self._name]
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        # real Database methods/properties (command, list_collection_names, ...)
+        if hasattr(Database, attr):
+            return getattr(self._resolve(), attr)
+        return _CollectionProxy(self._name, attr)
+
+    def __getitem__(self, name: str) -> _CollectionProxy:
+        return _CollectionProxy(self._name, name)
+
+    def __repr__(self):
+        return f"<_DatabaseProxy {self._name}>"
+
+
+_db_proxies: Dict[str, _DatabaseProxy] = {}
+
+
+def get_db(name: Optional[str] = None):
+    """Return the application database.
+
+    The returned object behaves like a pymongo ``Database`` but is safe to
+    cache at import time: every operation goes through `get_client()`, so a
+    forked worker transparently gets its own connection pool.
+    """
+    db_name = name or get_db_name()
+    proxy = _db_proxies.get(db_name)
+    if proxy is None:
+        proxy = _db_proxies.setdefault(db_name, _DatabaseProxy(db_name))
+    return proxy
+
+
+def warm_up(count: Optional[int] = None) -> int:
+    """Open `count` pooled connections (default ``minPoolSize``) right away.
+
+    Meant to run once per worker at boot so the first requests do not all
+    race to open sockets at the same time.  Returns the number of
+    successful pings.
+    """
+    if count is None:
+        count = get_client_options().get('minPoolSize', 0)
+    client = get_client()
+    if count <= 0:
+        return 0
+
+    def _ping(_):
+        try:
+            client.admin.command('ping')
+            return True
+        except Exception as e:
+            print(f"mongo.warm_up: ping failed: {e}")
+            return False
+
+    # concurrent pings force the pool to hold `count` sockets at once
+    with ThreadPoolExecutor(max_workers=count) as pool:
+        return sum(1 for ok in pool.map(_ping, range(count)) if ok)
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Return connection pool counters for this process (checked-out, waits, timeouts)."""
+    stats = _pool_stats.snapshot()
+    opts = get_client_options()
+    stats['pid'] = os.getpid()
+    stats['max_pool_size'] = opts.get('maxPoolSize')
+    stats['min_pool_size'] = opts.get('minPoolSize')
+    stats['connected'] = _client is not None and _client_pid == os.getpid()
+    return stats
+
+
+def close_client() -> None:
+    """Close this process's client (e.g. on worker exit)."""
+    global _client, _client_pid
+    with _lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+
+def _after_fork_in_child() -> None:
+    # never touch the parent's sockets from the child; just forget the client
+    global _client, _client_pid, _lock
+    _client = None
+    _client_pid = None
+    _lock = threading.Lock()
+    _pool_stats._lock = threading.Lock()
+    _pool_stats.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
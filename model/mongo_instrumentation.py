@@ -0,0 +1,139 @@
+"""Per-request MongoDB command instrumentation and slow-query log.
+
+A pymongo ``CommandListener`` (attached to every client built by
+model/mongo.py) counts commands, bytes and server time for the Flask
+request that issued them.  The totals live on ``g.db_stats`` and are sent
+back in a ``Server-Timing`` header by the hooks `init_app` installs.
+
+Commands slower than ``MONGO_SLOW_MS`` (default 100) are printed together
+with the filter shape (values replaced by ``?``) and the issuing route.
+Set ``MONGO_INSTRUMENTATION=0`` to disable the listener entirely.
+Byte counts need every command and reply re-encoded to BSON, which is
+costly on large reads, so they are only collected with
+``MONGO_COUNT_BYTES=1``.
+"""
+import os
+from typing import Any, Dict, Optional
+
+import bson
+from flask import g, has_request_context, request
+from pymongo.monitoring import CommandListener
+
+SLOW_MS = float(os.environ.get('MONGO_SLOW_MS', '100'))
+ENABLED = os.environ.get('MONGO_INSTRUMENTATION', '1') != '0'
+COUNT_BYTES = os.environ.get('MONGO_COUNT_BYTES', '0') == '1'
+
+# where each command keeps the part worth showing in the slow log
+_FILTER_FIELDS = {
+    'find': 'filter',
+    'count': 'query',
+    'distinct': 'query',
+    'findAndModify': 'query',
+    'aggregate': 'pipeline',
+    'update': 'updates',
+    'delete': 'deletes',
+}
+
+
+def _shape(value: Any, depth: int = 0) -> Any:
+    """Strip literal values from a filter so the slow log groups by query shape."""
+    if depth > 6:
+        return '?'
+    if isinstance(value, dict):
+        return {k: _shape(v, depth + 1) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        # operator arrays ($in, $and, ...) keep only the first element's shape
+        return [_shape(value[0], depth + 1)] if value else []
+    return '?'
+
+
+def filter_shape(command_name: str, command: Dict) -> Any:
+    field = _FILTER_FIELDS.get(command_name)
+    if not field:
+        return None
+    value = command.get(field)
+    if command_name in ('update', 'delete') and isinstance(value, list) and value:
+        value = value[0].get('q')
+    if command_name == 'aggregate' and isinstance(value, list):
+        return _shape([stage for stage in value if '$match' in stage or '$lookup' in stage])
+    return _shape(value)
+
+
+def _doc_size(doc) -> int:
+    try:
+        return len(bson.encode(doc))
+    except Exception:
+        return 0
+
+
+def _new_stats() -> Dict[str, Any]:
+    return {'commands': 0, 'time_ms': 0.0, 'bytes_out': 0, 'bytes_in': 0, 'slow': 0}
+
+
+def get_request_stats() -> Optional[Dict[str, Any]]:
+    """Return the current request's DB counters, or None outside a request."""
+    if not has_request_context():
+        return None
+    stats = g.get('db_stats')
+    if stats is None:
+        stats = g.db_stats = _new_stats()
+    return stats
+
+
+class RequestCommandListener(CommandListener):
+    """Accumulates command count/bytes/time on `g` and prints slow commands."""
+
+    def __init__(self, slow_ms: float = SLOW_MS):
+        self.slow_ms = slow_ms
+        # request_id -> (command name, filter shape); pymongo fires the
+        # started/finished pair on the same thread, so no lock is needed
+        self._pending: Dict[int, tuple] = {}
+
+    def started(self, event):
+        stats = get_request_stats()
+        if stats is not None and COUNT_BYTES:
+            stats['bytes_out'] += _doc_size(event.command)
+        self._pending[event.request_id] = (event.command_name, filter_shape(event.command_name, event.command))
+
+    def _finish(self, event, reply=None, failed=False):
+        name, shape = self._pending.pop(event.request_id, (event.command_name, None))
+        elapsed_ms = event.duration_micros / 1000.0
+        stats = get_request_stats()
+        if stats is not None:
+            stats['commands'] += 1
+            stats['time_ms'] += elapsed_ms
+            if reply is not None and COUNT_BYTES:
+                stats['bytes_in'] += _doc_size(reply)
+        if elapsed_ms >= self.slow_ms:
+            if stats is not None:
+                stats['slow'] += 1
+            route = f"{request.method} {request.path}" if has_request_context() else '-'
+            status = 'FAILED' if failed else 'ok'
+            print(f"slow_query: {elapsed_ms:.1f}ms {event.database_name}.{name} {status} filter={shape} route={route}")
+
+    def succeeded(self, event):
+        self._finish(event, reply=event.reply)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+
+command_listener = RequestCommandListener()
+
+
+def init_app(app) -> None:
+    """Reset counters per request and emit them as a ``Server-Timing`` header."""
+
+    @app.before_request
+    def _reset_db_stats():
+        g.db_stats = _new_stats()
+
+    @app.after_request
+    def _server_timing(response):
+        stats = g.get('db_stats')
+        if stats:
+            desc = f'{stats["commands"]} cmds, {stats["bytes_in"]}B in' if COUNT_BYTES else f'{stats["commands"]} cmds'
+            entry = f'db;dur={stats["time_ms"]:.2f};desc="{desc}"'
+            existing = response.headers.get('Server-Timing')
+            response.headers['Server-Timing'] = f'{existing}, {entry}' if existing else entry
+        return response
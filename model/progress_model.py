@@ -0,0 +1,370 @@
+"""Per-user review progress, kept apart from the shared card content.
+
+One small document per (user, deck_id, card_id) in `card_progress`::
+
+    {'user', 'deck_id', 'card_id',
+     'correct_count', 'incorrect_count', 'last_reviewed',
+     'ease', 'interval', 'repetitions', 'due_at', 'updated_at'}
+
+Reviews only ever write here, so reviewers of a shared deck never contend
+on the same document and `cards` stays read-mostly.  Documents are created
+on a user's first review of a card; a card without one has never been
+reviewed by that user.  `last_reviewed` and `due_at` are naive UTC dates;
+`updated_at` is the server time of the latest write (see `progress_marker`).
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from . import acl_model, review_log_model, scheduler
+from .mongo import get_db
+
+_db = get_db()
+_progress_col = _db.card_progress
+_cards_col = _db.cards
+_decks_col = _db.decks
+
+PROGRESS_FIELDS = ('correct_count', 'incorrect_count', 'last_reviewed', 'ease', 'interval', 'repetitions', 'due_at')
+
+_PROGRESS_DEFAULTS = {
+    'correct_count': 0,
+    'incorrect_count': 0,
+    'last_reviewed': None,
+    'ease': scheduler.DEFAULT_EASE,
+    'interval': 0,
+    'repetitions': 0,
+    'due_at': None,
+}
+
+# accuracy histogram bucket edges (the last bucket includes 1.0)
+ACCURACY_BUCKETS = [0, 0.25, 0.5, 0.75, 1.0001]
+
+# how many cards to scan per round trip when looking for never-reviewed cards
+_NEW_CARD_SCAN = 200
+
+
+def _key(username, deck_id, card_id) -> Dict:
+    return {'user': username, 'deck_id': str(deck_id), 'card_id': str(card_id)}
+
+
+def _progress_from_doc(doc: Optional[Dict]) -> Dict:
+    doc = doc or {}
+    out = {f: _PROGRESS_DEFAULTS[f] if doc.get(f) is None else doc[f] for f in PROGRESS_FIELDS}
+    for f in ('last_reviewed', 'due_at'):
+        if isinstance(out[f], datetime):
+            out[f] = out[f].isoformat()
+    return out
+
+
+def _counter_plus(field, n):
+    return {'$add': [{'$ifNull': [f'${field}', 0]}, n]}
+
+
+def _projection(*extra) -> Dict:
+    return {f: 1 for f in PROGRESS_FIELDS + extra} | {'_id': 0}
+
+
+def record_review(username, deck_id, card_id, correct: bool):
+    """Record one review for `username` and reschedule the card with SM-2.
+
+    One upserting `find_one_and_update` with an update pipeline, so the
+    counters and SM-2 fields are computed from the stored values at write
+    time.  Returns the user's updated progress for the card, or None if the
+    card does not exist.
+    """
+    sid, cid = str(deck_id), str(card_id)
+    if not _cards_col.find_one({'deck_id': sid, 'id': cid}, {'_id': 1}):
+        return None
+    counter = 'correct_count' if correct else 'incorrect_count'
+    now = datetime.utcnow()
+    pipeline = (
+        [{'$set': {counter: _counter_plus(counter, 1), 'last_reviewed': now, 'updated_at': now}}]
+        + scheduler.sm2_stages(scheduler.quality_for(correct), now)
+    )
+    for attempt in (1, 2):
+        try:
+            doc = _progress_col.find_one_and_update(
+                _key(username, sid, cid), pipeline, projection=_projection(),
+                upsert=True, return_document=ReturnDocument.AFTER,
+            )
+            break
+        except DuplicateKeyError:
+            # two first reviews raced on the upsert; the retry updates the winner's doc
+            if attempt == 2:
+                raise
+    out = _progress_from_doc(doc)
+    out['id'] = cid
+    review_log_model.log_reviews(username, [{
+        'deck_id': sid, 'card_id': cid, 'correct': correct,
+        'new': out['correct_count'] + out['incorrect_count'] == 1,
+    }])
+    return out
+
+
+def record_reviews(username, events: List[Dict]) -> List[Optional[Dict]]:
+    """Apply a batch of one user's review events with one unordered `bulk_write`.
+
+    `events` is a list of dicts with deck_id, card_id, correct (bool) and an
+    optional reviewed_at ISO string.  Times are parsed to UTC and clamped to
+    the server clock (unparseable ones count as now).  Events for the same
+    card are folded into one upsert that replays their SM-2 steps in
+    `reviewed_at` order, each due date counted from its own review time;
+    `last_reviewed` only ever moves forward.  Returns
+    one result dict per event, in order: {'ok': True} or {'ok': False, 'error'}.
+    """
+    results: List[Optional[Dict]] = [None] * len(events)
+    by_card = {}
+    now = datetime.utcnow()
+    times = [review_log_model.event_time(ev.get('reviewed_at'), now) for ev in events]
+    for i, ev in enumerate(events):
+        key = (str(ev['deck_id']), str(ev['card_id']))
+        agg = by_card.setdefault(key, {'correct_count': 0, 'incorrect_count': 0, 'last_reviewed': times[i], 'events': [], 'grades': []})
+        agg['correct_count' if ev['correct'] else 'incorrect_count'] += 1
+        agg['last_reviewed'] = max(agg['last_reviewed'], times[i])
+        agg['grades'].append((times[i], scheduler.quality_for(ev['correct'])))
+        agg['events'].append(i)
+    if not by_card:
+        return results
+
+    # one round trip to learn which cards exist, so each event gets a result
+    wanted = {}
+    for deck, card in by_card:
+        wanted.setdefault(deck, []).append(card)
+    existing = {
+        (d['deck_id'], d['id'])
+        for d in _cards_col.find(
+            {'$or': [{'deck_id': deck, 'id': {'$in': cards}} for deck, cards in wanted.items()]},
+            {'_id': 0, 'deck_id': 1, 'id': 1},
+        )
+    }
+
+    ops, op_cards = [], []
+    for (deck, card), agg in by_card.items():
+        if (deck, card) not in existing:
+            for i in agg['events']:
+                results[i] = {'ok': False, 'error': 'card not found'}
+            continue
+        counters = {f: _counter_plus(f, agg[f]) for f in ('correct_count', 'incorrect_count') if agg[f]}
+        # BSON orders dates above strings, so legacy ISO-string values are replaced
+        pipeline = [{'$set': {**counters, 'last_reviewed': {'$max': ['$last_reviewed', agg['last_reviewed']]}, 'updated_at': now}}]
+        # each step schedules from its own (clamped) review time, so offline batches keep their dates
+        for reviewed_at, quality in sorted(agg['grades'], key=lambda g: g[0]):
+            pipeline += scheduler.sm2_stages(quality, reviewed_at)
+        ops.append(UpdateOne(_key(username, deck, card), pipeline, upsert=True))
+        op_cards.append(agg)
+        for i in agg['events']:
+            results[i] = {'ok': True}
+    if not ops:
+        return results
+    try:
+        upserted = _progress_col.bulk_write(ops, ordered=False).upserted_ids
+    except BulkWriteError as e:
+        # concurrent first reviews can collide on the upsert; replay just those
+        retry = [ops[err['index']] for err in e.details.get('writeErrors', []) if err.get('code') == 11000]
+        if len(retry) != len(e.details.get('writeErrors', [])):
+            raise
+        _progress_col.bulk_write(retry, ordered=False)
+        upserted = {u['index']: u['_id'] for u in e.details.get('upserted', [])}
+
+    # an upserted card was new to the user: only its earliest event is a first review
+    logged = []
+    for n, agg in enumerate(op_cards):
+        first = min(agg['events'], key=lambda i: times[i]) if n in upserted else None
+        logged += [{**events[i], 'new': i == first} for i in agg['events']]
+    review_log_model.log_reviews(username, logged)
+    return results
+
+
+def progress_marker(username, deck_id) -> Optional[datetime]:
+    """Server time of the user's latest progress write on a deck (None if never reviewed).
+
+    Moves on every review, even when client `reviewed_at` times are older,
+    so it can key caches of per-user stats.
+    """
+    doc = next(
+        _progress_col.find({'user': username, 'deck_id': str(deck_id)}, {'_id': 0, 'updated_at': 1})
+        .sort('updated_at', -1).limit(1),
+        None,
+    )
+    return doc.get('updated_at') if doc else None
+
+
+def get_progress(username, deck_id, card_ids: Optional[Iterable] = None) -> Dict[str, Dict]:
+    """The user's progress for a deck's cards, keyed by card id (reviewed cards only)."""
+    query = {'user': username, 'deck_id': str(deck_id)}
+    if card_ids is not None:
+        query['card_id'] = {'$in': [str(c) for c in card_ids]}
+    return {d['card_id']: _progress_from_doc(d) for d in _progress_col.find(query, _projection('card_id'))}
+
+
+def _review_scope(username, deck_id=None) -> List[str]:
+    if deck_id is not None:
+        return [str(deck_id)]
+    perms = acl_model.get_permissions(username) or {}
+    return sorted(set(perms.get('owner', [])) | set(perms.get('reviewer', [])) | set(perms.get('editor', [])))
+
+
+def _new_cards(username, deck_ids: List[str], limit: int) -> List[Dict]:
+    """Cards in `deck_ids` the user has never reviewed, in (deck_id, id) order."""
+    found: List[Dict] = []
+    if not deck_ids:
+        return found
+    reviewed = {
+        row['_id']: row['n']
+        for row in _progress_col.aggregate([
+            {'$match': {'user': username, 'deck_id': {'$in': deck_ids}}},
+            {'$group': {'_id': '$deck_id', 'n': {'$sum': 1}}},
+        ])
+    }
+    sizes = {d['id']: d.get('len') for d in _decks_col.find({'id': {'$in': deck_ids}}, {'_id': 0, 'id': 1, 'len': 1})}
+    for sid in deck_ids:
+        size = sizes.get(sid)
+        if isinstance(size, int) and reviewed.get(sid, 0) >= size:
+            continue  # every card in this deck has been reviewed
+        last_id = None
+        while len(found) < limit:
+            query = {'deck_id': sid}
+            if last_id is not None:
+                query['id'] = {'$gt': last_id}
+            page = list(_cards_col.find(query, {'_id': 0, 'id': 1, 'front': 1, 'back': 1}).sort('id', 1).limit(_NEW_CARD_SCAN))
+            if not page:
+                break
+            last_id = page[-1]['id']
+            seen = {
+                d['card_id']
+                for d in _progress_col.find(
+                    {'user': username, 'deck_id': sid, 'card_id': {'$in': [c['id'] for c in page]}},
+                    {'_id': 0, 'card_id': 1},
+                )
+            }
+            for c in page:
+                if c['id'] not in seen:
+                    found.append({**c, 'deck_id': sid, **_progress_from_doc(None)})
+                    if len(found) >= limit:
+                        break
+        if len(found) >= limit:
+            break
+    return found
+
+
+def get_due_cards(username, deck_id=None, limit: int = 20, include_new: bool = True) -> List[Dict]:
+    """Return up to `limit` cards due for `username`, soonest first.
+
+    Scoped to one deck, or to every deck the user can access when `deck_id`
+    is None.  Due cards come from a range query on the user's progress
+    (indexed on user, deck_id, due_at); never-reviewed cards fill any
+    remaining slots.  Each card carries its `deck_id` and the user's SM-2 state.
+    """
+    limit = max(1, min(int(limit), 200))
+    deck_ids = _review_scope(username, deck_id)
+    if not deck_ids:
+        return []
+    due = list(
+        _progress_col.find(
+            {'user': username, 'deck_id': {'$in': deck_ids}, 'due_at': {'$lte': datetime.utcnow()}},
+            _projection('deck_id', 'card_id'),
+        ).sort('due_at', 1).limit(limit)
+    )
+    cards = []
+    if due:
+        wanted = {}
+        for d in due:
+            wanted.setdefault(d['deck_id'], []).append(d['card_id'])
+        content = {
+            (c['deck_id'], c['id']): c
+            for c in _cards_col.find(
+                {'$or': [{'deck_id': sid, 'id': {'$in': ids}} for sid, ids in wanted.items()]},
+                {'_id': 0, 'deck_id': 1, 'id': 1, 'front': 1, 'back': 1},
+            )
+        }
+        for d in due:
+            c = content.get((d['deck_id'], d['card_id']))
+            if c:  # skip progress left behind by a deleted card
+                cards.append({**c, **_progress_from_doc(d)})
+    if include_new and len(cards) < limit:
+        cards += _new_cards(username, deck_ids, limit - len(cards))
+    return cards
+
+
+def _totals_group(group_id):
+    """$group stage summing one user's review counters per `group_id`."""
+    return {'$group': {
+        '_id': group_id,
+        'total_correct': {'$sum': {'$ifNull': ['$correct_count', 0]}},
+        'total_incorrect': {'$sum': {'$ifNull': ['$incorrect_count', 0]}},
+        'reviewed': {'$sum': 1},
+    }}
+
+
+def _empty_totals() -> Dict:
+    return {'total_correct': 0, 'total_incorrect': 0, 'reviewed': 0}
+
+
+def progress_totals(username, deck_ids) -> Dict[str, Dict]:
+    """Per-deck review totals for `username` from one aggregation grouped by deck_id."""
+    ids = [str(d) for d in deck_ids]
+    out = {sid: _empty_totals() for sid in ids}
+    if not ids:
+        return out
+    for row in _progress_col.aggregate([{'$match': {'user': username, 'deck_id': {'$in': ids}}}, _totals_group('$deck_id')]):
+        out[row.pop('_id')] = row
+    return out
+
+
+def progress_summary(username, deck_id, top_k: int = 10) -> Dict:
+    """Totals, accuracy histogram and most-missed card ids for one user and deck.
+
+    One `$facet` aggregation over the user's progress documents for the deck.
+    A `top_k` of 0 or less returns no most-missed cards.
+    """
+    top_k = max(0, int(top_k))
+    reviews = {'$add': [{'$ifNull': ['$correct_count', 0]}, {'$ifNull': ['$incorrect_count', 0]}]}
+    facets = {
+        'totals': [_totals_group(None)],
+        'accuracy': [
+            {'$match': {'$expr': {'$gt': [reviews, 0]}}},
+            {'$bucket': {
+                'groupBy': {'$divide': [{'$ifNull': ['$correct_count', 0]}, reviews]},
+                'boundaries': ACCURACY_BUCKETS,
+                'default': 'other',
+                'output': {'cards': {'$sum': 1}},
+            }},
+        ],
+    }
+    if top_k:
+        facets['most_missed'] = [
+            {'$match': {'incorrect_count': {'$gt': 0}}},
+            {'$sort': {'incorrect_count': -1, 'card_id': 1}},
+            {'$limit': top_k},
+            {'$project': {'_id': 0, 'id': '$card_id', 'correct_count': 1, 'incorrect_count': 1}},
+        ]
+    row = next(_progress_col.aggregate([
+        {'$match': {'user': username, 'deck_id': str(deck_id)}},
+        {'$facet': facets},
+    ]), {})
+    totals = (row.get('totals') or [_empty_totals()])[0]
+    totals.pop('_id', None)
+    return {
+        'totals': totals,
+        'accuracy': [{'min': b['_id'], 'cards': b['cards']} for b in row.get('accuracy', [])],
+        'most_missed': row.get('most_missed', []),
+    }
+
+
+def forget_cards(deck_id, card_ids) -> None:
+    """Drop every user's progress for deleted cards."""
+    ids = [str(c) for c in card_ids]
+    if ids:
+        _progress_col.delete_many({'deck_id': str(deck_id), 'card_id': {'$in': ids}})
+
+
+def forget_deck(deck_id) -> None:
+    """Drop every user's progress for a deleted deck."""
+    _progress_col.delete_many({'deck_id': str(deck_id)})
+
+
+def forget_user(username) -> None:
+    """Drop all of one user's progress (account deletion)."""
+    _progress_col.delete_many({'user': username})
@@ -0,0 +1,161 @@
+"""Append-only review event log and the daily rollups built from it.
+
+Every review is appended to `review_events` as a compact document::
+
+    {'u': user, 'd': deck_id, 'c': card_id, 'ok': correct, 'new': first review, 'ts': datetime}
+
+Events are written unacknowledged (``w=0``) so logging never adds a round
+trip to the review path.  Nothing reads them at request time: the
+'review-rollups' maintenance job folds them into `review_daily`, one
+document per (scope, key, day) for scope 'deck' and 'user'::
+
+    {'_id': 'deck:12:2024-05-01', 'scope': 'deck', 'key': '12', 'day': '2024-05-01',
+     'reviews', 'correct', 'accuracy', 'repeat_reviews', 'repeat_correct', 'retention',
+     'cards', 'learners'}
+
+`retention` is the share of correct answers on cards the user had seen
+before (first exposures excluded).  Dashboards read only `review_daily`,
+so their cost does not grow with the event history.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from pymongo import WriteConcern
+
+from .mongo import get_db
+
+_db = get_db()
+_events_col = _db.review_events
+_daily_col = _db.review_daily
+
+ROLLUP_SCOPES = {'deck': '$d', 'user': '$u'}
+_UNACKNOWLEDGED = WriteConcern(w=0)
+_WATERMARK_ID = '_watermark'
+
+
+def event_time(value, default: datetime) -> datetime:
+    """Parse a client `reviewed_at` ISO string as naive UTC, falling back to `default`."""
+    if not isinstance(value, str):
+        return default
+    try:
+        ts = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return default
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    # clients with a skewed clock must not write into the future
+    return min(ts, default)
+
+
+def log_reviews(username, events: List[Dict]) -> None:
+    """Append review events (dicts with deck_id, card_id, correct, new, reviewed_at?)."""
+    if not events:
+        return
+    now = datetime.utcnow()
+    docs = [{
+        'u': username,
+        'd': str(ev['deck_id']),
+        'c': str(ev['card_id']),
+        'ok': bool(ev['correct']),
+        'new': bool(ev.get('new')),
+        'ts': event_time(ev.get('reviewed_at'), now),
+    } for ev in events]
+    try:
+        _events_col.with_options(write_concern=_UNACKNOWLEDGED).insert_many(docs, ordered=False)
+    except Exception as e:
+        # analytics must never fail a review
+        print(f"log_reviews: could not append {len(docs)} event(s): {e}")
+
+
+def _rollup_pipeline(scope: str, since: datetime, until: datetime) -> List[Dict]:
+    key = ROLLUP_SCOPES[scope]
+    day = {'$dateToString': {'format': '%Y-%m-%d', 'date': '$ts'}}
+    repeat = {'$not': ['$new']}
+    return [
+        {'$match': {'ts': {'$gte': since, '$lt': until}}},
+        {'$group': {
+            '_id': {'key': key, 'day': day},
+            'reviews': {'$sum': 1},
+            'correct': {'$sum': {'$cond': ['$ok', 1, 0]}},
+            'repeat_reviews': {'$sum': {'$cond': [repeat, 1, 0]}},
+            'repeat_correct': {'$sum': {'$cond': [{'$and': [repeat, '$ok']}, 1, 0]}},
+            'cards': {'$addToSet': '$c'},
+            'learners': {'$addToSet': '$u'},
+        }},
+        {'$project': {
+            '_id': {'$concat': [scope, ':', '$_id.key', ':', '$_id.day']},
+            'scope': {'$literal': scope},
+            'key': '$_id.key',
+            'day': '$_id.day',
+            'reviews': 1,
+            'correct': 1,
+            'accuracy': {'$round': [{'$divide': ['$correct', '$reviews']}, 4]},
+            'repeat_reviews': 1,
+            'repeat_correct': 1,
+            'retention': {'$cond': [
+                {'$gt': ['$repeat_reviews', 0]},
+                {'$round': [{'$divide': ['$repeat_correct', '$repeat_reviews']}, 4]},
+                None,
+            ]},
+            'cards': {'$size': '$cards'},
+            'learners': {'$size': '$learners'},
+        }},
+        {'$merge': {'into': _daily_col.name, 'on': '_id', 'whenMatched': 'replace', 'whenNotMatched': 'insert'}},
+    ]
+
+
+def rollup_reviews(full: bool = False) -> Dict[str, str]:
+    """Recompute the daily rollups for every day touched since the last run.
+
+    Days are rebuilt whole from their events (late, unacknowledged writes
+    are picked up on the next run), starting at the day of the stored
+    watermark, or from the first event when `full` is set.  Returns the
+    rebuilt range as ISO strings.
+    """
+    until = datetime.utcnow()
+    mark = None if full else _daily_col.find_one({'_id': _WATERMARK_ID})
+    if mark:
+        since = mark['ts']
+    else:
+        first = next(_events_col.find({}, {'_id': 0, 'ts': 1}).sort('ts', 1).limit(1), None)
+        if not first:
+            return {}
+        since = first['ts']
+    # rebuild from midnight so each day's document covers the full day
+    since = since.replace(hour=0, minute=0, second=0, microsecond=0)
+    for scope in ROLLUP_SCOPES:
+        list(_events_col.aggregate(_rollup_pipeline(scope, since, until)))
+    # keep a short overlap for unacknowledged writes that land late
+    _daily_col.update_one({'_id': _WATERMARK_ID}, {'$set': {'ts': until - timedelta(minutes=5)}}, upsert=True)
+    return {'since': since.isoformat(), 'until': until.isoformat()}
+
+
+def get_daily_rollups(scope: str, key, days: int = 30) -> List[Dict]:
+    """Daily rollup rows for one deck or user over the last `days` days, oldest first."""
+    if scope not in ROLLUP_SCOPES:
+        raise ValueError(f'unknown rollup scope: {scope}')
+    days = max(1, min(int(days), 365))
+    since = (datetime.utcnow() - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+    return list(
+        _daily_col.find(
+            {'scope': scope, 'key': str(key), 'day': {'$gte': since}},
+            {'_id': 0, 'scope': 0, 'key': 0},
+        ).sort('day', 1)
+    )
+
+
+def summarize_rollups(rows: List[Dict]) -> Optional[Dict]:
+    """Combine daily rows into period totals (None when there were no reviews)."""
+    reviews = sum(r.get('reviews', 0) for r in rows)
+    if not reviews:
+        return None
+    correct = sum(r.get('correct', 0) for r in rows)
+    repeat = sum(r.get('repeat_reviews', 0) for r in rows)
+    repeat_correct = sum(r.get('repeat_correct', 0) for r in rows)
+    return {
+        'reviews': reviews,
+        'correct': correct,
+        'accuracy': round(correct / reviews, 4),
+        'retention': round(repeat_correct / repeat, 4) if repeat else None,
+        'active_days': len(rows),
+    }
@@ -0,0 +1,76 @@
+"""Revoked login tokens, shared by every worker.
+
+utils.auth caches verified tokens per process, so a logout or account
+deletion has to reach the other workers through Mongo.  Each revocation is
+one document in `token_revocations`::
+
+    {'_id': 'token:<sha256 hex>' | 'user:<username>',
+     'at': unix time of the revocation (user entries only),
+     'until': datetime after which no matching token can still be valid,
+     'created': datetime written}
+
+`until` carries a TTL index, so entries disappear once they cannot match
+anything.  utils.auth looks a token up here on every cache miss and pulls
+recent revocations (`revoked_since`) at most once per poll interval for
+tokens it already cached.
+"""
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from .mongo import get_db
+
+_db = get_db()
+_revocations_col = _db.token_revocations
+
+
+def _token_key(digest_hex: str) -> str:
+    return f'token:{digest_hex}'
+
+
+def _user_key(username: str) -> str:
+    return f'user:{username}'
+
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _utc(ts: float) -> datetime:
+    return datetime.utcfromtimestamp(ts)
+
+
+def revoke_token(digest_hex: str, until: float) -> None:
+    """Record that the token with this SHA-256 digest is dead until `until` (unix time)."""
+    _revocations_col.update_one(
+        {'_id': _token_key(digest_hex)},
+        {'$max': {'until': _utc(until)}, '$set': {'created': datetime.utcnow()}},
+        upsert=True,
+    )
+
+
+def revoke_user(username: str, at: float, until: float) -> None:
+    """Record that every token issued to `username` up to `at` is dead until `until`."""
+    _revocations_col.update_one(
+        {'_id': _user_key(username)},
+        {'$max': {'at': at, 'until': _utc(until)}, '$set': {'created': datetime.utcnow()}},
+        upsert=True,
+    )
+
+
+def _entry(doc: Dict) -> Dict:
+    kind, _, key = doc['_id'].partition(':')
+    return {'kind': kind, 'key': key, 'at': doc.get('at'), 'until': (doc['until'] - _EPOCH).total_seconds()}
+
+
+def lookup(digest_hex: str, username: Optional[str]) -> List[Dict]:
+    """Revocations that could apply to one token, in one `_id` query.
+
+    Returned as {'kind': 'token' | 'user', 'key', 'at', 'until'} dicts, with
+    `key` the digest hex or username and times as unix seconds.
+    """
+    keys = [_token_key(digest_hex)] + ([_user_key(username)] if username else [])
+    return [_entry(d) for d in _revocations_col.find({'_id': {'$in': keys}})]
+
+
+def revoked_since(since: float) -> List[Dict]:
+    """Revocations written at or after unix time `since` (same dicts as `lookup`)."""
+    return [_entry(d) for d in _revocations_col.find({'created': {'$gte': _utc(since)}})]
@@ -0,0 +1,65 @@
+"""SM-2 spaced-repetition scheduling.
+
+Each review is graded 0-5 (the study UI only knows correct/incorrect, see
+`quality_for`).  SM-2 then updates three per-card fields and derives when
+the card is next due:
+
+- ``repetitions``: consecutive successful reviews (reset to 0 on a lapse)
+- ``interval``: days until the next review (1, 6, then interval * ease)
+- ``ease``: easiness factor, never below 1.3
+- ``due_at``: UTC datetime of the next review; cards never reviewed have none
+
+`sm2_stages()` expresses the rule as update-pipeline stages so a review is
+applied in one atomic write against whatever values the card holds at that
+moment.
+"""
+from datetime import datetime
+from typing import Dict, List
+
+MIN_EASE = 1.3
+DEFAULT_EASE = 2.5
+QUALITY_CORRECT = 4
+QUALITY_INCORRECT = 1
+_DAY_MS = 24 * 60 * 60 * 1000
+
+
+def quality_for(correct: bool) -> int:
+    return QUALITY_CORRECT if correct else QUALITY_INCORRECT
+
+
+def _ease_delta(quality: int) -> float:
+    miss = 5 - quality
+    return 0.1 - miss * (0.08 + miss * 0.02)
+
+
+def sm2_stages(quality: int, reviewed_at: datetime, prefix: str = '') -> List[Dict]:
+    """Update-pipeline stages applying one SM-2 review to `<prefix>ease` etc.
+
+    `due_at` is counted from `reviewed_at`, the time of this review.
+    Missing fields (legacy cards) start from the SM-2 defaults.  Stages can
+    be chained to apply several reviews in order within one update.
+    """
+    ease_f, interval_f, reps_f = f'{prefix}ease', f'{prefix}interval', f'{prefix}repetitions'
+    ease = {'$ifNull': [f'${ease_f}', DEFAULT_EASE]}
+    interval = {'$ifNull': [f'${interval_f}', 0]}
+    reps = {'$ifNull': [f'${reps_f}', 0]}
+    if quality >= 3:
+        new_interval = {'$switch': {
+            'branches': [
+                {'case': {'$eq': [reps, 0]}, 'then': 1},
+                {'case': {'$eq': [reps, 1]}, 'then': 6},
+            ],
+            'default': {'$toInt': {'$round': [{'$multiply': [interval, ease]}, 0]}},
+        }}
+        new_reps = {'$add': [reps, 1]}
+    else:
+        new_interval = 1
+        new_reps = 0
+    return [
+        {'$set': {
+            ease_f: {'$max': [MIN_EASE, {'$add': [ease, _ease_delta(quality)]}]},
+            interval_f: new_interval,
+            reps_f: new_reps,
+        }},
+        {'$set': {f'{prefix}due_at': {'$add': [reviewed_at, {'$multiply': [f'${interval_f}', _DAY_MS]}]}}},
+    ]
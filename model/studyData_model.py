@@ -1,7 +1,15 @@
 from .login_model import get_user_by_username
 from datetime import datetime
 from .mongo import get_db
-from typing import Optional
+from . import acl_model, progress_model
+from .counters_model import DECKS, card_seq, next_id, observe_id, reserve_ids, drop_sequence
+from typing import Dict, Optional
+from bson import ObjectId
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReturnDocument, UpdateOne
+import base64
+import json
+import os
+import time
 
 # MongoDB setup (configurable via MONGO_URI env)
 _db = get_db()
@@ -11,26 +19,172 @@ _cards_col = _db.cards
 _permissions_col = _db.user_permissions
 _deck_tags_col = _db.deck_tags
 _ai_logs_col = _db.ai_generation_logs
+_tombstones_col = _db.card_tombstones
 
+# >1 lets each worker reserve deck ids in blocks (fewer round trips, gaps in ids)
+DECK_ID_BLOCK_SIZE = int(os.environ.get('DECK_ID_BLOCK_SIZE', '1'))
 
-def _refresh_deck_length(deck_id: str) -> None:
-    """Keep the deck length in sync with the cards collection."""
-    count = _cards_col.count_documents({'deck_id': deck_id})
-    _decks_col.update_one({'id': deck_id}, {'$set': {'len': str(count)}})
 
-def _make_card_dict(cid, front, back, tags=None, correct_count=0, incorrect_count=0, last_reviewed=None, ease=2.5, interval=0, repetitions=0):
-    """Create a plain dict representing a card (no classes)."""
+def _len_plus(delta: int) -> dict:
+    """Aggregation expression for the stored deck length plus `delta`.
+
+    Older decks stored `len` as a string, so the current value is converted
+    first; the result is always written back as an integer.
+    """
+    current = {'$convert': {'input': '$len', 'to': 'int', 'onError': 0, 'onNull': 0}}
+    return {'$max': [0, {'$add': [current, int(delta)]}]}
+
+
+def _next_version() -> dict:
+    """Aggregation expression for the deck's next unused version number."""
+    return {'$add': [{'$max': [{'$ifNull': ['$version_seq', 0]}, {'$ifNull': ['$version', 0]}]}, 1]}
+
+
+def _reserve_version(sid: str) -> Optional[int]:
+    """Claim a version number for cards about to be written (None if no such deck).
+
+    Changed cards (and tombstones) are stamped with it (`v`) before
+    `_touch_deck` publishes it as the deck's `version`.
+    """
+    doc = _decks_col.find_one_and_update(
+        {'id': sid},
+        [{'$set': {'version_seq': _next_version()}}],
+        projection={'_id': 0, 'version_seq': 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    return int(doc['version_seq']) if doc else None
+
+
+def _restamp(sid: str, old: int, new: int) -> None:
+    """Move cards and tombstones written under version `old` to `new`."""
+    _cards_col.update_many({'deck_id': sid, 'v': old}, {'$set': {'v': new}})
+    _tombstones_col.update_many({'deck_id': sid, 'v': old}, {'$set': {'v': new}})
+
+
+def _touch_deck(sid: str, stamp: Optional[int] = None, delta: int = 0, fields: Optional[dict] = None) -> Optional[int]:
+    """Publish a deck change and return the new version.
+
+    Sets `fields`, adjusts the stored length by `delta`, stamps `updated_at`
+    and moves `version` forward: to the next unused number, or to `stamp`
+    when cards were written under a reserved version.
+
+    Two saves can publish out of order: if B (stamp 6) publishes before A
+    (stamp 5), a reader may already hold version 6 and would never be sent
+    A's cards.  So when the deck's version is already at or past `stamp`,
+    A's cards and tombstones are re-stamped with a fresh number above it,
+    which is then published.
+    """
+    deck_set = {k: {'$literal': v} for k, v in (fields or {}).items()}
+    if delta:
+        deck_set['len'] = _len_plus(delta)
+    deck_set['updated_at'] = datetime.utcnow()
+    current = {'$ifNull': ['$version', 0]}
+    if stamp is None:
+        deck_set['version'] = {'$max': [current, '$version_seq']}
+        doc = _decks_col.find_one_and_update(
+            {'id': sid}, [{'$set': {'version_seq': _next_version()}}, {'$set': deck_set}],
+            projection={'_id': 0, 'version': 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        return int(doc['version']) if doc else None
+
+    while True:
+        deck_set['version'] = {'$max': [current, stamp]}
+        before = _decks_col.find_one_and_update(
+            {'id': sid}, [{'$set': deck_set}],
+            projection={'_id': 0, 'version': 1},
+            return_document=ReturnDocument.BEFORE,
+        )
+        if before is None:
+            return None
+        if int(before.get('version') or 0) < stamp:
+            return stamp
+        # a later save published first; move our writes above what readers may hold
+        fresh = _reserve_version(sid)
+        if fresh is None:
+            return None
+        _restamp(sid, stamp, fresh)
+        stamp = fresh
+        # length and fields were applied above; only the version is left to publish
+        deck_set = {'updated_at': datetime.utcnow()}
+
+
+def _tombstone_cards(sid: str, card_ids, stamp: int) -> None:
+    """Remember deleted card ids so deck deltas can report them."""
+    docs = [{'deck_id': sid, 'id': str(c), 'v': stamp} for c in card_ids]
+    if docs:
+        _tombstones_col.insert_many(docs, ordered=False)
+
+
+RECONCILE_RETRIES = 3
+_LEN_FIELDS = {'_id': 0, 'id': 1, 'len': 1, 'version': 1, 'version_seq': 1}
+
+
+def _fix_deck_length(did: str, deck: dict, real: int) -> bool:
+    """Write `real` as the deck's length unless the deck changed since `deck` was read.
+
+    The update is conditional on the `len` and `version_seq` that were read
+    (every card write reserves a version first), and is skipped while a
+    reserved version is still unpublished, i.e. a writer's length delta is
+    in flight.  On a mismatch the deck is re-read, its cards recounted, and
+    the write retried up to RECONCILE_RETRIES times.
+    """
+    for attempt in range(RECONCILE_RETRIES + 1):
+        if attempt:
+            # deck first, then its cards: a card written after the count moves version_seq
+            deck = _decks_col.find_one({'id': did}, _LEN_FIELDS)
+            if deck is None:
+                return False
+            real = _cards_col.count_documents({'deck_id': did})
+            if deck.get('len') == real and isinstance(deck.get('len'), int):
+                return True
+        in_flight = (deck.get('version_seq') or 0) > (deck.get('version') or 0)
+        if not in_flight:
+            res = _decks_col.update_one(
+                {'id': did, 'len': deck.get('len'), 'version_seq': deck.get('version_seq')},
+                [{'$set': {'len': real, 'version_seq': _next_version(), 'updated_at': datetime.utcnow()}},
+                 {'$set': {'version': '$version_seq'}}],
+            )
+            if res.matched_count:
+                return True
+    print(f"reconcile_deck_lengths: deck {did} kept changing; left for the next run")
+    return False
+
+
+def reconcile_deck_lengths(fix: bool = True) -> dict:
+    """Compare every deck's stored `len` with its real card count.
+
+    Returns {deck_id: (stored, actual)} for decks that drifted (or still
+    hold a string length) and, with `fix`, rewrites them.  Deck docs are
+    read before the cards are counted and each rewrite is conditional on
+    what was read (see `_fix_deck_length`), so cards written meanwhile are
+    never overwritten by a stale count.
+    """
+    decks = list(_decks_col.find({}, _LEN_FIELDS))
+    actual = {row['_id']: row['n'] for row in _cards_col.aggregate([
+        {'$group': {'_id': '$deck_id', 'n': {'$sum': 1}}},
+    ])}
+    drift = {}
+    for d in decks:
+        stored = d.get('len')
+        real = actual.get(d.get('id'), 0)
+        if stored != real or not isinstance(stored, int):
+            drift[d.get('id')] = (stored, real)
+            if fix:
+                _fix_deck_length(d.get('id'), d, real)
+    return drift
+
+
+def _make_card_dict(cid, front, back, tags=None):
+    """Create a plain dict representing a card's content (no classes).
+
+    Review state is per user and lives in `card_progress` (see progress_model).
+    """
     return {
         'id': str(cid),
         'front': front,
         'back': back,
         'tags': list(tags) if tags else [],
-        'correct_count': int(correct_count),
-        'incorrect_count': int(incorrect_count),
-        'last_reviewed': last_reviewed.isoformat() if last_reviewed else None,
-        'ease': float(ease),
-        'interval': int(interval),
-        'repetitions': int(repetitions),
     }
 
 def _make_deck_dict(did, name, summary, cards_map, subject=None, category=None, tags=None):
@@ -42,7 +196,7 @@ def _make_deck_dict(did, name, summary, cards_map, subject=None, category=None,
         'subject': subject,
         'category': category,
         'tags': tags or [],
-        'len': str(len(cards_map)),
+        'len': len(cards_map),
         'cards': cards_map,
     }
 
@@ -57,54 +211,210 @@ def _make_deck_dict(did, name, summary, cards_map, subject=None, category=None,
 #         decks.append(deck)
 #     return decks
 
-def get_deck_by_id(deck_id):
+# card fields returned to callers; `deck_id`/`_id` stay server-side
+CARD_FIELDS = ('id', 'front', 'back', 'tags')
+
+_CARD_DEFAULTS = {
+    'tags': [],
+}
+
+
+def _card_from_doc(cdoc, fields=CARD_FIELDS):
+    """Shape a stored card document for callers without re-parsing it."""
+    card = {}
+    for f in fields:
+        v = cdoc.get(f)
+        card[f] = _CARD_DEFAULTS.get(f) if v is None else v
+    card['id'] = str(cdoc.get('id') or cdoc.get('_id'))
+    if 'tags' in card and not card['tags']:
+        card['tags'] = []
+    return card
+
+
+# decks with more cards than this are not joined into the deck document (the
+# aggregation result is one BSON document, capped at 16 MB); their cards are
+# streamed with a separate cursor instead
+DECK_INLINE_CARDS = int(os.environ.get('DECK_INLINE_CARDS', '2000'))
+
+
+def _deck_pipeline(sid, include_cards=True, card_fields=CARD_FIELDS, card_limit=None):
+    """Aggregation returning the deck doc with its tags (and cards) joined in.
+
+    Joins by `localField` together with a `pipeline`, which needs MongoDB
+    5.0 or newer.  With `card_limit` at most that many cards are joined.
     """
-    Retrieve a deck by its ID from the hardcoded decks.
-    
+    pipeline = [
+        {'$match': {'id': sid}},
+        {'$limit': 1},
+        {'$lookup': {
+            'from': _deck_tags_col.name,
+            'localField': 'id',
+            'foreignField': 'deck_id',
+            'pipeline': [{'$project': {'_id': 0, 'tag': 1}}],
+            'as': 'tag_docs',
+        }},
+    ]
+    if include_cards:
+        projection = {'_id': 0, 'id': 1}
+        projection.update({f: 1 for f in card_fields})
+        card_pipeline = [{'$sort': {'id': 1}}]
+        if card_limit is not None:
+            card_pipeline.append({'$limit': card_limit})
+        card_pipeline.append({'$project': projection})
+        pipeline.append({'$lookup': {
+            'from': _cards_col.name,
+            'localField': 'id',
+            'foreignField': 'deck_id',
+            'pipeline': card_pipeline,
+            'as': 'card_docs',
+        }})
+    return pipeline
+
+
+def get_deck_by_id(deck_id, include_cards: bool = True, card_fields=None):
+    """
+    Retrieve a deck (metadata, tags and optionally cards) in one round trip.
+
+    Requires MongoDB 5.0 or newer (see `_deck_pipeline`).  A deck with more
+    than `DECK_INLINE_CARDS` cards takes a second round trip: its cards are
+    read from their own cursor rather than joined, so a large deck cannot
+    push the aggregation result past the 16 MB document limit.
+
     Args:
-        deck_id (int): The ID of the deck to retrieve"""
-    # Try to read from MongoDB first
+        deck_id (int|str): The ID of the deck to retrieve
+        include_cards (bool): False returns metadata only (``cards`` is empty
+            and ``len`` comes from the stored deck document)
+        card_fields (iterable): Card fields to fetch; defaults to `CARD_FIELDS`
+    """
     if deck_id is None:
         return None
 
     # normalize id to string for storage keys
     sid = str(deck_id)
-    # primary source: 'decks' collection
-    doc = _decks_col.find_one({'id': sid})
-    if doc:
+    fields = tuple(card_fields) if card_fields else CARD_FIELDS
+    # one card past the limit tells a large deck apart without trusting `len`
+    doc = next(_decks_col.aggregate(_deck_pipeline(sid, include_cards, fields, DECK_INLINE_CARDS + 1)), None)
+    if not doc:
+        return None
+
+    card_docs = doc.get('card_docs', [])
+    if len(card_docs) > DECK_INLINE_CARDS:
+        cards = {card['id']: card for card in iter_deck_cards(sid, fields)}
+    else:
         cards = {}
-        for cdoc in _cards_col.find({'deck_id': sid}).sort('id', 1):
-            cid = cdoc.get('id') or cdoc.get('_id')
-            try:
-                last = cdoc.get('last_reviewed')
-                last_dt = datetime.fromisoformat(last) if last else None
-            except Exception:
-                last_dt = None
-            cards[str(cid)] = _make_card_dict(
-                cid,
-                cdoc.get('front'),
-                cdoc.get('back'),
-                tags=cdoc.get('tags', []),
-                correct_count=cdoc.get('correct_count', 0),
-                incorrect_count=cdoc.get('incorrect_count', 0),
-                last_reviewed=last_dt,
-                ease=cdoc.get('ease', 2.5),
-                interval=cdoc.get('interval', 0),
-                repetitions=cdoc.get('repetitions', 0),
-            )
+        for cdoc in card_docs:
+            card = _card_from_doc(cdoc, fields)
+            cards[card['id']] = card
+    return _deck_meta_from_doc(doc, cards if include_cards else None)
+
+
+def _deck_meta_from_doc(doc, cards=None):
+    """Build the deck dict from an aggregated deck doc (with `tag_docs` joined in).
+
+    Without `cards` the dict carries an empty card map and the stored `len`.
+    """
+    tag_values = [t.get('tag') for t in doc.get('tag_docs', []) if t.get('tag')]
+    deck = _make_deck_dict(
+        doc.get('id'),
+        doc.get('name'),
+        doc.get('summary', ''),
+        cards or {},
+        subject=doc.get('subject'),
+        category=doc.get('category'),
+        tags=tag_values,
+    )
+    deck['owner'] = doc.get('owner')
+    deck['version'] = int(doc.get('version') or 0)
+    deck['updated_at'] = doc.get('updated_at')
+    if cards is None:
+        try:
+            deck['len'] = int(doc.get('len') or 0)
+        except (TypeError, ValueError):
+            deck['len'] = 0
+    return deck
+
+
+def get_owned_deck_ids(username, deck_ids) -> set:
+    """The subset of `deck_ids` whose deck document names `username` as owner (one query)."""
+    ids = [str(d) for d in deck_ids]
+    if not username or not ids:
+        return set()
+    return {d['id'] for d in _decks_col.find({'id': {'$in': ids}, 'owner': username}, {'_id': 0, 'id': 1})}
+
+
+def get_deck_meta(deck_id):
+    """Return deck metadata and tags without loading any cards."""
+    return get_deck_by_id(deck_id, include_cards=False)
+
+
+CARD_PAGE_SIZE = int(os.environ.get('CARD_PAGE_SIZE', '100'))
+CARD_PAGE_MAX = 500
+
+
+def list_deck_cards(deck_id, after: Optional[str] = None, limit: int = CARD_PAGE_SIZE, card_fields=None):
+    """Return one page of a deck's cards in id order, keyed on the last id seen.
+
+    Pages are keyset-paginated (`id > after`) over the (deck_id, id) index,
+    so each page costs the same however deep into the deck it is and the
+    server never holds more than `limit` cards per request.
+
+    Returns:
+        dict: {'cards': [...], 'next_after': id of the last card or None when done}
+    """
+    limit = max(1, min(int(limit), CARD_PAGE_MAX))
+    fields = tuple(card_fields) if card_fields else CARD_FIELDS
+    query = {'deck_id': str(deck_id)}
+    if after is not None:
+        query['id'] = {'$gt': str(after)}
+    docs = list(_cards_col.find(query, {f: 1 for f in fields} | {'_id': 0}).sort('id', 1).limit(limit + 1))
+    more = len(docs) > limit
+    cards = [_card_from_doc(d, fields) for d in docs[:limit]]
+    return {'cards': cards, 'next_after': cards[-1]['id'] if more else None}
+
+
+def get_cards(deck_id, card_ids, card_fields=None) -> Dict[str, dict]:
+    """Return the given cards of a deck keyed by id (missing ids are left out)."""
+    ids = [str(c) for c in card_ids]
+    if not ids:
+        return {}
+    fields = tuple(card_fields) if card_fields else CARD_FIELDS
+    docs = _cards_col.find({'deck_id': str(deck_id), 'id': {'$in': ids}}, {f: 1 for f in fields} | {'_id': 0})
+    return {c['id']: c for c in (_card_from_doc(d, fields) for d in docs)}
+
+
+def get_deck_version(deck_id):
+    """Return {'version', 'updated_at'} for a deck with one indexed lookup, or None."""
+    doc = _decks_col.find_one({'id': str(deck_id)}, {'_id': 0, 'version': 1, 'updated_at': 1})
+    if doc is None:
+        return None
+    return {'version': int(doc.get('version') or 0), 'updated_at': doc.get('updated_at')}
+
+
+def get_deck_changes(deck_id, since: int, card_fields=None):
+    """Return what changed in a deck after version `since`.
+
+    Result: the deck metadata (including its current `version`), the cards
+    written after `since` and the ids of cards deleted after it.  Cards are
+    stamped with the version that last wrote them, so this is an indexed
+    range query rather than a deck reload.  Returns None if the deck does
+    not exist.
+    """
+    deck = get_deck_meta(deck_id)
+    if not deck:
+        return None
+    sid = str(deck_id)
+    fields = tuple(card_fields) if card_fields else CARD_FIELDS
+    since = int(since)
+    changed = _cards_col.find({'deck_id': sid, 'v': {'$gt': since}}, {f: 1 for f in fields} | {'_id': 0}).sort('id', 1)
+    deleted = _tombstones_col.find({'deck_id': sid, 'v': {'$gt': since}}, {'_id': 0, 'id': 1})
+    return {
+        'deck': deck,
+        'version': deck['version'],
+        'since': since,
+        'cards': [_card_from_doc(c, fields) for c in changed],
+        'deleted': sorted({t['id'] for t in deleted}),
+    }
 
-        tags_doc = list(_deck_tags_col.find({'deck_id': sid}))
-        tag_values = [t.get('tag') for t in tags_doc if t.get('tag')]
-        deck = _make_deck_dict(
-            doc.get('id'),
-            doc.get('name'),
-            doc.get('summary', ''),
-            cards,
-            subject=doc.get('subject'),
-            category=doc.get('category'),
-            tags=tag_values,
-        )
-        return deck
 
 def get_user_study_data(username):
     """
@@ -133,42 +443,119 @@ def get_user_study_data(username):
         return user['studyData']
     return None
 
+def _accessible_deck_ids(username):
+    """Deck ids the user can review or edit (directly or via the "all" wildcard)."""
+    who = [username, 'all']
+    cursor = _permissions_col.find(
+        {'$or': [{'reviewers': {'$in': who}}, {'editors': {'$in': who}}]},
+        {'_id': 0, 'deck_id': 1},
+    )
+    return {p['deck_id'] for p in cursor if p.get('deck_id')}
+
+
+def _encode_cursor(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def _decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except Exception:
+        return None
+
+
+DECK_SORTS = ('name', 'recent')
+
+
+def _page_match(sort: str, after) -> dict:
+    """$match for the page after a decoded cursor; {} (the first page) for anything malformed."""
+    if sort == 'recent':
+        if isinstance(after, list) and len(after) == 1 and isinstance(after[0], str) and ObjectId.is_valid(after[0]):
+            return {'_id': {'$lt': ObjectId(after[0])}}
+        return {}
+    if (isinstance(after, list) and len(after) == 2
+            and isinstance(after[0], (str, type(None))) and isinstance(after[1], str)):
+        return {'$or': [{'name': {'$gt': after[0]}}, {'name': after[0], 'id': {'$gt': after[1]}}]}
+    return {}
+
+
+def list_user_decks(username, sort: str = 'name', limit: int = 50, cursor: Optional[str] = None):
+    """Return one page of deck metadata (no cards) the user can access.
+
+    Permissions are resolved with indexed `$in` lookups, then the page of
+    decks, their tags and the total count come back from a single
+    aggregation.  `cursor` is the opaque `next_cursor` of the previous page.
+
+    Returns:
+        dict: {'decks': [...], 'total': int, 'next_cursor': str | None}
+    """
+    empty = {'decks': [], 'total': 0, 'next_cursor': None}
+    if not username:
+        return empty
+    deck_ids = list(_accessible_deck_ids(username))
+    if not deck_ids:
+        return empty
+    if sort not in DECK_SORTS:
+        sort = 'name'
+    limit = max(1, min(int(limit or 50), 500))
+
+    order = {'_id': -1} if sort == 'recent' else {'name': 1, 'id': 1}
+    page_match = _page_match(sort, _decode_cursor(cursor) if cursor else None)
+
+    page_pipeline = [
+        {'$match': page_match},
+        {'$sort': order},
+        {'$limit': limit + 1},
+        {'$lookup': {
+            'from': _deck_tags_col.name,
+            'localField': 'id',
+            'foreignField': 'deck_id',
+            'pipeline': [{'$project': {'_id': 0, 'tag': 1}}],
+            'as': 'tag_docs',
+        }},
+    ]
+    result = next(_decks_col.aggregate([
+        {'$match': {'id': {'$in': deck_ids}}},
+        {'$project': {'id': 1, 'name': 1, 'summary': 1, 'subject': 1, 'category': 1, 'owner': 1, 'len': 1}},
+        {'$facet': {'total': [{'$count': 'n'}], 'page': page_pipeline}},
+    ]), None) or {}
+
+    docs = result.get('page', [])
+    total = (result.get('total') or [{}])[0].get('n', 0)
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        last = docs[-1]
+        if sort == 'recent':
+            next_cursor = _encode_cursor([str(last['_id'])])
+        else:
+            next_cursor = _encode_cursor([last.get('name'), last.get('id')])
+
+    decks = [_deck_meta_from_doc(d) for d in docs]
+    return {'decks': decks, 'total': total, 'next_cursor': next_cursor}
+
+
 def get_user_decks(username):
     """
     Retrieve the decks associated with a given user.
-    
+
+    Decks are metadata only (``cards`` is empty, ``len`` is the stored
+    count); use `get_deck_by_id` for a deck's cards.
+
     Args:
         username (str): The username of the user
         
     Returns:
         list: List of deck dictionaries associated with the user
     """
-    if not username:
-        return []
-    
-    # Code to give admin access to all decks, should probably be removed for production.
-    # if username == "admin":
-    #     # admin gets all decks
-    #     deck_ids = [d.get('id') for d in _decks_col.find({}) if d.get('id')]
-    #     decks = []
-    #     for deck_id in deck_ids:
-    #         deck = get_deck_by_id(deck_id)
-    #         if deck:
-    #             decks.append(deck)
-    #     return decks
-    ### END admin special case ###
-    
-    # Creates a set of deck id's based of the permissions collection, it finds all decks that the username is in (Not very scalable at the moment), and adds the id to the list of decks.
-    deck_ids = {p.get('deck_id') for p in _permissions_col.find()
-                if "all" in (p.get('reviewers') or []) or username in (p.get('reviewers') or [])
-                or "all" in (p.get('editors') or []) or username in (p.get('editors') or [])}
-    #deck_ids = [p.get('deck_id') for p in _permissions_col.find({'username': username}) if p.get('deck_id')]
     decks = []
-    for deck_id in deck_ids:
-        deck = get_deck_by_id(deck_id)
-        if deck:
-            decks.append(deck)
-    return decks
+    cursor = None
+    while True:
+        page = list_user_decks(username, limit=500, cursor=cursor)
+        decks.extend(page['decks'])
+        cursor = page['next_cursor']
+        if not cursor:
+            return decks
 
 def get_deck(deck_id):
     """
@@ -185,7 +572,7 @@ def get_deck(deck_id):
 
 def update_deckInfo(deck_id, name: Optional[str] = None, summary: Optional[str] = None, subject: Optional[str] = None, category: Optional[str] = None, tags: Optional[list] = None):
     """Update deck metadata fields."""
-    deck = get_deck_by_id(deck_id)
+    deck = get_deck_meta(deck_id)
     if not deck:
         return False
 
@@ -202,13 +589,13 @@ def update_deckInfo(deck_id, name: Optional[str] = None, summary: Optional[str]
     if category is not None:
         update_doc['category'] = category
 
-    if update_doc:
-        _decks_col.update_one({'id': sid}, {'$set': update_doc})
-
     if tags is not None:
         _deck_tags_col.delete_many({'deck_id': sid})
         if tags:
             _deck_tags_col.insert_many([{'deck_id': sid, 'tag': t} for t in tags])
+
+    if update_doc or tags is not None:
+        _touch_deck(sid, fields=update_doc)
     return True
 
 def update_card(deck_id, card_id, front, back):
@@ -216,71 +603,199 @@ def update_card(deck_id, card_id, front, back):
 
     Returns True if updated, False if deck not found.
     """
-    deck = get_deck_by_id(deck_id)
+    deck = get_deck_meta(deck_id)
     if not deck:
         return False
     # normalize key to string for storage keys
     card_key = str(card_id)
 
     sid = str(deck_id)
+    stamp = _reserve_version(sid)
     update_doc = {
         'front': front,
         'back': back,
+        'v': stamp,
     }
     res = _cards_col.update_one({'deck_id': sid, 'id': card_key}, {'$set': update_doc})
+    delta = 0
     if res.matched_count == 0:
         # create if missing to keep API lenient
         new_card = _make_card_dict(card_key, front, back)
         new_card['deck_id'] = sid
+        new_card['v'] = stamp
         _cards_col.insert_one(new_card)
-    _refresh_deck_length(sid)
+        delta = 1
+        # keep the allocator ahead of caller-chosen ids
+        observe_id(card_seq(sid), card_key)
+    _touch_deck(sid, stamp, delta)
     return True
 
 def add_card(deck_id, front, back):
     """Add a new card to the deck and return the new Card instance.
 
-    The new card id tries to follow numeric indexing when existing keys are numeric.
+    The new card id comes from the deck's atomic counter (see counters_model).
     """
-    deck = get_deck_by_id(deck_id)
+    deck = get_deck_meta(deck_id)
     if not deck:
         return None
 
     sid = str(deck_id)
-    existing_cards = list(_cards_col.find({'deck_id': sid}))
-
-    numeric_keys = []
-    for c in existing_cards:
-        cid = c.get('id')
-        if isinstance(cid, int) or (isinstance(cid, str) and str(cid).isdigit()):
-            numeric_keys.append(int(cid))
-
-    if numeric_keys:
-        next_id = max(numeric_keys) + 1
-    else:
-        next_id = len(existing_cards) + 1
-
-    card_key = str(next_id)
+    card_key = str(next_id(card_seq(sid)))
+    stamp = _reserve_version(sid)
     new_card = _make_card_dict(card_key, front, back)
     new_card['deck_id'] = sid
+    new_card['v'] = stamp
 
     _cards_col.insert_one(new_card)
-    _refresh_deck_length(sid)
+    _touch_deck(sid, stamp, 1)
+    new_card.pop('_id', None)
     return new_card
 
+def save_deck_changes(deck_id, updates=None, deletes=None, adds=None, add_tags=None, remove_tags=None, meta=None):
+    """Apply a precomputed deck diff in a fixed number of round trips.
+
+    Args:
+        updates (dict): card_id -> {'front', 'back'} for edited cards
+        deletes (iterable): card ids to remove
+        adds (list): {'front', 'back'} dicts for new cards
+        add_tags / remove_tags (iterable): deck tags to add / remove
+        meta (dict): deck fields to set (name, summary, subject, category)
+
+    Cards go out in one `bulk_write` stamped with a reserved version, tags
+    in another, and the deck doc is updated once (length delta, metadata
+    and the `version` bump).  An update only sets the sides it names, tags
+    already on the deck are not added twice, and only cards that existed
+    get a tombstone.
+
+    Returns:
+        int | None: the deck's new version, or None if the deck does not exist.
+    """
+    sid = str(deck_id)
+    stamp = _reserve_version(sid)
+    if stamp is None:
+        return None
+
+    card_ops = []
+    for card_id, fields in (updates or {}).items():
+        card_set = {k: fields[k] for k in ('front', 'back') if k in fields}
+        if card_set:
+            card_set['v'] = stamp
+            card_ops.append(UpdateOne({'deck_id': sid, 'id': str(card_id)}, {'$set': card_set}))
+    deleted = []
+    if deletes:
+        wanted = list({str(c) for c in deletes})
+        deleted = [d['id'] for d in _cards_col.find({'deck_id': sid, 'id': {'$in': wanted}}, {'_id': 0, 'id': 1})]
+        if deleted:
+            card_ops.append(DeleteMany({'deck_id': sid, 'id': {'$in': deleted}}))
+    adds = [a for a in (adds or []) if a.get('front') or a.get('back')]
+    if adds:
+        for card_key, a in zip(reserve_card_ids(sid, len(adds)), adds):
+            new_card = _make_card_dict(card_key, a.get('front'), a.get('back'))
+            new_card['deck_id'] = sid
+            new_card['v'] = stamp
+            card_ops.append(InsertOne(new_card))
+    delta = 0
+    if card_ops:
+        res = _cards_col.bulk_write(card_ops, ordered=False)
+        delta = res.inserted_count - res.deleted_count
+    if deleted:
+        _tombstone_cards(sid, deleted, stamp)
+        progress_model.forget_cards(sid, deleted)
+
+    # upserts, so tags the deck already has are left alone
+    tag_ops = [UpdateOne({'deck_id': sid, 'tag': t}, {'$setOnInsert': {'deck_id': sid, 'tag': t}}, upsert=True)
+               for t in dict.fromkeys(add_tags or [])]
+    tag_ops += [DeleteOne({'deck_id': sid, 'tag': t}) for t in remove_tags or []]
+    if tag_ops:
+        _deck_tags_col.bulk_write(tag_ops, ordered=False)
+
+    # one pipeline update: metadata, length delta and version bump
+    fields = {k: v for k, v in (meta or {}).items() if k in ('name', 'summary', 'subject', 'category')}
+    return _touch_deck(sid, stamp, delta, fields)
+
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', '1000'))
+MAX_IMPORT_CARDS = int(os.environ.get('MAX_IMPORT_CARDS', '200000'))
+
+
+def import_cards(deck_id, rows, batch_size: int = IMPORT_BATCH_SIZE, max_cards: int = MAX_IMPORT_CARDS):
+    """Insert cards from an iterable of {'front', 'back', 'tags'} dicts.
+
+    `rows` is consumed lazily and written in `insert_many` batches of
+    `batch_size`, each with ids reserved from the deck's counter in one
+    round trip, so memory stays bounded by the batch size.  Rows with
+    neither front nor back are skipped; reading stops after `max_cards`.
+    The deck's length and version are updated once at the end, even if
+    `rows` raises part-way (cards already inserted are kept).
+
+    Returns:
+        dict | None: imported/skipped/batches counts, `truncated`, elapsed
+        `seconds`, `cards_per_second` and the new deck `version`; None if
+        the deck does not exist.
+    """
+    sid = str(deck_id)
+    stamp = _reserve_version(sid)
+    if stamp is None:
+        return None
+    started = time.monotonic()
+    stats = {'imported': 0, 'skipped': 0, 'batches': 0, 'truncated': False}
+    batch = []
+
+    def flush():
+        ids = reserve_card_ids(sid, len(batch))
+        docs = []
+        for cid, row in zip(ids, batch):
+            card = _make_card_dict(cid, row.get('front') or '', row.get('back') or '', row.get('tags'))
+            card['deck_id'] = sid
+            card['v'] = stamp
+            docs.append(card)
+        _cards_col.insert_many(docs, ordered=False)
+        stats['imported'] += len(docs)
+        stats['batches'] += 1
+        batch.clear()
+
+    try:
+        for row in rows:
+            if not (row.get('front') or row.get('back')):
+                stats['skipped'] += 1
+                continue
+            if stats['imported'] + len(batch) >= max_cards:
+                stats['truncated'] = True
+                break
+            batch.append(row)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+    finally:
+        stats['version'] = _touch_deck(sid, stamp, stats['imported'])
+    elapsed = time.monotonic() - started
+    stats['seconds'] = round(elapsed, 3)
+    stats['cards_per_second'] = round(stats['imported'] / elapsed) if elapsed > 0 else stats['imported']
+    return stats
+
+
+def iter_deck_cards(deck_id, card_fields=None, batch_size: int = 1000):
+    """Yield a deck's cards in id order straight from a server cursor (never a full list)."""
+    fields = tuple(card_fields) if card_fields else CARD_FIELDS
+    cursor = _cards_col.find({'deck_id': str(deck_id)}, {f: 1 for f in fields} | {'_id': 0}).sort('id', 1).batch_size(batch_size)
+    for doc in cursor:
+        yield _card_from_doc(doc, fields)
+
 def addTag(deck_id, tag):
     _deck_tags_col.insert_one({'deck_id':deck_id,"tag": tag})
-    #...
+    _touch_deck(str(deck_id))
     
 def remTag(deck_id, tag):
     delete = _deck_tags_col.find_one_and_delete({'deck_id': deck_id, 'tag': tag})
     if delete:
+        _touch_deck(str(deck_id))
         return True
     else:
         return False
     
 def delete_card(deck_id, card_id):
     """Delete a card from a deck. Returns True if deleted, False otherwise."""
-    deck = get_deck_by_id(deck_id)
+    deck = get_deck_meta(deck_id)
     if not deck:
         return False
 
@@ -288,7 +803,10 @@ def delete_card(deck_id, card_id):
     sid = str(deck_id)
     res = _cards_col.delete_one({'deck_id': sid, 'id': card_key})
     if res.deleted_count > 0:
-        _refresh_deck_length(sid)
+        stamp = _reserve_version(sid)
+        _tombstone_cards(sid, [card_key], stamp)
+        _touch_deck(sid, stamp, -1)
+        progress_model.forget_cards(sid, [card_key])
         return True
     return False
 
@@ -297,61 +815,134 @@ def delete_deck(deck_id):
     sid = str(deck_id)
     _cards_col.delete_many({'deck_id': sid})
     _deck_tags_col.delete_many({'deck_id': sid})
+    _tombstones_col.delete_many({'deck_id': sid})
+    perm = _permissions_col.find_one({'deck_id': sid}, {'_id': 0, 'owner': 1, 'editors': 1, 'reviewers': 1}) or {}
     _permissions_col.delete_many({'deck_id': sid})
+    progress_model.forget_deck(sid)
+    acl_model.on_deck_deleted(sid, [perm.get('owner'), *(perm.get('editors') or []), *(perm.get('reviewers') or [])])
+    drop_sequence(card_seq(sid))
     result = _decks_col.delete_one({'id': sid})
     return result.deleted_count > 0
 
-def record_review(deck_id, card_id, correct: bool):
-    """Record a review result for a card. Increment correct/incorrect_count and set last_reviewed.
+STATS_CACHE_TTL = float(os.environ.get('STATS_CACHE_TTL', '30'))
+_stats_cache = {}
+
 
-    Returns the updated card dict, or None if not found.
+def _with_accuracy(totals):
+    answered = totals['total_correct'] + totals['total_incorrect']
+    totals['accuracy'] = round(totals['total_correct'] / answered, 4) if answered else None
+    return totals
+
+
+def _deck_size(deck):
+    try:
+        return int(deck.get('len') or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def get_deck_stats(deck_id, username, top_k: int = 10, include_cards: bool = False, page: int = 1, per_page: int = 100):
+    """Review statistics for one user on a deck.
+
+    Totals, an accuracy histogram over reviewed cards and the `top_k`
+    most-missed cards come from one `$facet` aggregation over the user's
+    `card_progress` documents; with `include_cards`, one page of card bodies
+    is returned with the user's progress merged in.  Results are cached per
+    (user, deck version, the user's latest progress write on the deck) for
+    `STATS_CACHE_TTL` seconds, so a review shows up on the next call.
+    Returns None if the deck does not exist.
     """
-    deck = get_deck_by_id(deck_id)
+    sid = str(deck_id)
+    deck = _decks_col.find_one({'id': sid}, {'_id': 0, 'name': 1, 'version': 1, 'len': 1})
     if not deck:
         return None
+    page = max(1, int(page))
+    per_page = max(1, min(int(per_page), 500))
+    marker = progress_model.progress_marker(username, sid)
+    key = (username, sid, deck.get('version', 0), marker, top_k, include_cards, page, per_page)
+    hit = _stats_cache.get(key)
+    if hit and time.monotonic() - hit[0] < STATS_CACHE_TTL:
+        return hit[1]
 
-    found_key = None
-    for k in deck.get('cards', {}).keys():
-        if str(k) == str(card_id):
-            found_key = str(k)
-            break
+    summary = progress_model.progress_summary(username, sid, top_k)
+    totals = summary['totals']
+    total_cards = _deck_size(deck)
+    stats = _with_accuracy({
+        'total_cards': total_cards,
+        'total_correct': totals['total_correct'],
+        'total_incorrect': totals['total_incorrect'],
+        'never_reviewed': max(0, total_cards - totals['reviewed']),
+    })
 
-    if found_key is None:
-        return None
+    most_missed = summary['most_missed']
+    if most_missed:
+        fronts = {
+            c['id']: c.get('front')
+            for c in _cards_col.find({'deck_id': sid, 'id': {'$in': [m['id'] for m in most_missed]}}, {'_id': 0, 'id': 1, 'front': 1})
+        }
+        most_missed = [{**m, 'front': fronts[m['id']]} for m in most_missed if m['id'] in fronts]
 
-    card = deck['cards'].get(found_key)
-    if not card:
-        return None
+    result = {
+        'deck': {'id': sid, 'name': deck.get('name'), 'version': deck.get('version', 0)},
+        'stats': stats,
+        'accuracy_distribution': summary['accuracy'],
+        'most_missed': most_missed,
+    }
+    if include_cards:
+        cards = list(
+            _cards_col.find({'deck_id': sid}, {'_id': 0, 'id': 1, 'front': 1, 'back': 1})
+            .sort('id', 1).skip((page - 1) * per_page).limit(per_page)
+        )
+        progress = progress_model.get_progress(username, sid, [c['id'] for c in cards])
+        for c in cards:
+            mine = progress.get(c['id'], {})
+            c['correct_count'] = mine.get('correct_count', 0)
+            c['incorrect_count'] = mine.get('incorrect_count', 0)
+        result['cards'] = cards
+        result['page'] = page
+        result['per_page'] = per_page
+    _stats_cache[key] = (time.monotonic(), result)
+    if len(_stats_cache) > 1000:
+        _stats_cache.clear()
+    return result
 
-    if correct:
-        card['correct_count'] = int(card.get('correct_count', 0)) + 1
-    else:
-        card['incorrect_count'] = int(card.get('incorrect_count', 0)) + 1
 
-    card['last_reviewed'] = datetime.now().isoformat()
+def get_decks_stats(deck_ids, username) -> Dict[str, dict]:
+    """One user's review totals for several decks.
 
-    sid = str(deck_id)
-    _cards_col.update_one(
-        {'deck_id': sid, 'id': found_key},
-        {'$set': {
-            'correct_count': card.get('correct_count', 0),
-            'incorrect_count': card.get('incorrect_count', 0),
-            'last_reviewed': card.get('last_reviewed'),
-        }},
-    )
+    Card counts come from the decks' stored `len` and review totals from a
+    single aggregation over `card_progress` grouped by deck_id.  Unknown ids
+    are omitted.
+    """
+    ids = list(dict.fromkeys(str(d) for d in deck_ids))
+    if not ids:
+        return {}
+    sizes = {d['id']: _deck_size(d) for d in _decks_col.find({'id': {'$in': ids}}, {'_id': 0, 'id': 1, 'len': 1})}
+    totals = progress_model.progress_totals(username, list(sizes))
+    out = {}
+    for sid, size in sizes.items():
+        t = totals[sid]
+        out[sid] = _with_accuracy({
+            'total_cards': size,
+            'total_correct': t['total_correct'],
+            'total_incorrect': t['total_incorrect'],
+            'never_reviewed': max(0, size - t['reviewed']),
+        })
+    return out
 
-    return card
 
 def create_deck_permissions(deck_id, owner, reviewrs: Optional[list[str]] = None, editors: Optional[list[str]] = None):
     """Create a permission entry for a user on a deck."""
     sid = str(deck_id)
     _permissions_col.insert_one({'deck_id': sid, 'reviewers': reviewrs or [], 'editors': editors or [], 'owner': owner})
+    acl_model.on_deck_created(sid, owner, reviewrs, editors)
 
 def rem_deck_permissions(deck_id, field, value):
     """Remove `value` from an array field on the deck permission doc."""
     sid = str(deck_id)
     if value != "admin":
         _permissions_col.update_one({'deck_id': sid}, {'$pull': {field: value}})
+        acl_model.on_revoke(sid, field, value)
     
 def add_deck_permissions(deck_id, field, value):
     """Add `value` to an array field (e.g. 'editors' or 'reviewers') on the deck permission doc.
@@ -360,21 +951,11 @@ def add_deck_permissions(deck_id, field, value):
     """
     sid = str(deck_id)
     _permissions_col.update_one({'deck_id': sid}, {'$addToSet': {field: value}}, upsert=True)
+    acl_model.on_grant(sid, field, value)
     
 def create_deck(name, summary, owner, subject: Optional[str] = None, category: Optional[str] = None, tags: Optional[list] = None):
     """Create a new deck with the given name and summary."""
-    existing_ids = []
-    for deck in _decks_col.find({}):
-        try:
-            existing_ids.append(int(deck['id']))
-        except Exception:
-            pass
-    if existing_ids:
-        next_id = max(existing_ids) + 1
-    else:
-        next_id = 1
-    
-    deck_id = str(next_id)
+    deck_id = str(next_id(DECKS, block_size=DECK_ID_BLOCK_SIZE))
     new_deck = _make_deck_dict(deck_id, name, summary, cards_map={}, subject=subject, category=category, tags=tags)
     
     ##### FIX THIS \/
@@ -387,7 +968,10 @@ def create_deck(name, summary, owner, subject: Optional[str] = None, category: O
         'summary': summary,
         'subject': subject,
         'category': category,
-        'len': '0',
+        'len': 0,
+        'version': 1,
+        'version_seq': 1,
+        'updated_at': datetime.utcnow(),
     }
     _decks_col.insert_one(cdoc)
     if tags:
@@ -395,25 +979,72 @@ def create_deck(name, summary, owner, subject: Optional[str] = None, category: O
 
     return new_deck
 
+def clone_deck(deck_id, owner, name: Optional[str] = None):
+    """Copy a deck, its cards and tags into a new deck owned by `owner`.
+
+    Everything is copied server-side: one aggregation per collection reads
+    the source documents, rewrites `deck_id` and `$merge`s them into place,
+    so no card passes through Python and the cost in round trips does not
+    depend on the deck size.  Review progress is not copied.  The owner
+    gets the same permissions as for `create_deck`.
+
+    Returns:
+        dict | None: the new deck's metadata, or None if the source does not exist.
+    """
+    src = str(deck_id)
+    source = _decks_col.find_one({'id': src}, {'_id': 0, 'name': 1})
+    if not source:
+        return None
+    new_id = str(next_id(DECKS, block_size=DECK_ID_BLOCK_SIZE))
+    now = datetime.utcnow()
+
+    # cards and tags first, so the deck never appears without its cards
+    _cards_col.aggregate([
+        {'$match': {'deck_id': src}},
+        {'$project': {'_id': 0, 'deck_id': 0, 'v': 0}},
+        {'$set': {'deck_id': new_id, 'v': 1}},
+        {'$merge': {'into': _cards_col.name, 'whenMatched': 'fail', 'whenNotMatched': 'insert'}},
+    ])
+    _deck_tags_col.aggregate([
+        {'$match': {'deck_id': src}},
+        {'$project': {'_id': 0, 'deck_id': 0}},
+        {'$set': {'deck_id': new_id}},
+        {'$merge': {'into': _deck_tags_col.name, 'whenMatched': 'fail', 'whenNotMatched': 'insert'}},
+    ])
+    _decks_col.aggregate([
+        {'$match': {'id': src}},
+        {'$limit': 1},
+        {'$project': {'_id': 0, 'version_seq': 0}},
+        {'$set': {
+            'id': new_id,
+            # user-supplied strings are literals, never field paths ('$...')
+            'owner': {'$literal': owner},
+            'name': {'$literal': name} if name else '$name',
+            'cloned_from': src,
+            'len': _len_plus(0),
+            'version': 1,
+            'version_seq': 1,
+            'updated_at': now,
+        }},
+        {'$merge': {'into': _decks_col.name, 'whenMatched': 'fail', 'whenNotMatched': 'insert'}},
+    ])
+    create_deck_permissions(new_id, owner, [owner, "admin"], [owner, "admin"])
+    return get_deck_meta(new_id)
+
+def reserve_card_ids(deck_id, count: int) -> list:
+    """Reserve `count` new card ids for a deck in one round trip (bulk imports, AI decks)."""
+    return [str(i) for i in reserve_ids(card_seq(str(deck_id)), count)]
+
 def makePublic():
     ...
 
 def get_user_permissions(username):
-    """    """
-    user_doc = _profiles_col.find_one({'username': username})
-    if not user_doc:
-        return False
-    # Return only deck IDs where the username appears in each role
-    rev_docs = list(_permissions_col.find({'reviewers': username}))
-    rev_docs.extend(list(_permissions_col.find({'reviewers': "all"})))
-    edit_docs = list(_permissions_col.find({'editors': username}))
-    edit_docs.extend(list(_permissions_col.find({'editors': "all"})))
-    own_docs = list(_permissions_col.find({'owner': username}))
-
-    rev = [d.get('deck_id') for d in rev_docs if d.get('deck_id')]
-    edit = [d.get('deck_id') for d in edit_docs if d.get('deck_id')]
-    own = [d.get('deck_id') for d in own_docs if d.get('deck_id')]
-    return {'reviewer': list(set(rev)), 'editor': list(set(edit)), 'owner': list(set(own))}
+    """Return {'reviewer', 'editor', 'owner'} deck id lists for the user, or False if unknown.
+
+    Served from the per-process materialized ACL (see acl_model); "all"
+    wildcard decks are included in the reviewer/editor lists.
+    """
+    return acl_model.get_permissions(username)
 
 def add_deck_to_user(username, deck_id, role:str='owner'):
     """Add a user to the flashcard deck's permissions.
@@ -438,17 +1069,23 @@ def add_deck_to_user(username, deck_id, role:str='owner'):
     # normalize role names and perform the appropriate update
     r = role.lower()
     if r in ('owner',):
+        previous = perm.get('owner') if perm else None
         _permissions_col.update_one({'deck_id': sid}, {'$set': {'owner': username}})
+        if previous and previous != username:
+            acl_model.on_revoke(sid, 'owner', previous)
+        acl_model.on_grant(sid, 'owner', username)
         perm = _permissions_col.find_one({'deck_id': sid})
         return perm.get('owner') == username
 
     if r in ('editor', 'editors'):
         _permissions_col.update_one({'deck_id': sid}, {'$addToSet': {'editors': username}})
+        acl_model.on_grant(sid, 'editors', username)
         perm = _permissions_col.find_one({'deck_id': sid})
         return username in perm.get('editors', [])
 
     if r in ('reviewer', 'reviewers'):
         _permissions_col.update_one({'deck_id': sid}, {'$addToSet': {'reviewers': username}})
+        acl_model.on_grant(sid, 'reviewers', username)
         perm = _permissions_col.find_one({'deck_id': sid})
         return username in perm.get('reviewers', [])
 
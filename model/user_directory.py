@@ -0,0 +1,138 @@
+"""Process-local, password-free directory of user profiles.
+
+The directory is a list of compact entries::
+
+    {'id', 'username', 'name', 'profile_pic'}
+
+sorted by username and loaded with one projection-only query on
+`profiles` (no `authentication` join, so no password hashes).  It is
+cached per process for ``USER_DIRECTORY_TTL`` seconds (default 60);
+`create_user`, `delete_user_by_username` and `update_user_profile_pic` in
+login_model call `invalidate()` so this process sees their changes at once.
+
+Entries are kept in case-insensitive username order alongside a parallel
+list of ``(username.lower(), username)`` keys, which doubles as the prefix
+index behind `search_users` (bisect, no scan).
+
+Entries are shared between callers: treat them as read-only.
+"""
+import bisect
+import os
+import threading
+import time
+from typing import Collection, Dict, List, Optional, Tuple
+
+from .mongo import get_db
+
+_db = get_db()
+_profiles_col = _db.profiles
+
+DIRECTORY_FIELDS = ('id', 'username', 'name', 'profile_pic')
+USER_DIRECTORY_TTL = float(os.environ.get('USER_DIRECTORY_TTL', '60'))
+SEARCH_LIMIT_MAX = 50
+
+_lock = threading.Lock()
+# {'loaded': monotonic time, 'entries': [entry], 'keys': [(lowercased username, username)]}
+_state: Optional[Dict] = None
+
+
+def _entry(doc: Dict) -> Dict:
+    username = doc.get('username')
+    return {
+        'id': doc.get('id') or str(doc.get('_id')),
+        'username': username,
+        'name': doc.get('name') or username,
+        'profile_pic': doc.get('profile_pic') or None,
+    }
+
+
+def _key(username: str) -> Tuple[str, str]:
+    return (username.lower(), username)
+
+
+def _load() -> Dict:
+    docs = _profiles_col.find({}, {f: 1 for f in DIRECTORY_FIELDS})
+    entries = sorted((_entry(d) for d in docs if d.get('username')), key=lambda e: _key(e['username']))
+    return {'loaded': time.monotonic(), 'entries': entries, 'keys': [_key(e['username']) for e in entries]}
+
+
+def _current() -> Dict:
+    global _state
+    state = _state
+    if state is not None and time.monotonic() - state['loaded'] < USER_DIRECTORY_TTL:
+        return state
+    state = _load()
+    with _lock:
+        _state = state
+    return state
+
+
+def get_user_directory() -> List[Dict]:
+    """Every user's directory entry, sorted by username (cached; do not mutate)."""
+    return _current()['entries']
+
+
+def get_entry(username: str) -> Optional[Dict]:
+    """One user's directory entry, or None."""
+    state = _current()
+    key = _key(username)
+    i = bisect.bisect_left(state['keys'], key)
+    if i < len(state['keys']) and state['keys'][i] == key:
+        return state['entries'][i]
+    return None
+
+
+def search_users(prefix: str, limit: int = 10, after: Optional[str] = None,
+                 exclude: Collection[str] = ()) -> Tuple[List[Dict], Optional[str]]:
+    """Directory entries whose username starts with `prefix` (case-insensitive).
+
+    Results come in directory order, at most `limit` (capped at
+    SEARCH_LIMIT_MAX) per call, skipping usernames in `exclude`.  Pass the
+    returned cursor (the last username, or None when exhausted) back as
+    `after` for the next page.
+    """
+    limit = max(1, min(int(limit), SEARCH_LIMIT_MAX))
+    prefix = (prefix or '').lower()
+    state = _current()
+    keys, entries = state['keys'], state['entries']
+    start = bisect.bisect_right(keys, _key(after)) if after else bisect.bisect_left(keys, (prefix, ''))
+    out = []
+    i = start
+    while i < len(keys) and keys[i][0].startswith(prefix):
+        if keys[i][1] not in exclude:
+            if len(out) == limit:
+                return out, out[-1]['username']
+            out.append(entries[i])
+        i += 1
+    return out, None
+
+
+def invalidate(username: Optional[str] = None) -> None:
+    """Refresh one user's entry in place (or drop everything when `username` is None)."""
+    global _state
+    if username is None:
+        with _lock:
+            _state = None
+        return
+    with _lock:
+        state = _state
+    if state is None:
+        return  # nothing cached; the next read loads fresh
+    doc = _profiles_col.find_one({'username': username}, {f: 1 for f in DIRECTORY_FIELDS})
+    with _lock:
+        if _state is not state:
+            return  # reloaded meanwhile
+        # copy-on-write so readers iterating the old lists are unaffected
+        entries, keys = list(state['entries']), list(state['keys'])
+        key = _key(username)
+        i = bisect.bisect_left(keys, key)
+        present = i < len(keys) and keys[i] == key
+        if doc and present:
+            entries[i] = _entry(doc)
+        elif doc:
+            entries.insert(i, _entry(doc))
+            keys.insert(i, key)
+        elif present:
+            del entries[i]
+            del keys[i]
+        _state = {'loaded': state['loaded'], 'entries': entries, 'keys': keys}
@@ -3,13 +3,10 @@ Authentication routes: login and logout.
 """
 
 from flask import render_template, request, redirect, url_for, session, Blueprint
-from jwt import JWT
-from jwt.jwk import OctetJWK
-from datetime import datetime, timedelta
 from model.login_model import verify_user
 from model.login_model import delete_user_by_username
 from model.login_model import update_login_streak
-from utils.auth import JWT_SECRET_KEY, JWT_ALGORITHM, get_pepper_by_version, combine_password_and_pepper, ph, get_current_pepper_version
+from utils.auth import issue_token, verify_token, revoke_token, revoke_user, get_pepper_by_version, combine_password_and_pepper, ph, get_current_pepper_version
 from model.login_model import get_all_users
 
 #__all__ = ['auth_bp']
@@ -22,13 +19,9 @@ def login():
     """
     # If user already has a valid token, redirect to home
     if 'token' in session:
-        try:
-            _jwt = JWT()
-            _key = OctetJWK(JWT_SECRET_KEY.encode())
-            _jwt.decode(session['token'], _key, do_verify=True, algorithms={JWT_ALGORITHM})
+        if verify_token(session['token']) is not None:
             return redirect(url_for('home.index'))
-        except Exception:
-            session.pop('token', None)
+        session.pop('token', None)
     
     return render_template('login.html', users=get_all_users())
 
@@ -45,7 +38,7 @@ def login_post():
     # Get current pepper version and corresponding pepper from env/config
     current_version = get_current_pepper_version()
     if not current_version:
-        return render_template('signup.html', error='Server not configured properly.', users=get_all_users())
+        return render_template('signup.html', error='Server not configured properly.')
     pepper = get_pepper_by_version(current_version)
     pepperedPassword = combine_password_and_pepper(password, pepper)
     #Combines the password with the pepper
@@ -62,17 +55,8 @@ def login_post():
         # Update login streak (track daily logins)
         update_login_streak(user['username'])
         
-        # Create JWT token
-        token_payload = {
-            'username': user['username'],
-            'user_id': user['id'],
-            # python-jwt expects numeric `exp` (seconds since epoch)
-            'exp': int((datetime.utcnow() + timedelta(hours=24)).timestamp())
-        }
-
-        _jwt = JWT()
-        _key = OctetJWK(JWT_SECRET_KEY.encode())
-        token = _jwt.encode(token_payload, _key, alg=JWT_ALGORITHM)
+        # Create JWT token (valid for 24 hours)
+        token = issue_token(user['username'], user['id'])
 
         # Store token in session
         session['token'] = token
@@ -88,9 +72,9 @@ def login_post():
 @auth_bp.route('/logout', methods=['GET', 'POST'])
 def logout():
     """
-    Logout route that clears the session and redirects to login.
+    Logout route that revokes the token, clears the session and redirects to login.
     """
-    session.pop('token', None)
+    revoke_token(session.pop('token', None))
     session.pop('username', None)
     return redirect(url_for('auth.login'))
 
@@ -100,7 +84,8 @@ def delete_account():
     Delete account route that removes the user account and redirects to signup.
     """
     username = session.pop('username', None)
-    session.pop('token', None)
+    revoke_token(session.pop('token', None))
     if username:
+        revoke_user(username)
         delete_user_by_username(username)
     return redirect(url_for('signup.index'))
@@ -14,8 +14,7 @@ All routes require JWT authentication.
 from flask import Blueprint, request, jsonify, render_template, g
 from datetime import datetime
 from utils.auth import get_current_user_from_token  # Get current user from JWT token
-from model.login_model import get_user_by_username  # Get user profile data
-from model.studyData_model import get_user_study_data
+from utils.identity import current_profile, current_study_data, get_profiles  # Memoized user data
 from model.feed_post_model import (
     list_posts,
     get_post,
@@ -61,10 +60,10 @@ def feed_page():
         HTML template with current user's profile data loaded for display
     """
     # Fetch the full profile data for the current user from MongoDB
-    profile_data = get_user_by_username(g.current_user)
+    profile_data = current_profile()
     # Pass the profile data to the template so user can see their avatar/name
     return render_template(
-        "feed.html", username=g.current_user, profileData=profile_data, studyData=get_user_study_data(g.current_user)
+        "feed.html", username=g.current_user, profileData=profile_data, studyData=current_study_data()
     )
 
 
@@ -86,15 +85,13 @@ def get_posts():
     Posts are sorted by newest first (timestamp descending).
     """
     posts = list_posts()  # Get all posts from model layer
-    # Enrich posts with author profile pictures from user collection
+    # Enrich posts with author profile pictures: one query for all authors
+    profiles = get_profiles(p.get("author") for p in posts)
     for p in posts:
-        author = p.get("author")
-        if author:
-            # Look up user profile for this post's author
-            u = get_user_by_username(author)
-            if u and u.get("profile_pic"):
-                # Add author's profile picture URL to the post
-                p["author_profile_pic"] = u["profile_pic"]
+        u = profiles.get(p.get("author"))
+        if u and u.get("profile_pic"):
+            # Add author's profile picture URL to the post
+            p["author_profile_pic"] = u["profile_pic"]
     return jsonify(posts)
 
 
@@ -142,21 +139,20 @@ def get_single_post(post_id):
     if not post:
         return jsonify({"error": "Not found"}), 404
     
+    # Load the author's and every commenter's profile in one query
+    comments = post.get("comments") or []
+    profiles = get_profiles([post.get("author")] + [c.get("author") for c in comments])
+
     # Enrich main post author with profile picture
-    author = post.get("author")
-    if author:
-        u = get_user_by_username(author)
-        if u and u.get("profile_pic"):
-            post["author_profile_pic"] = u["profile_pic"]
+    u = profiles.get(post.get("author"))
+    if u and u.get("profile_pic"):
+        post["author_profile_pic"] = u["profile_pic"]
     
     # Enrich each comment's author with profile picture
-    comments = post.get("comments") or []
     for c in comments:
-        ca = c.get("author")
-        if ca:
-            cu = get_user_by_username(ca)  # Get commenter's profile
-            if cu and cu.get("profile_pic"):
-                c["author_profile_pic"] = cu["profile_pic"]  # Add their avatar
+        cu = profiles.get(c.get("author"))  # Commenter's profile
+        if cu and cu.get("profile_pic"):
+            c["author_profile_pic"] = cu["profile_pic"]  # Add their avatar
     
     return jsonify(post)
 
@@ -1,10 +1,18 @@
-from flask import Blueprint, render_template, g, request, abort, redirect, url_for, jsonify
+from flask import Blueprint, render_template, g, request, abort, redirect, url_for, jsonify, make_response, Response, stream_with_context
+from werkzeug.utils import secure_filename
 from utils.auth import get_current_user_from_token
-from model.login_model import get_all_users
-from model.studyData_model import get_user_permissions, get_user_decks, get_user_study_data, get_deck, update_card, add_card, delete_card, record_review, create_deck, add_deck_to_user, get_deck_by_id, update_deckInfo, delete_deck, add_deck_permissions, rem_deck_permissions, get_friends, get_deck_permissions, addTag, remTag
+from utils import deck_io
+from utils.identity import current_permissions, current_study_data, can_edit_deck, forget_identity
+from model.user_directory import search_users, SEARCH_LIMIT_MAX
+from model.studyData_model import list_user_decks, create_deck, add_deck_to_user, get_deck_by_id, get_deck_meta, get_owned_deck_ids, delete_deck, add_deck_permissions, rem_deck_permissions, get_friends, get_deck_permissions, save_deck_changes, get_deck_stats, get_decks_stats, get_deck_version, get_deck_changes, list_deck_cards, get_cards, CARD_PAGE_SIZE, import_cards, iter_deck_cards, clone_deck
+from model.progress_model import record_review, record_reviews, get_due_cards
+from model.review_log_model import get_daily_rollups, summarize_rollups
 from functools import wraps
+from datetime import timezone
+import csv
 import re
 import json
+import time
 
 flashcards_bp = Blueprint('flashcards', __name__)
 
@@ -14,45 +22,50 @@ Each view handles a specific UI page or API endpoint used by the
 flashcards frontend (listing, editing, studying, permissions, etc.).
 """
 
+def _deck_id_arg(args, kwargs):
+    """Pull deck_id from the view's kwargs or first positional arg."""
+    return kwargs.get('deck_id') if 'deck_id' in kwargs else (args[0] if args else None)
+
+
+def _owns_deck(deck_id):
+    """Fallback for decks whose `owner` field predates their permission doc."""
+    return str(deck_id) in get_owned_deck_ids(g.current_user, [deck_id])
+
+
+def _reviewable_decks(deck_ids):
+    """The subset of `deck_ids` the current user may review (study).
+
+    The one rule every review path uses: the cached ACL (owner or reviewer,
+    including the "all" wildcard), then the `_owns_deck` fallback for the
+    rest in a single query.
+    """
+    ids = list(dict.fromkeys(str(i) for i in deck_ids))
+    perms = current_permissions() or {}
+    readable = set(perms.get('owner', [])) | set(perms.get('reviewer', []))
+    allowed = {i for i in ids if i in readable}
+    rest = [i for i in ids if i not in allowed]
+    if rest:
+        allowed |= get_owned_deck_ids(g.current_user, rest)
+    return allowed
+
+
+def _can_review(deck_id):
+    return str(deck_id) in _reviewable_decks([deck_id])
+
+
 def require_edit_permission(fn):
     """Decorator: allow only users who can edit the given deck_id.
 
-    Checks the current user's permissions and deck ownership and aborts
-    with 403 if editing is not allowed.
+    Checks the current user's cached ACL (owner/editor, including the "all"
+    wildcard) and aborts with 403 if editing is not allowed.
     """
     @wraps(fn)
     def wrapper(*args, **kwargs):
-        # determine deck_id from kwargs or positional args
-        deck_id = kwargs.get('deck_id') if 'deck_id' in kwargs else (args[0] if args else None)
+        deck_id = _deck_id_arg(args, kwargs)
         if not deck_id:
             abort(400)
 
-        # permissions for current user (may return deck_id lists under 'editor'/'editor(s)')
-        perms = get_user_permissions(g.current_user)
-        if not perms:
-            abort(403)
-
-        editors = perms.get('editors') or perms.get('editor') or []
-        owners = perms.get('owner') or []
-
-        allowed = False
-        # editors may be a list of usernames or a list of deck_ids
-        if isinstance(editors, list):
-            if g.current_user in editors or str(deck_id) in editors:
-                allowed = True
-
-        # owners may be a list of deck_ids (or usernames in some schemas)
-        if isinstance(owners, list):
-            if g.current_user in owners or str(deck_id) in owners:
-                allowed = True
-
-        # also check deck's owner field directly
-        if not allowed:
-            deck = get_deck_by_id(deck_id)
-            if deck and deck.get('owner') == g.current_user:
-                allowed = True
-
-        if not allowed:
+        if not (can_edit_deck(deck_id) or _owns_deck(deck_id)):
             abort(403)
 
         return fn(*args, **kwargs)
@@ -67,38 +80,11 @@ def require_review_permission(fn):
     """
     @wraps(fn)
     def wrapper(*args, **kwargs):
-        # determine deck_id from kwargs or positional args
-        deck_id = kwargs.get('deck_id') if 'deck_id' in kwargs else (args[0] if args else None)
+        deck_id = _deck_id_arg(args, kwargs)
         if not deck_id:
             abort(400)
 
-        # permissions for current user (may return deck_id lists under 'editor'/'editor(s)')
-        perms = get_user_permissions(g.current_user)
-        if not perms:
-            abort(403)
-
-        # reviewers may be stored under 'reviewers' or 'reviewer'
-        editors = perms.get('reviewers') or perms.get('reviewer') or []
-        owners = perms.get('owner') or []
-
-        allowed = False
-        # editors may be a list of usernames or a list of deck_ids
-        if isinstance(editors, list):
-            if g.current_user in editors or str(deck_id) in editors:
-                allowed = True
-
-        # owners may be a list of deck_ids (or usernames in some schemas)
-        if isinstance(owners, list):
-            if g.current_user in owners or str(deck_id) in owners:
-                allowed = True
-
-        # also check deck's owner field directly
-        if not allowed:
-            deck = get_deck_by_id(deck_id)
-            if deck and deck.get('owner') == g.current_user:
-                allowed = True
-
-        if not allowed:
+        if not _can_review(deck_id):
             abort(403)
 
         return fn(*args, **kwargs)
@@ -120,8 +106,28 @@ def require_auth():
 
 @flashcards_bp.route('/', endpoint='index')
 def flashcards_index():
-    """Render the main flashcards listing page for the current user."""
-    return render_template('flashcards.html', username=g.current_user, users=get_all_users(), decks=get_user_decks(g.current_user), permissions=get_user_permissions(g.current_user), studyData=get_user_study_data(g.current_user))
+    """Render the main flashcards listing page for the current user.
+
+    Decks are paged (`?sort=name|recent&cursor=...`) and carry metadata only.
+    """
+    sort = request.args.get('sort', 'name')
+    page = list_user_decks(g.current_user, sort=sort, limit=request.args.get('limit', 50, type=int), cursor=request.args.get('cursor'))
+    return render_template('flashcards.html', username=g.current_user, decks=page['decks'], total_decks=page['total'], next_cursor=page['next_cursor'], sort=sort, permissions=current_permissions(), studyData=current_study_data())
+
+
+@flashcards_bp.route('/api/decks', methods=['GET'])
+def flashcards_list_decks():
+    """Return a page of the user's decks (metadata only) as JSON.
+
+    Query args: sort (name|recent), limit, cursor (from `next_cursor`).
+    """
+    page = list_user_decks(
+        g.current_user,
+        sort=request.args.get('sort', 'name'),
+        limit=request.args.get('limit', 50, type=int),
+        cursor=request.args.get('cursor'),
+    )
+    return jsonify({'ok': True, **page})
 
 @flashcards_bp.route('/<deck_id>/', endpoint='deck')
 @require_review_permission
@@ -130,7 +136,81 @@ def flashcards_deck(deck_id):
     deck_obj = get_deck_by_id(deck_id)
     if not deck_obj:
         return render_template('404.html'), 404
-    return render_template('flashcard_deck.html', username=g.current_user, users=get_all_users(), deck=deck_obj, deck_id=deck_id, studyData=get_user_study_data(g.current_user))
+    return render_template('flashcard_deck.html', username=g.current_user, deck=deck_obj, deck_id=deck_id, studyData=current_study_data())
+
+def _deck_etag(deck_id, version):
+    return f'deck-{deck_id}-v{version}'
+
+
+def _deck_not_modified(deck_id, info):
+    """Return a 304 response if the client's validators match the deck version, else None."""
+    etag = _deck_etag(deck_id, info['version'])
+    if request.if_none_match:
+        matched = request.if_none_match.contains(etag)
+    elif request.if_modified_since and info.get('updated_at'):
+        updated = info['updated_at'].replace(tzinfo=timezone.utc, microsecond=0)
+        matched = updated <= request.if_modified_since
+    else:
+        matched = False
+    if not matched:
+        return None
+    return _with_deck_validators(make_response('', 304), deck_id, info)
+
+
+def _with_deck_validators(resp, deck_id, info):
+    resp.set_etag(_deck_etag(deck_id, info['version']))
+    if info.get('updated_at'):
+        resp.last_modified = info['updated_at'].replace(tzinfo=timezone.utc)
+    # private: the ACL decides who may see it; no-cache: always revalidate
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp
+
+
+@flashcards_bp.route('/<deck_id>/json', endpoint='deck_json', methods=['GET'])
+@require_review_permission
+def flashcards_deck_json(deck_id):
+    """Return the whole deck (metadata, tags, cards) as JSON.
+
+    Carries ``ETag``/``Last-Modified`` from the deck version and answers
+    ``304`` without loading any cards when the client's copy is current.
+    """
+    info = get_deck_version(deck_id)
+    if not info:
+        return jsonify({'ok': False, 'error': 'deck not found'}), 404
+    not_modified = _deck_not_modified(deck_id, info)
+    if not_modified:
+        return not_modified
+    deck = get_deck_by_id(deck_id)
+    if not deck:
+        return jsonify({'ok': False, 'error': 'deck not found'}), 404
+    return _with_deck_validators(jsonify({'ok': True, 'deck': deck}), deck_id, deck)
+
+
+@flashcards_bp.route('/<deck_id>/changes', endpoint='deck_changes', methods=['GET'])
+@require_review_permission
+def flashcards_deck_changes(deck_id):
+    """Return only what changed in a deck since ``?since=<version>``.
+
+    The response holds the current metadata and version, the cards written
+    after ``since`` and the ids of cards deleted after it; apply it to a
+    cached copy and keep the new version for the next call.
+    """
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify({'ok': False, 'error': 'missing since'}), 400
+    info = get_deck_version(deck_id)
+    if not info:
+        return jsonify({'ok': False, 'error': 'deck not found'}), 404
+    not_modified = _deck_not_modified(deck_id, info)
+    if not_modified:
+        return not_modified
+    if since >= info['version']:
+        return _with_deck_validators(jsonify({'ok': True, 'version': info['version'], 'since': since, 'cards': [], 'deleted': []}), deck_id, info)
+    changes = get_deck_changes(deck_id, since)
+    if not changes:
+        return jsonify({'ok': False, 'error': 'deck not found'}), 404
+    return _with_deck_validators(jsonify({'ok': True, **changes}), deck_id, changes['deck'])
+
 
 @flashcards_bp.route('/<deck_id>/delete', endpoint='delete', methods=['POST'])
 @require_edit_permission
@@ -144,57 +224,108 @@ def flashcards_delete(deck_id):
 @flashcards_bp.route('/<deck_id>/stats', endpoint='stats', methods=['GET'])
 @require_review_permission
 def flashcards_stats(deck_id):
-    """Return JSON statistics and normalized card list for a deck.
+    """Return the current user's review statistics for a deck as JSON.
 
-    Used by frontend JS to show deck stats without a full page reload.
+    Totals, accuracy distribution and most-missed cards are aggregated in
+    MongoDB from the user's card progress. Card bodies are only included with ``?cards=1`` and are paged
+    with ``page``/``per_page``; ``top`` sets how many most-missed cards to return.
     """
-    deck_obj = get_deck_by_id(deck_id)
-    if not deck_obj:
+    result = get_deck_stats(
+        deck_id,
+        g.current_user,
+        top_k=request.args.get('top', 10, type=int),
+        include_cards=request.args.get('cards', '0') in ('1', 'true', 'yes'),
+        page=request.args.get('page', 1, type=int),
+        per_page=request.args.get('per_page', 100, type=int),
+    )
+    if not result:
         return jsonify({'ok': False, 'error': 'deck not found'}), 404
+    return jsonify(result)
 
-    # normalize cards mapping (cards may be stored as dicts or objects)
-    cards_map = deck_obj.get('cards', {}) if isinstance(deck_obj, dict) else getattr(deck_obj, 'cards', {}) or {}
-    total_cards = len(cards_map)
-    total_correct = 0
-    total_incorrect = 0
-
-    cards_list = []
-    for key, card in cards_map.items():
-        # card may be dict or object
-        if isinstance(card, dict):
-            front = card.get('front')
-            back = card.get('back')
-            correct_count = int(card.get('correct_count', 0))
-            incorrect_count = int(card.get('incorrect_count', 0))
-        else:
-            front = getattr(card, 'front', None)
-            back = getattr(card, 'back', None)
-            correct_count = int(getattr(card, 'correct_count', 0) or 0)
-            incorrect_count = int(getattr(card, 'incorrect_count', 0) or 0)
-
-        total_correct += correct_count
-        total_incorrect += incorrect_count
-
-        cards_list.append({
-            'id': str(key),
-            'front': front,
-            'back': back,
-            'correct_count': correct_count,
-            'incorrect_count': incorrect_count,
-        })
 
-    stats = {
-        'total_cards': total_cards,
-        'total_correct': total_correct,
-        'total_incorrect': total_incorrect,
-    }
+MAX_STATS_BATCH = 200
+
 
-    deck_meta = {
-        'id': deck_id,
-        'name': deck_obj.get('name') if isinstance(deck_obj, dict) else getattr(deck_obj, 'name', None)
+@flashcards_bp.route('/api/stats', endpoint='stats_batch', methods=['GET', 'POST'])
+def flashcards_stats_batch():
+    """Return review totals for many decks in one response.
+
+    Deck ids come from ``?ids=1,2,3`` or a JSON body ``{"deck_ids": [...]}``.
+    The user's ACL is checked once; ids the user cannot review are listed
+    under ``denied`` instead of failing the whole request.
+    """
+    if request.method == 'POST':
+        ids = (request.get_json(silent=True) or {}).get('deck_ids') or []
+    else:
+        ids = [i for i in request.args.get('ids', '').split(',') if i]
+    if not isinstance(ids, list):
+        return jsonify({'ok': False, 'error': 'deck_ids must be a list'}), 400
+    ids = list(dict.fromkeys(str(i) for i in ids))
+    if len(ids) > MAX_STATS_BATCH:
+        return jsonify({'ok': False, 'error': f'at most {MAX_STATS_BATCH} decks per request'}), 400
+
+    readable = _reviewable_decks(ids)
+    allowed = [i for i in ids if i in readable]
+    return jsonify({
+        'ok': True,
+        'stats': get_decks_stats(allowed, g.current_user),
+        'denied': [i for i in ids if i not in readable],
+    })
+
+
+def _parse_tags_field(tags_field):
+    """Parse the tagify field (JSON like [{"value": "History"}, ...]) into a set."""
+    try:
+        parsed = json.loads(tags_field) if isinstance(tags_field, str) else tags_field
+        tags = set()
+        if isinstance(parsed, list):
+            for item in parsed:
+                if isinstance(item, dict) and 'value' in item:
+                    tags.add(item['value'])
+                elif isinstance(item, str):
+                    tags.add(item)
+        return tags
+    except Exception:
+        # fallback to previous regex extraction for malformed strings
+        return set(re.findall(r'"value"\s*:\s*"([^\"]+?)"', tags_field))
+
+
+def _deck_diff_from_form(deck_obj, form):
+    """Compare the edit form against the loaded deck and return save_deck_changes kwargs."""
+    old_tags = set(deck_obj.get('tags') or [])
+    new_tags = _parse_tags_field(form.get('tags') or '[]')
+
+    updates, deletes = {}, []
+    for card_key, cur in deck_obj.get('cards', {}).items():
+        # deletion checkbox
+        if form.get(f'delete_{card_key}'):
+            deletes.append(card_key)
+            continue
+        front = form.get(f'front_{card_key}')
+        back = form.get(f'back_{card_key}')
+        if front is None or back is None:
+            continue
+        if front != cur.get('front') or back != cur.get('back'):
+            updates[card_key] = {'front': front, 'back': back}
+
+    meta = {}
+    if form.get('deck_name'):
+        meta['name'] = form.get('deck_name')
+    if form.get('deck_summary'):
+        meta['summary'] = form.get('deck_summary')
+
+    adds = [{'front': f, 'back': b} for f, b in zip(form.getlist('new_front[]'), form.getlist('new_back[]'))]
+    return {
+        'updates': updates,
+        'deletes': deletes,
+        'adds': adds,
+        'add_tags': new_tags - old_tags,
+        'remove_tags': old_tags - new_tags,
+        'meta': meta,
     }
 
-    return jsonify({'deck': deck_meta, 'stats': stats, 'cards': cards_list})
+
+_CARD_FIELD_RE = re.compile(r'^(?:front|back|delete)_(.+)$')
 
 
 @flashcards_bp.route('/<deck_id>/edit', endpoint='edit', methods=['GET', 'POST'])
@@ -202,97 +333,233 @@ def flashcards_stats(deck_id):
 def flashcards_edit(deck_id):
     """Edit a deck: render the edit UI and handle form POST updates.
 
-    Handles tag diffs, per-card edits/deletes, and adding new cards.
+    The page renders the first page of cards; the rest are fetched from
+    ``/<deck_id>/cards`` as the user scrolls.  The POST loads only the cards
+    named in the form, diffs them once and applies every tag and card
+    change in bulk (see `save_deck_changes`).
     """
-    from model.studyData_model import get_deck_by_id
-    deck_obj = get_deck_by_id(deck_id)
+    deck_obj = get_deck_meta(deck_id)
     if not deck_obj:
         return render_template('404.html'), 404
     
-    # get friend profiles via model helper
-    friends = get_friends(g.current_user)
     if request.method == 'POST':
-        form = request.form
-        #re.findall('\Value')
-        #Tag handeling
-        oldDeckTags = set(deck_obj.get('tags') or [])
-        tags_field = form.get('tags') or '[]'
-        # try to parse JSON array like [{"value":"History"}, ...]
+        card_ids = {m.group(1) for m in map(_CARD_FIELD_RE.match, request.form.keys()) if m}
+        deck_obj['cards'] = get_cards(deck_id, card_ids)
+        save_deck_changes(deck_id, **_deck_diff_from_form(deck_obj, request.form))
+        return redirect(url_for('flashcards.edit', deck_id=deck_id))
+
+    first_page = list_deck_cards(deck_id, limit=request.args.get('limit', CARD_PAGE_SIZE, type=int))
+    # get friend profiles via model helper
+    return render_template('flashcard_edit.html', username=g.current_user, deck=deck_obj, cards=first_page['cards'], next_after=first_page['next_after'], deck_id=deck_id, studyData=current_study_data())
+
+
+@flashcards_bp.route('/<deck_id>/cards', endpoint='cards', methods=['GET'])
+@require_review_permission
+def flashcards_cards(deck_id):
+    """Return one page of a deck's cards as JSON.
+
+    Query args: ``after`` (the previous page's ``next_after``) and ``limit``
+    (default ``CARD_PAGE_SIZE``, at most ``CARD_PAGE_MAX``).  Keep requesting
+    while ``next_after`` is not null.
+    """
+    info = get_deck_version(deck_id)
+    if not info:
+        return jsonify({'ok': False, 'error': 'deck not found'}), 404
+    page = list_deck_cards(
+        deck_id,
+        after=request.args.get('after'),
+        limit=request.args.get('limit', CARD_PAGE_SIZE, type=int),
+    )
+    return jsonify({'ok': True, 'version': info['version'], **page})
+
+
+@flashcards_bp.route('/<deck_id>/import', endpoint='import_cards', methods=['POST'])
+@require_edit_permission
+def flashcards_import(deck_id):
+    """Stream cards into a deck from CSV, NDJSON or Anki-style TSV.
+
+    Send the file as multipart field ``file`` or as the raw request body;
+    ``?format=csv|ndjson|anki`` overrides the format guessed from the file
+    name.  The upload is parsed line by line and inserted in batches.
+    Returns JSON with counts and throughput; an unreadable row (bad format,
+    invalid UTF-8, oversized CSV field) gives a 400 carrying the number of
+    cards already imported before it.
+    """
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    fmt = request.args.get('format') or deck_io.guess_format(upload.filename if upload else '')
+    if fmt not in deck_io.FORMATS:
+        return jsonify({'ok': False, 'error': f'format must be one of {", ".join(deck_io.FORMATS)}'}), 400
+
+    failure = {}
+
+    def rows():
+        # stop cleanly at the first unreadable row so the cards before it are still written
         try:
-            parsed = json.loads(tags_field) if isinstance(tags_field, str) else tags_field
-            newDeckTags = set()
-            if isinstance(parsed, list):
-                for item in parsed:
-                    if isinstance(item, dict) and 'value' in item:
-                        newDeckTags.add(item['value'])
-                    elif isinstance(item, str):
-                        newDeckTags.add(item)
-            else:
-                newDeckTags = set()
-        except Exception:
-            # fallback to previous regex extraction for malformed strings
-            newDeckTags = set(re.findall(r'"value"\s*:\s*"([^\"]+?)"', tags_field))
-        
-        removeTags = oldDeckTags.difference(newDeckTags)
-        addTags = newDeckTags.difference(oldDeckTags)
-        for i in removeTags:
-            remTag(deck_id, i)
-        for i in addTags:
-            addTag(deck_id, i)
-            
-        
-        # existing cards
-        existing_cards = list(deck_obj.get('cards', {}).keys()) if isinstance(deck_obj, dict) else list(getattr(deck_obj, 'cards', {}).keys())
-        for cardn in existing_cards:
-            card_key = str(cardn)
-            # deletion checkbox
-            if form.get(f'delete_{card_key}'):
-                delete_card(deck_id, card_key)
-                continue
-
-            front = form.get(f'front_{card_key}')
-            back = form.get(f'back_{card_key}')
-            if front is None or back is None:
-                continue
-            # compare with current values
-            cur = deck_obj.get('cards', {}).get(cardn) if isinstance(deck_obj, dict) else getattr(deck_obj, 'cards', {}).get(cardn)
-            cur_front = cur.get('front') if isinstance(cur, dict) else getattr(cur, 'front', None)
-            cur_back = cur.get('back') if isinstance(cur, dict) else getattr(cur, 'back', None)
-            if front != cur_front or back != cur_back:
-                update_card(deck_id, card_key, front, back)
-
-        # new cards arrays
-        if form.get('deck_name'):
-            update_deckInfo(deck_id, name=form.get('deck_name'))
-        if form.get('deck_summary'):
-            update_deckInfo(deck_id, summary=form.get('deck_summary'))
-
-        new_fronts = form.getlist('new_front[]')
-        new_backs = form.getlist('new_back[]')
-        for f, b in zip(new_fronts, new_backs):
-            if not f and not b:
-                continue
-            add_card(deck_id, f, b)
+            yield from deck_io.read_cards(fmt, deck_io.iter_text_lines(stream))
+        except (deck_io.ImportFormatError, UnicodeDecodeError, csv.Error) as e:
+            failure['error'] = e
 
-        return redirect(url_for('flashcards.edit', deck_id=deck_id))
+    result = import_cards(deck_id, rows())
+    if result is None:
+        return jsonify({'ok': False, 'error': 'deck not found'}), 404
+    if failure:
+        # the cards before the bad row are committed; the client can resume after them
+        e = failure['error']
+        message = f'file is not valid UTF-8: {e.reason}' if isinstance(e, UnicodeDecodeError) else str(e)
+        return jsonify({'ok': False, 'error': message, 'line': getattr(e, 'line', None),
+                        'imported': result['imported'], 'version': result['version']}), 400
+    print(f"import: deck {deck_id}: {result['imported']} cards in {result['seconds']}s ({result['cards_per_second']} cards/s)")
+    return jsonify({'ok': True, 'format': fmt, **result})
+
+
+@flashcards_bp.route('/<deck_id>/export', endpoint='export_cards', methods=['GET'])
+@require_review_permission
+def flashcards_export(deck_id):
+    """Stream a deck's cards as CSV (default), NDJSON or Anki-style TSV.
+
+    The response is generated from a database cursor, so the deck is never
+    materialized; throughput is logged when the stream finishes.
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in deck_io.FORMATS:
+        return jsonify({'ok': False, 'error': f'format must be one of {", ".join(deck_io.FORMATS)}'}), 400
+    deck = get_deck_meta(deck_id)
+    if not deck:
+        return jsonify({'ok': False, 'error': 'deck not found'}), 404
+
+    def generate():
+        started = time.monotonic()
+        count = 0
+
+        def counted(cards):
+            nonlocal count
+            for card in cards:
+                count += 1
+                yield card
+
+        yield from deck_io.write_cards(fmt, counted(iter_deck_cards(deck_id)))
+        elapsed = time.monotonic() - started
+        rate = round(count / elapsed) if elapsed > 0 else count
+        print(f"export: deck {deck_id}: {count} cards as {fmt} in {elapsed:.3f}s ({rate} cards/s)")
+
+    filename = secure_filename(deck.get('name') or '') or f'deck-{deck_id}'
+    return Response(
+        stream_with_context(generate()),
+        mimetype=deck_io.MIMETYPES[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}.{deck_io.EXTENSIONS[fmt]}"'},
+    )
+
+
+def _patch_error(data):
+    """Describe the first malformed part of a /save patch, or None if it is well-formed."""
+    updates = data.get('updates') or {}
+    if not isinstance(updates, dict) or not all(isinstance(f, dict) for f in updates.values()):
+        return 'updates must be an object of {card_id: {front, back}}'
+    adds = data.get('adds') or []
+    if not isinstance(adds, list) or not all(isinstance(a, dict) for a in adds):
+        return 'adds must be a list of {front, back} objects'
+    for key, kinds in (('deletes', (str, int)), ('add_tags', str), ('remove_tags', str)):
+        values = data.get(key) or []
+        if not isinstance(values, list) or not all(isinstance(v, kinds) for v in values):
+            return f'{key} must be a list of ' + ('card ids' if key == 'deletes' else 'strings')
+    if not isinstance(data.get('meta') or {}, dict):
+        return 'meta must be an object'
+    return None
+
+
+@flashcards_bp.route('/<deck_id>/save', methods=['POST'])
+@require_edit_permission
+def flashcards_save(deck_id):
+    """Apply a JSON deck patch in bulk and return the new deck version.
+
+    Expects JSON with any of: updates ({card_id: {front, back}}), deletes
+    ([card_id]), adds ([{front, back}]), add_tags, remove_tags, and meta
+    ({name, summary, subject, category}).
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'ok': False, 'error': 'missing patch payload'}), 400
+    error = _patch_error(data)
+    if error:
+        return jsonify({'ok': False, 'error': error}), 400
+    version = save_deck_changes(
+        deck_id,
+        updates=data.get('updates') or {},
+        deletes=data.get('deletes') or [],
+        adds=data.get('adds') or [],
+        add_tags=data.get('add_tags') or [],
+        remove_tags=data.get('remove_tags') or [],
+        meta=data.get('meta') or {},
+    )
+    if version is None:
+        return jsonify({'ok': False, 'error': 'deck not found'}), 404
+    return jsonify({'ok': True, 'version': version})
+
+STUDY_BATCH_SIZE = 20
 
-    return render_template('flashcard_edit.html', username=g.current_user, users=get_all_users(), deck=deck_obj, deck_id=deck_id, friends=friends, studyData=get_user_study_data(g.current_user))
 
 @flashcards_bp.route('/<deck_id>/study', endpoint='study')
 @require_review_permission
 def flashcards_study(deck_id):
-    """Render the study view for a deck (flashcard review UI)."""
+    """Render the study view for a deck (flashcard review UI).
+
+    Only the first batch of due cards is rendered; the page pulls the next
+    batch from ``/api/due`` when it runs out.
+    """
     if not deck_id:
         abort(400)
-    return render_template('flashcard_study.html', username=g.current_user, users=get_all_users(), permissions=get_user_permissions(g.current_user), deck=get_deck(deck_id), deck_id=deck_id, studyData=get_user_study_data(g.current_user))
+    deck = get_deck_meta(deck_id)
+    if not deck:
+        return render_template('404.html'), 404
+    due_cards = get_due_cards(g.current_user, deck_id, limit=STUDY_BATCH_SIZE)
+    return render_template('flashcard_study.html', username=g.current_user, permissions=current_permissions(), deck=deck, due_cards=due_cards, batch_size=STUDY_BATCH_SIZE, deck_id=deck_id, studyData=current_study_data())
+
+
+@flashcards_bp.route('/api/due', endpoint='due', methods=['GET'])
+def flashcards_due():
+    """Return the next cards due for review (SM-2 order) as JSON.
+
+    Query args: deck_id (omit for all of the user's decks), limit,
+    new=0 to leave out never-reviewed cards.
+    """
+    deck_id = request.args.get('deck_id')
+    if deck_id and not _can_review(deck_id):
+        abort(403)
+    cards = get_due_cards(
+        g.current_user,
+        deck_id or None,
+        limit=request.args.get('limit', STUDY_BATCH_SIZE, type=int),
+        include_new=request.args.get('new', '1') not in ('0', 'false', 'no'),
+    )
+    return jsonify({'ok': True, 'cards': cards})
+
+
+@flashcards_bp.route('/api/analytics', endpoint='analytics', methods=['GET'])
+def flashcards_analytics():
+    """Return daily accuracy and retention for a deck, or for the current user.
+
+    Query args: deck_id (omit for the user's own curve), days (default 30).
+    Served from the precomputed daily rollups only, never the raw review log.
+    """
+    deck_id = request.args.get('deck_id')
+    if deck_id:
+        if not _can_review(deck_id):
+            abort(403)
+        scope, key = 'deck', deck_id
+    else:
+        scope, key = 'user', g.current_user
+    days = get_daily_rollups(scope, key, days=request.args.get('days', 30, type=int))
+    return jsonify({'ok': True, 'scope': scope, 'key': key, 'summary': summarize_rollups(days), 'days': days})
+
 
 @flashcards_bp.route('/study/review', methods=['POST'])
-@require_review_permission
 def flashcards_review():
-    """Accept review results and call Card.review on the server-side card instance.
+    """Record one review result for a card.
 
     Expects JSON or form data with: deck_id, card_id, correct (true/false or 1/0).
-    Returns JSON with the updated card review info.
+    The permission check uses the cached ACL and the update is a single
+    atomic write; returns JSON with the updated card review info.
     """
     data = request.get_json(silent=True) or request.form
     deck_id = data.get('deck_id')
@@ -301,32 +568,69 @@ def flashcards_review():
     if deck_id is None or card_id is None or correct is None:
         return jsonify({'ok': False, 'error': 'missing parameters'}), 400
 
+    if not _can_review(deck_id):
+        abort(403)
+
     # normalize correct
     if isinstance(correct, str):
         correct_val = correct.lower() in ('1', 'true', 'yes', 'on')
     else:
         correct_val = bool(correct)
 
-    deck = get_deck(deck_id)
-    if not deck:
-        return jsonify({'ok': False, 'error': 'deck not found'}), 404
-
-    # find matching card key (cards keys may be int or str)
-    found_key = None
-    for k in deck.get('cards', {}).keys():
-        if str(k) == str(card_id):
-            found_key = str(k)
-            break
-
-    if not found_key:
-        return jsonify({'ok': False, 'error': 'card not found'}), 404
-
-    updated = record_review(deck_id, found_key, correct_val)
+    updated = record_review(g.current_user, deck_id, card_id, correct_val)
     if not updated:
-        return jsonify({'ok': False, 'error': 'failed to record review'}), 500
+        return jsonify({'ok': False, 'error': 'card not found'}), 404
     return jsonify({'ok': True, 'result': updated})
  
 
+MAX_REVIEW_BATCH = 500
+
+
+@flashcards_bp.route('/study/reviews', methods=['POST'])
+def flashcards_review_batch():
+    """Record a batch of review results in one request.
+
+    Expects JSON ``{"reviews": [{deck_id, card_id, correct, reviewed_at?}, ...]}``
+    (or the bare array).  Permission is checked once per deck and the
+    writes go out as one bulk write.  Returns one result per event, in order.
+    """
+    data = request.get_json(silent=True)
+    events = data.get('reviews') if isinstance(data, dict) else data
+    if not isinstance(events, list):
+        return jsonify({'ok': False, 'error': 'missing reviews payload'}), 400
+    if len(events) > MAX_REVIEW_BATCH:
+        return jsonify({'ok': False, 'error': f'at most {MAX_REVIEW_BATCH} reviews per batch'}), 413
+
+    results = [None] * len(events)
+    reviewable = _reviewable_decks(
+        str(ev['deck_id']) for ev in events if isinstance(ev, dict) and ev.get('deck_id') is not None
+    )
+    valid, valid_idx = [], []
+    for i, ev in enumerate(events):
+        if not isinstance(ev, dict) or ev.get('deck_id') is None or ev.get('card_id') is None or ev.get('correct') is None:
+            results[i] = {'ok': False, 'error': 'missing parameters'}
+            continue
+        deck_id = str(ev['deck_id'])
+        if deck_id not in reviewable:
+            results[i] = {'ok': False, 'error': 'forbidden'}
+            continue
+        correct = ev['correct']
+        if isinstance(correct, str):
+            correct = correct.lower() in ('1', 'true', 'yes', 'on')
+        reviewed_at = ev.get('reviewed_at')
+        valid.append({
+            'deck_id': deck_id,
+            'card_id': ev['card_id'],
+            'correct': bool(correct),
+            'reviewed_at': reviewed_at if isinstance(reviewed_at, str) else None,
+        })
+        valid_idx.append(i)
+
+    for i, res in zip(valid_idx, record_reviews(g.current_user, valid)):
+        results[i] = res
+    return jsonify({'ok': all(r['ok'] for r in results), 'results': results})
+
+
 @flashcards_bp.route('/new_deck',endpoint='new_deck', methods=['get'])
 def flashcards_new_deck():
     """Create a new deck and redirect to its edit page.
@@ -341,6 +645,23 @@ def flashcards_new_deck():
     return redirect(url_for('flashcards.edit', deck_id = deck['id']))
 
 
+@flashcards_bp.route('/<deck_id>/clone', endpoint='clone', methods=['POST'])
+@require_review_permission
+def flashcards_clone(deck_id):
+    """Fork a deck the user can study into their own editable copy.
+
+    Optional form/JSON field ``name`` names the copy.  Redirects to the new
+    deck's edit page, or returns JSON for JSON requests.
+    """
+    data = request.get_json(silent=True) or request.form
+    deck = clone_deck(deck_id, g.current_user, name=(data.get('name') or '').strip() or None)
+    if not deck:
+        return jsonify({'ok': False, 'error': 'deck not found'}), 404
+    if request.is_json:
+        return jsonify({'ok': True, 'deck': deck})
+    return redirect(url_for('flashcards.edit', deck_id=deck['id']))
+
+
 @flashcards_bp.route('/<deck_id>/share', methods=['POST'])
 @require_edit_permission
 def flashcards_share(deck_id):
@@ -373,6 +694,8 @@ def flashcards_share(deck_id):
 
         results.append({'username': uname, 'ok': True})
 
+    # the caller may have changed their own access
+    forget_identity()
     return jsonify({'ok': True, 'results': results})
 
 
@@ -399,27 +722,58 @@ def flashcards_permissions(deck_id):
         pass
     return jsonify({'ok': True, 'permissions': perm})
 
-@flashcards_bp.route('/userlist', methods=['GET'])
-def returnUserList():
-    """Designed for getting a list of usrs to share flashcard decks with, returns a list of users from the database, and adds the 'all' for all users. Returns a list. """
-    users = get_all_users() or []
-    # get_all_users returns list of user dicts; normalize to usernames
-    usernames = []
-    seen = set()
-    for u in users:
-        name = None
+USER_SEARCH_LIMIT = 10
+# never offered in the share dialog
+_HIDDEN_SHARE_USERS = frozenset({'admin'})
+
+
+def _share_candidate(username, name=None, profile_pic=None, friend=False):
+    return {'username': username, 'name': name or username, 'profile_pic': profile_pic, 'friend': friend}
+
+
+@flashcards_bp.route('/<deck_id>/share/users', methods=['GET'], endpoint='share_users')
+@require_edit_permission
+def share_users(deck_id):
+    """Typeahead for the share dialog: users whose username starts with `q`.
+
+    Query args: q (prefix, may be empty), limit (default 10, max 50) and
+    cursor (from a previous page's `next_cursor`).  The current user's
+    matching friends come first, then the 'all' wildcard, then everyone
+    else in username order from the in-memory user directory.  Cursors are
+    'p:<offset>' inside the pinned friends and 'u:<username>' after them.
+    """
+    prefix = (request.args.get('q') or '').strip()
+    limit = max(1, min(request.args.get('limit', USER_SEARCH_LIMIT, type=int) or USER_SEARCH_LIMIT, SEARCH_LIMIT_MAX))
+    cursor = request.args.get('cursor') or 'p:0'
+    low = prefix.lower()
+
+    pinned = sorted(
+        (
+            _share_candidate(f['username'], f.get('display_name') or f.get('name'), friend=True)
+            for f in get_friends(g.current_user)
+            if f.get('username') and f['username'].lower().startswith(low) and f['username'] not in _HIDDEN_SHARE_USERS
+        ),
+        key=lambda u: u['username'].lower(),
+    )
+    if 'all'.startswith(low):
+        pinned.append(_share_candidate('all', 'Everyone'))
+    skip = _HIDDEN_SHARE_USERS | {u['username'] for u in pinned}
+
+    users = []
+    after = None
+    if cursor.startswith('u:'):
+        after = cursor[2:] or None
+    else:
         try:
-            # u may be dict-like
-            name = u.get('username') if isinstance(u, dict) else (getattr(u, 'username', None) or str(u))
-        except Exception:
-            name = str(u)
-        if name and name not in seen:
-            usernames.append(name)
-            seen.add(name)
-    # include the special 'all' selector
-    if 'all' not in seen:
-        usernames.append('all')
-    # remove internal admin user if present
-    if 'admin' in usernames:
-        usernames.remove('admin')
-    return jsonify({'users': usernames})
\ No newline at end of file
+            offset = max(0, int(cursor[2:]))
+        except ValueError:
+            return jsonify({'ok': False, 'error': 'invalid cursor'}), 400
+        users = pinned[offset:offset + limit]
+        if offset + limit < len(pinned):
+            return jsonify({'ok': True, 'users': users, 'next_cursor': f'p:{offset + limit}'})
+        if len(users) == limit:
+            return jsonify({'ok': True, 'users': users, 'next_cursor': 'u:'})
+
+    matches, last = search_users(prefix, limit - len(users), after=after, exclude=skip)
+    users.extend(_share_candidate(u['username'], u['name'], u['profile_pic']) for u in matches)
+    return jsonify({'ok': True, 'users': users, 'next_cursor': f'u:{last}' if last else None})
@@ -16,6 +16,7 @@ from flask import Blueprint, render_template, g
 from utils.auth import get_current_user_from_token  # JWT authentication
 from model.mongo import get_db  # Direct database access to get all users
 from model.studyData_model import get_user_study_data
+from utils.identity import current_study_data  # Memoized current-user study data
 
 db = get_db()
 profiles_col = db.profiles
@@ -83,5 +84,5 @@ def friends_index():
         'friends.html',
         username=g.current_user,  # Current logged-in user
         users=all_users,  # All users in the community
-        studyData=get_user_study_data(g.current_user),
+        studyData=current_study_data(),
     )
@@ -1,7 +1,8 @@
 from flask import Blueprint, render_template, jsonify, g
 from utils.auth import get_current_user_from_token
-from model.login_model import get_all_users, get_user_by_username
-from model.studyData_model import get_user_study_data
+from utils.identity import current_profile, current_study_data
+from model.login_model import get_all_users
+from model.mongo import get_pool_stats
 
 home_bp = Blueprint('home', __name__)
 
@@ -20,9 +21,8 @@ def dashboard():
     return render_template(
         'home.html',
         username=g.current_user,
-        users=get_all_users(),
-        profileData=get_user_by_username(g.current_user),
-        studyData=get_user_study_data(g.current_user),
+        profileData=current_profile(),
+        studyData=current_study_data(),
     )
 
 
@@ -30,3 +30,9 @@ def dashboard():
 def dashboard_list_users():
     users = get_all_users()
     return jsonify(users)
+
+
+@home_bp.route('/api/pool-stats', endpoint='pool_stats')
+def dashboard_pool_stats():
+    """MongoDB connection pool counters for the worker serving this request."""
+    return jsonify(get_pool_stats())
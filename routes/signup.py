@@ -1,6 +1,5 @@
 from flask import Blueprint, render_template, request, g
 from utils.auth import get_current_user_from_token, get_pepper_by_version, combine_password_and_pepper, ph, get_current_pepper_version
-from model.login_model import get_all_users
 from model.login_model import create_user
 from .auth_routes import auth_bp, login_post
 signup_bp = Blueprint('signup', __name__)
@@ -25,7 +24,7 @@ def signup_register():
     
     current_version = get_current_pepper_version()
     if not current_version:
-        return render_template('signup.html', error='Server not configured properly.', users=get_all_users())
+        return render_template('signup.html', error='Server not configured properly.')
     pepper = get_pepper_by_version(current_version)
     combined = combine_password_and_pepper(password, pepper)
 
@@ -40,4 +39,4 @@ def signup_register():
         name=request.form.get('name')):
         return login_post()
     else:
-        return render_template('signup.html', error='Registration failed. Please try again.', users=get_all_users())
+        return render_template('signup.html', error='Registration failed. Please try again.')
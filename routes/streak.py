@@ -1,7 +1,6 @@
 from flask import Blueprint, render_template, g
 from utils.auth import get_current_user_from_token
-from model.login_model import get_all_users, get_user_by_username
-from model.studyData_model import get_user_study_data
+from utils.identity import current_profile, current_study_data
 
 streak_bp = Blueprint("streak", __name__)
 
@@ -16,11 +15,10 @@ def require_auth():
 
 @streak_bp.route("/", endpoint="index")
 def streak_index():
-    studyData = get_user_study_data(g.current_user) or {}
+    studyData = current_study_data() or {}
     return render_template(
         "streak.html",
         username=g.current_user,
-        users=get_all_users(),
         studyData=studyData,
-        profileData=get_user_by_username(g.current_user),
+        profileData=current_profile(),
     )
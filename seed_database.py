@@ -46,8 +46,15 @@ def clear_collections() -> None:
         "authentication",
         "relationships",
         "user_permissions",
+        "acl_versions",
+        "token_revocations",
+        "counters",
         "decks",
         "cards",
+        "card_progress",
+        "card_tombstones",
+        "review_events",
+        "review_daily",
         "ai_generation_logs",
         "deck_tags",
         "posts",
@@ -192,7 +199,10 @@ def seed_decks_cards_tags_permissions():
             "summary": deck["summary"],
             "subject": deck.get("subject"),
             "category": deck.get("category"),
-            "len": str(len(deck.get("cards", []))),
+            "len": len(deck.get("cards", [])),
+            "version": 1,
+            "version_seq": 1,
+            "updated_at": datetime.utcnow(),
         })
         tag_docs.extend({"deck_id": deck["id"], "tag": t} for t in deck.get("tags", []))
         for card in deck.get("cards", []):
@@ -202,12 +212,6 @@ def seed_decks_cards_tags_permissions():
                 "front": card["front"],
                 "back": card["back"],
                 "tags": card.get("tags", []),
-                "correct_count": 0,
-                "incorrect_count": 0,
-                "last_reviewed": None,
-                "ease": 2.5,
-                "interval": 0,
-                "repetitions": 0,
             })
         for owner in deck.get("owners", []):
             perm_docs.append({"username": owner, "deck_id": deck["id"], "role": "owner"})
@@ -454,90 +454,119 @@ document.addEventListener('DOMContentLoaded', function () {
         // Use a static backdrop + disable ESC to prevent accidental closes
         const bsModal = shareModalEl ? new bootstrap.Modal(shareModalEl, { backdrop: 'static', keyboard: false }) : null;
 
-        function renderList(users, perms) {
-            // users: array of profile objects or username strings
-            console.debug('renderList users=', users, 'perms=', perms);
-            shareList.innerHTML = '';
-            if (!users || users.length === 0) {
-                shareEmpty.classList.remove('d-none');
-                return;
+        // username -> {editor, reviewer}; remembers every row shown so toggles
+        // survive re-searching and are all sent on save
+        let shareState = new Map();
+        let sharePerms = null;
+        let shareQuery = '';
+        let shareCursor = null;
+        let shareSeq = 0;
+        let searchTimer = null;
+
+        function stateFor(uname) {
+            if (!shareState.has(uname)) {
+                shareState.set(uname, {
+                    editor: !!(sharePerms && Array.isArray(sharePerms.editors) && sharePerms.editors.includes(uname)),
+                    reviewer: !!(sharePerms && Array.isArray(sharePerms.reviewers) && sharePerms.reviewers.includes(uname))
+                });
             }
-            shareEmpty.classList.add('d-none');
+            return shareState.get(uname);
+        }
+
+        function appendRows(users) {
             users.forEach(u => {
-                const tr = document.createElement('tr');
                 const uname = (u && u.username) ? u.username : u;
+                if (!uname || shareList.querySelector(`tr[data-username="${CSS.escape(uname)}"]`)) return;
                 const display = (u && (u.display_name || u.name)) ? (u.display_name || u.name) : uname;
-                const isOwner = perms && perms.owner && perms.owner === uname;
-                // determine checked state from perms (perms may contain arrays of usernames)
-                const isEditor = perms && Array.isArray(perms.editors) && perms.editors.includes(uname);
-                const isReviewer = perms && Array.isArray(perms.reviewers) && perms.reviewers.includes(uname);
-
+                const st = stateFor(uname);
+                const tr = document.createElement('tr');
                 tr.dataset.username = uname;
                 tr.innerHTML = `
-                    <td>${display} <div class="small text-muted">${uname}</div></td>
-                    <td class="text-center"><input data-username="${uname}" class="form-check-input share-editor" type="checkbox" ${isEditor ? 'checked' : ''}></td>
-                    <td class="text-center"><input data-username="${uname}" class="form-check-input share-reviewer" type="checkbox" ${isReviewer ? 'checked' : ''}></td>
+                    <td><span class="share-display"></span> <div class="small text-muted share-username"></div></td>
+                    <td class="text-center"><input class="form-check-input share-editor" type="checkbox"></td>
+                    <td class="text-center"><input class="form-check-input share-reviewer" type="checkbox"></td>
                 `;
+                // names are user-supplied, so they are set as text/properties and never parsed as HTML
+                tr.querySelector('.share-display').textContent = display;
+                tr.querySelector('.share-username').textContent = uname;
+                const editor = tr.querySelector('.share-editor');
+                const reviewer = tr.querySelector('.share-reviewer');
+                editor.dataset.username = uname;
+                reviewer.dataset.username = uname;
+                editor.checked = !!st.editor;
+                reviewer.checked = !!st.reviewer;
+                editor.addEventListener('change', e => { st.editor = e.target.checked; });
+                reviewer.addEventListener('change', e => { st.reviewer = e.target.checked; });
                 shareList.appendChild(tr);
             });
+            shareEmpty.classList.toggle('d-none', shareList.children.length > 0);
         }
 
-        async function openShare() {
-            const friends = window.SHARE_FRIENDS || [];
-            let perms = null;
-            try {
-                const res = await fetch(`/flashcards/${window.CURRENT_DECK_ID}/permissions`);
-                const body = await res.json();
-                if (body.ok) perms = body.permissions;
-            } catch (e) { /* ignore */ }
+        function updateMoreButton() {
+            let more = document.getElementById('share-more');
+            if (!shareCursor) {
+                if (more) more.remove();
+                return;
+            }
+            if (!more) {
+                more = document.createElement('button');
+                more.type = 'button';
+                more.id = 'share-more';
+                more.className = 'btn btn-link btn-sm w-100';
+                more.textContent = 'Show more';
+                more.addEventListener('click', () => loadUsers(false));
+                shareList.closest('table').after(more);
+            }
+        }
 
-            // Fetch authoritative user list from server
-            let allUsers = [];
+        async function loadUsers(reset) {
+            const seq = ++shareSeq;
+            const params = new URLSearchParams({ q: shareQuery });
+            if (!reset && shareCursor) params.set('cursor', shareCursor);
+            let body = null;
             try {
-                const res2 = await fetch('/flashcards/userlist');
-                const data2 = await res2.json();
-                if (data2 && Array.isArray(data2.users)) allUsers = data2.users;
+                const res = await fetch(`/flashcards/${window.CURRENT_DECK_ID}/share/users?${params}`);
+                body = await res.json();
             } catch (e) { /* ignore */ }
-
-            // Build an ordered list: owner, editors, reviewers, then remaining users from allUsers
-            const users = [];
-            const seen = new Set();
-
-            function pushUserByName(uname) {
-                if (!uname || seen.has(uname)) return;
-                // attempt to find full profile in friends
-                const prof = friends.find(f => (f && f.username) === uname);
-                users.push(prof || { username: uname });
-                seen.add(uname);
-            }
-
-            if (perms) {
-                if (perms.owner) pushUserByName(perms.owner);
-                if (Array.isArray(perms.editors)) perms.editors.forEach(pushUserByName);
-                if (Array.isArray(perms.reviewers)) perms.reviewers.forEach(pushUserByName);
+            // a newer search superseded this one
+            if (seq !== shareSeq) return;
+            if (reset) {
+                shareList.innerHTML = '';
+                // people already on the deck stay listed while they match the query
+                const q = shareQuery.toLowerCase();
+                const current = [];
+                if (sharePerms) {
+                    if (sharePerms.owner) current.push(sharePerms.owner);
+                    (sharePerms.editors || []).forEach(u => current.push(u));
+                    (sharePerms.reviewers || []).forEach(u => current.push(u));
+                }
+                appendRows(current.filter(u => u.toLowerCase().startsWith(q)).map(u => ({ username: u })));
             }
+            appendRows((body && body.ok && Array.isArray(body.users)) ? body.users : []);
+            shareCursor = (body && body.next_cursor) || null;
+            updateMoreButton();
+        }
 
-            // then append all users from server list
-            allUsers.forEach(u => {
-                const uname = (typeof u === 'string') ? u : (u.username || u);
-                if (!seen.has(uname)) {
-                    // prefer friend profile for richer display
-                    const prof = friends.find(f => (f && f.username) === uname);
-                    users.push(prof || { username: uname });
-                    seen.add(uname);
-                }
-            });
+        async function openShare() {
+            shareState = new Map();
+            sharePerms = null;
+            shareQuery = '';
+            shareCursor = null;
+            if (shareSearch) shareSearch.value = '';
+            try {
+                const res = await fetch(`/flashcards/${window.CURRENT_DECK_ID}/permissions`);
+                const body = await res.json();
+                if (body.ok) sharePerms = body.permissions;
+            } catch (e) { /* ignore */ }
 
-            renderList(users, perms);
+            await loadUsers(true);
             if (bsModal) bsModal.show();
         }
 
         function filterList(q) {
-            q = (q || '').toLowerCase();
-            Array.from(shareList.querySelectorAll('tr')).forEach(tr => {
-                const display = tr.children[0].textContent.toLowerCase();
-                tr.style.display = display.indexOf(q) === -1 ? 'none' : '';
-            });
+            shareQuery = (q || '').trim();
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(() => loadUsers(true), 200);
         }
 
         if (shareBtn) shareBtn.addEventListener('click', openShare);
@@ -545,15 +574,7 @@ document.addEventListener('DOMContentLoaded', function () {
 
         if (shareSave) {
             shareSave.addEventListener('click', async function () {
-                const rows = Array.from(shareList.querySelectorAll('tr'));
-                const shares = rows.map(tr => {
-                    const editorEl = tr.querySelector('.share-editor');
-                    const reviewerEl = tr.querySelector('.share-reviewer');
-                    const uname = (editorEl && editorEl.dataset && editorEl.dataset.username) || (reviewerEl && reviewerEl.dataset && reviewerEl.dataset.username) || '';
-                    const editor = !!(editorEl && editorEl.checked);
-                    const reviewer = !!(reviewerEl && reviewerEl.checked);
-                    return { username: uname, editor: editor, reviewer: reviewer };
-                });
+                const shares = Array.from(shareState, ([uname, st]) => ({ username: uname, editor: st.editor, reviewer: st.reviewer }));
 
                 try {
                     const res = await fetch(`/flashcards/${window.CURRENT_DECK_ID}/share`, {
@@ -0,0 +1,603 @@
+"""A small in-memory stand-in for the pymongo collections the models use.
+
+It covers the query operators, update operators, update pipelines and
+aggregation expressions this code base actually sends, evaluated with
+MongoDB's semantics, so model logic (version stamps, SM-2 stages, deck
+lengths) can be checked by running it rather than by snapshotting the
+pipelines.  `use(monkeypatch, db, *modules)` points a model module's
+collection handles at a `FakeDB`.
+"""
+import copy
+import math
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from bson import ObjectId
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from model.mongo import _CollectionProxy
+
+_MISSING = object()
+
+
+def use(monkeypatch, db, *modules):
+    """Replace every collection handle (`_x_col = _db.x`) in `modules` with `db[x]`."""
+    for module in modules:
+        for attr, value in list(vars(module).items()):
+            if isinstance(value, _CollectionProxy):
+                monkeypatch.setattr(module, attr, db[value._name])
+
+
+def _get(doc, path):
+    cur = doc
+    for part in path.split('.'):
+        if isinstance(cur, dict) and part in cur:
+            cur = cur[part]
+        else:
+            return _MISSING
+    return cur
+
+
+def _set(doc, path, value):
+    parts = path.split('.')
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+
+def _unset(doc, path):
+    parts = path.split('.')
+    for part in parts[:-1]:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(parts[-1], None)
+
+
+def _order(v):
+    """Sort key following BSON's cross-type order for the types used here."""
+    if v is None or v is _MISSING:
+        return (1, 0)
+    if isinstance(v, bool):
+        return (8, v)
+    if isinstance(v, (int, float)):
+        return (2, v)
+    if isinstance(v, str):
+        return (3, v)
+    if isinstance(v, dict):
+        return (4, str(sorted(v.items())))
+    if isinstance(v, list):
+        return (5, str(v))
+    if isinstance(v, ObjectId):
+        return (7, str(v))
+    if isinstance(v, datetime):
+        return (9, v)
+    return (10, str(v))
+
+
+def _cmp(a, b):
+    ka, kb = _order(a), _order(b)
+    return (ka > kb) - (ka < kb)
+
+
+# -- queries ---------------------------------------------------------------
+
+def _eq(value, want):
+    if isinstance(value, list) and not isinstance(want, list):
+        return any(_eq(v, want) for v in value)
+    if value is _MISSING:
+        return want is None
+    return value == want
+
+
+def _match_op(value, op, arg):
+    if op == '$eq':
+        return _eq(value, arg)
+    if op == '$ne':
+        return not _eq(value, arg)
+    if op == '$in':
+        return any(_eq(value, a) for a in arg)
+    if op == '$nin':
+        return not any(_eq(value, a) for a in arg)
+    if op == '$exists':
+        return (value is not _MISSING) == bool(arg)
+    if op in ('$gt', '$gte', '$lt', '$lte'):
+        values = value if isinstance(value, list) else [value]
+        for v in values:
+            if v is _MISSING or _order(v)[0] != _order(arg)[0]:
+                continue
+            c = _cmp(v, arg)
+            if {'$gt': c > 0, '$gte': c >= 0, '$lt': c < 0, '$lte': c <= 0}[op]:
+                return True
+        return False
+    raise NotImplementedError(f'query operator {op}')
+
+
+def matches(doc, flt):
+    for key, want in (flt or {}).items():
+        if key == '$or':
+            if not any(matches(doc, f) for f in want):
+                return False
+        elif key == '$and':
+            if not all(matches(doc, f) for f in want):
+                return False
+        elif key == '$expr':
+            if not evaluate(want, doc):
+                return False
+        elif isinstance(want, dict) and want and all(k.startswith('$') for k in want):
+            value = _get(doc, key)
+            if not all(_match_op(value, op, arg) for op, arg in want.items()):
+                return False
+        elif not _eq(_get(doc, key), want):
+            return False
+    return True
+
+
+def _project(doc, projection):
+    if not projection:
+        return copy.deepcopy(doc)
+    include = {k: v for k, v in projection.items() if k != '_id'}
+    if include and any(include.values()):
+        out = {}
+        for k, on in include.items():
+            if not isinstance(on, (bool, int)):
+                _set(out, k, evaluate(on, doc))  # computed field ($project stage only)
+                continue
+            value = _get(doc, k)
+            if on and value is not _MISSING:
+                _set(out, k, copy.deepcopy(value))
+        if projection.get('_id', 1) and '_id' in doc:
+            out['_id'] = doc['_id']
+        return out
+    out = copy.deepcopy(doc)
+    for k, on in projection.items():
+        if not on:
+            _unset(out, k)
+    return out
+
+
+# -- aggregation expressions -------------------------------------------------
+
+def _num(v):
+    return v is not None and v is not _MISSING and not isinstance(v, bool) and isinstance(v, (int, float))
+
+
+def evaluate(expr, doc):
+    """Evaluate an aggregation expression against `doc` (missing fields are None)."""
+    if isinstance(expr, str) and expr.startswith('$'):
+        value = _get(doc, expr[1:])
+        return None if value is _MISSING else value
+    if isinstance(expr, list):
+        return [evaluate(e, doc) for e in expr]
+    if not isinstance(expr, dict):
+        return expr
+    if len(expr) != 1 or not next(iter(expr)).startswith('$'):
+        return {k: evaluate(v, doc) for k, v in expr.items()}
+    op, arg = next(iter(expr.items()))
+    if op == '$literal':
+        return arg
+    if op == '$ifNull':
+        for e in arg[:-1]:
+            v = evaluate(e, doc)
+            if v is not None:
+                return v
+        return evaluate(arg[-1], doc)
+    if op == '$cond':
+        if isinstance(arg, dict):
+            arg = [arg['if'], arg['then'], arg['else']]
+        return evaluate(arg[1] if evaluate(arg[0], doc) else arg[2], doc)
+    if op == '$switch':
+        for branch in arg['branches']:
+            if evaluate(branch['case'], doc):
+                return evaluate(branch['then'], doc)
+        return evaluate(arg['default'], doc)
+    args = [evaluate(a, doc) for a in (arg if isinstance(arg, list) else [arg])]
+    if op in ('$max', '$min'):
+        present = [a for a in args if a is not None]
+        if not present:
+            return None
+        pick = present[0]
+        for a in present[1:]:
+            if (_cmp(a, pick) > 0) == (op == '$max') and _cmp(a, pick) != 0:
+                pick = a
+        return pick
+    if op == '$add':
+        if any(a is None for a in args):
+            return None
+        dates = [a for a in args if isinstance(a, datetime)]
+        total = sum(a for a in args if not isinstance(a, datetime))
+        if dates:
+            return dates[0] + timedelta(milliseconds=total)
+        return total
+    if op == '$subtract':
+        a, b = args
+        if a is None or b is None:
+            return None
+        if isinstance(a, datetime) and isinstance(b, datetime):
+            return int((a - b).total_seconds() * 1000)
+        if isinstance(a, datetime):
+            return a - timedelta(milliseconds=b)
+        return a - b
+    if op == '$multiply':
+        if any(a is None for a in args):
+            return None
+        out = 1
+        for a in args:
+            out *= a
+        return out
+    if op == '$divide':
+        a, b = args
+        return None if a is None or b is None else a / b
+    if op in ('$eq', '$ne', '$gt', '$gte', '$lt', '$lte'):
+        c = _cmp(args[0], args[1])
+        return {'$eq': c == 0, '$ne': c != 0, '$gt': c > 0, '$gte': c >= 0, '$lt': c < 0, '$lte': c <= 0}[op]
+    if op == '$and':
+        return all(args)
+    if op == '$or':
+        return any(args)
+    if op == '$not':
+        return not args[0]
+    if op == '$round':
+        value, places = (args + [0])[:2]
+        if value is None:
+            return None
+        # MongoDB rounds half to even, like Python's round()
+        rounded = round(value, places)
+        return float(rounded) if isinstance(value, float) else rounded
+    if op == '$toInt':
+        value = args[0]
+        if value is None:
+            return None
+        return int(float(value)) if isinstance(value, str) else int(value)
+    if op == '$convert':
+        spec = arg
+        value = evaluate(spec['input'], doc)
+        if value is None:
+            return evaluate(spec.get('onNull'), doc)
+        if spec['to'] not in ('int', 'long'):
+            raise NotImplementedError(f"$convert to {spec['to']}")
+        try:
+            if isinstance(value, str):
+                return int(value)
+            if isinstance(value, float) and not math.isfinite(value):
+                raise ValueError(value)
+            return int(value)
+        except (TypeError, ValueError):
+            if 'onError' in spec:
+                return evaluate(spec['onError'], doc)
+            raise
+    if op == '$size':
+        return len(args[0])
+    if op == '$toString':
+        return None if args[0] is None else str(args[0])
+    raise NotImplementedError(f'expression operator {op}')
+
+
+def apply_pipeline(doc, pipeline):
+    """Run update-pipeline stages ($set/$addFields/$unset) on a copy of `doc`."""
+    doc = copy.deepcopy(doc)
+    for stage in pipeline:
+        (name, spec), = stage.items()
+        if name in ('$set', '$addFields'):
+            new = copy.deepcopy(doc)
+            for path, expr in spec.items():
+                _set(new, path, evaluate(expr, doc))
+            doc = new
+        elif name == '$unset':
+            for path in [spec] if isinstance(spec, str) else spec:
+                _unset(doc, path)
+        else:
+            raise NotImplementedError(f'pipeline update stage {name}')
+    return doc
+
+
+def _apply_operators(doc, update, inserting):
+    for op, fields in update.items():
+        for path, arg in fields.items():
+            current = _get(doc, path)
+            if op == '$set':
+                _set(doc, path, copy.deepcopy(arg))
+            elif op == '$setOnInsert':
+                if inserting:
+                    _set(doc, path, copy.deepcopy(arg))
+            elif op == '$unset':
+                _unset(doc, path)
+            elif op == '$inc':
+                _set(doc, path, (0 if current is _MISSING else current) + arg)
+            elif op in ('$max', '$min'):
+                if current is _MISSING or (_cmp(arg, current) > 0) == (op == '$max') and _cmp(arg, current) != 0:
+                    _set(doc, path, arg)
+            elif op == '$push':
+                _set(doc, path, (current if current is not _MISSING else []) + [arg])
+            elif op == '$addToSet':
+                values = arg['$each'] if isinstance(arg, dict) and '$each' in arg else [arg]
+                lst = list(current) if current is not _MISSING else []
+                lst += [v for v in values if v not in lst]
+                _set(doc, path, lst)
+            elif op == '$pull':
+                if current is not _MISSING:
+                    _set(doc, path, [v for v in current if v != arg])
+            else:
+                raise NotImplementedError(f'update operator {op}')
+    return doc
+
+
+def _seed_from_filter(flt):
+    doc = {}
+    for key, want in (flt or {}).items():
+        if key.startswith('$'):
+            continue
+        if isinstance(want, dict) and any(k.startswith('$') for k in want):
+            if '$eq' in want:
+                _set(doc, key, want['$eq'])
+            continue
+        _set(doc, key, copy.deepcopy(want))
+    return doc
+
+
+# -- collections -------------------------------------------------------------
+
+def _run_stages(docs, pipeline, db=None):
+    for stage in pipeline:
+        (name, spec), = stage.items()
+        if name == '$match':
+            docs = [d for d in docs if matches(d, spec)]
+        elif name == '$group':
+            groups = {}
+            for d in docs:
+                key = evaluate(spec['_id'], d)
+                g = groups.setdefault(repr(key), {'_id': key})
+                for field, acc in spec.items():
+                    if field == '_id':
+                        continue
+                    (aop, aexpr), = acc.items()
+                    v = evaluate(aexpr, d)
+                    if aop == '$sum':
+                        g[field] = g.get(field, 0) + (v if _num(v) else 0)
+                    elif aop in ('$max', '$min'):
+                        g[field] = evaluate({aop: [g.get(field), v]}, {})
+                    else:
+                        raise NotImplementedError(f'accumulator {aop}')
+            docs = list(groups.values())
+        elif name == '$sort':
+            docs = list(Cursor(docs).sort(list(spec.items())))
+        elif name == '$limit':
+            docs = docs[:spec]
+        elif name == '$project':
+            docs = [_project(d, spec) for d in docs]
+        elif name == '$facet':
+            docs = [{k: _run_stages(copy.deepcopy(docs), sub, db) for k, sub in spec.items()}]
+        elif name == '$lookup':
+            foreign = db[spec['from']].docs
+            for d in docs:
+                key = _get(d, spec['localField'])
+                joined = [copy.deepcopy(f) for f in foreign if _eq(_get(f, spec['foreignField']), key)]
+                d[spec['as']] = _run_stages(joined, spec.get('pipeline', []), db)
+        elif name == '$bucket':
+            bounds, buckets = spec['boundaries'], {}
+            for d in docs:
+                v = evaluate(spec['groupBy'], d)
+                key = next((lo for lo, hi in zip(bounds, bounds[1:]) if _num(v) and lo <= v < hi), spec.get('default'))
+                buckets.setdefault(key, []).append(d)
+            docs = [
+                {'_id': b, **{f: _bucket_total(acc, buckets[b]) for f, acc in spec.get('output', {'count': {'$sum': 1}}).items()}}
+                for b in bounds[:-1] + [spec.get('default')] if b in buckets
+            ]
+        else:
+            raise NotImplementedError(f'aggregation stage {name}')
+    return docs
+
+
+def _bucket_total(acc, docs):
+    (aop, aexpr), = acc.items()
+    if aop != '$sum':
+        raise NotImplementedError(f'accumulator {aop}')
+    return sum(v for v in (evaluate(aexpr, d) for d in docs) if _num(v))
+
+
+class Cursor:
+    def __init__(self, docs):
+        self._docs = docs
+
+    def sort(self, key, direction=1):
+        keys = key if isinstance(key, list) else [(key, direction)]
+        for field, d in reversed(keys):
+            self._docs.sort(key=lambda doc: _order(_get(doc, field)), reverse=d < 0)
+        return self
+
+    def skip(self, n):
+        self._docs = self._docs[n:]
+        return self
+
+    def limit(self, n):
+        if n:
+            self._docs = self._docs[:n]
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    def __iter__(self):
+        return iter(self._docs)
+
+    def __next__(self):
+        if not self._docs:
+            raise StopIteration
+        return self._docs.pop(0)
+
+
+class FakeCollection:
+    def __init__(self, name, unique=(), db=None):
+        self.name = name
+        self.db = db
+        self.docs = []
+        # field tuples that must be unique (raise DuplicateKeyError like a unique index)
+        self.unique = [tuple(u) for u in unique]
+        self.calls = []
+
+    def with_options(self, **kwargs):
+        return self
+
+    # reads
+
+    def _matching(self, flt):
+        return [d for d in self.docs if matches(d, flt)]
+
+    def find(self, flt=None, projection=None, **kwargs):
+        self.calls.append(('find', flt))
+        return Cursor([_project(d, projection or kwargs.get('projection')) for d in self._matching(flt)])
+
+    def find_one(self, flt=None, projection=None, **kwargs):
+        return next(iter(self.find(flt, projection, **kwargs)), None)
+
+    def count_documents(self, flt):
+        return len(self._matching(flt))
+
+    def estimated_document_count(self):
+        return len(self.docs)
+
+    def distinct(self, key, flt=None):
+        out = []
+        for d in self._matching(flt):
+            v = _get(d, key)
+            for item in v if isinstance(v, list) else [v]:
+                if item is not _MISSING and item not in out:
+                    out.append(item)
+        return out
+
+    def aggregate(self, pipeline, **kwargs):
+        return iter(_run_stages([copy.deepcopy(d) for d in self.docs], pipeline, self.db))
+
+    # writes
+
+    def _check_unique(self, doc, ignore=None):
+        for fields in self.unique:
+            key = tuple(_get(doc, f) for f in fields)
+            for other in self.docs:
+                if other is not ignore and tuple(_get(other, f) for f in fields) == key:
+                    raise DuplicateKeyError(f'duplicate key {key}', 11000)
+        if '_id' in doc:
+            for other in self.docs:
+                if other is not ignore and other.get('_id') == doc['_id']:
+                    raise DuplicateKeyError(f"duplicate _id {doc['_id']}", 11000)
+
+    def insert_one(self, doc):
+        doc.setdefault('_id', ObjectId())
+        stored = copy.deepcopy(doc)
+        self._check_unique(stored)
+        self.docs.append(stored)
+        return SimpleNamespace(inserted_id=doc['_id'])
+
+    def insert_many(self, docs, ordered=True):
+        ids = [self.insert_one(d).inserted_id for d in docs]
+        return SimpleNamespace(inserted_ids=ids)
+
+    def _update(self, flt, update, upsert, many):
+        matched = self._matching(flt)
+        if not many:
+            matched = matched[:1]
+        for i, doc in enumerate(matched):
+            if isinstance(update, list):
+                new = apply_pipeline(doc, update)
+            else:
+                new = _apply_operators(copy.deepcopy(doc), update, False)
+            self._check_unique(new, ignore=doc)
+            self.docs[self.docs.index(doc)] = new
+            matched[i] = new
+        upserted_id = None
+        if not matched and upsert:
+            seed = _seed_from_filter(flt)
+            if isinstance(update, list):
+                new = apply_pipeline(seed, update)
+            else:
+                new = _apply_operators(seed, update, True)
+            new.setdefault('_id', ObjectId())
+            self._check_unique(new)
+            self.docs.append(new)
+            upserted_id = new['_id']
+        return matched, upserted_id
+
+    def update_one(self, flt, update, upsert=False):
+        matched, upserted = self._update(flt, update, upsert, False)
+        return SimpleNamespace(matched_count=len(matched), modified_count=len(matched), upserted_id=upserted)
+
+    def update_many(self, flt, update, upsert=False):
+        matched, upserted = self._update(flt, update, upsert, True)
+        return SimpleNamespace(matched_count=len(matched), modified_count=len(matched), upserted_id=upserted)
+
+    def find_one_and_update(self, flt, update, projection=None, return_document=ReturnDocument.BEFORE,
+                            upsert=False, sort=None):
+        before = self.find_one(flt)
+        matched, upserted = self._update(flt, update, upsert, False)
+        if return_document == ReturnDocument.AFTER:
+            after = matched[0] if matched else next((d for d in self.docs if d['_id'] == upserted), None)
+            return _project(after, projection) if after is not None else None
+        return _project(before, projection) if before is not None else None
+
+    def delete_one(self, flt):
+        matched = self._matching(flt)[:1]
+        for d in matched:
+            self.docs.remove(d)
+        return SimpleNamespace(deleted_count=len(matched))
+
+    def delete_many(self, flt):
+        matched = self._matching(flt)
+        for d in matched:
+            self.docs.remove(d)
+        return SimpleNamespace(deleted_count=len(matched))
+
+    def find_one_and_delete(self, flt, projection=None):
+        doc = self.find_one(flt)
+        if doc is not None:
+            self.delete_one({'_id': doc['_id']})
+        return _project(doc, projection) if doc is not None else None
+
+    def bulk_write(self, ops, ordered=True):
+        result = SimpleNamespace(inserted_count=0, matched_count=0, modified_count=0, deleted_count=0,
+                                 upserted_count=0, upserted_ids={})
+        errors = []
+        for index, op in enumerate(ops):
+            try:
+                if isinstance(op, InsertOne):
+                    self.insert_one(op._doc)
+                    result.inserted_count += 1
+                elif isinstance(op, (UpdateOne, UpdateMany)):
+                    matched, upserted = self._update(op._filter, op._doc, op._upsert, isinstance(op, UpdateMany))
+                    result.matched_count += len(matched)
+                    result.modified_count += len(matched)
+                    if upserted is not None:
+                        result.upserted_count += 1
+                        result.upserted_ids[index] = upserted
+                elif isinstance(op, (DeleteOne, DeleteMany)):
+                    res = (self.delete_many if isinstance(op, DeleteMany) else self.delete_one)(op._filter)
+                    result.deleted_count += res.deleted_count
+                else:
+                    raise NotImplementedError(type(op).__name__)
+            except DuplicateKeyError as e:
+                errors.append({'index': index, 'code': 11000, 'errmsg': str(e)})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({
+                'writeErrors': errors,
+                'upserted': [{'index': i, '_id': u} for i, u in result.upserted_ids.items()],
+                'nInserted': result.inserted_count,
+            })
+        return result
+
+
+class FakeDB:
+    def __init__(self, unique=None):
+        self._unique = unique or {}
+        self._cols = {}
+
+    def __getitem__(self, name):
+        if name not in self._cols:
+            self._cols[name] = FakeCollection(name, self._unique.get(name, ()), self)
+        return self._cols[name]
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
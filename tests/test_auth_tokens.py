@@ -0,0 +1,164 @@
+import pytest
+
+import fakemongo
+from model import revocation_model
+from utils import auth
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _fresh_worker(monkeypatch):
+    """Give utils.auth empty per-process state (a new worker, or this one restarted)."""
+    monkeypatch.setattr(auth, '_token_cache', type(auth._token_cache)())
+    monkeypatch.setattr(auth, '_revoked_tokens', {})
+    monkeypatch.setattr(auth, '_revoked_users', {})
+    monkeypatch.setattr(auth, '_last_poll', 0.0)
+    monkeypatch.setattr(auth, 'token_cache_stats', {'hits': 0, 'misses': 0})
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    db = fakemongo.FakeDB()
+    fakemongo.use(monkeypatch, db, revocation_model)
+    _fresh_worker(monkeypatch)
+    return db
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock(1_700_000_000.0)
+    monkeypatch.setattr(auth.time, 'time', clock)
+    return clock
+
+
+def test_round_trip_and_cache_hits(clock):
+    token = auth.issue_token('ann', '7')
+    claims = auth.verify_token(token)
+    assert claims['username'] == 'ann' and claims['user_id'] == '7'
+    assert claims['exp'] == claims['iat'] + auth.TOKEN_TTL_SECONDS
+    claims['username'] = 'mallory'  # callers get a copy
+    assert auth.verify_token(token)['username'] == 'ann'
+    assert auth.token_cache_stats == {'hits': 1, 'misses': 1}
+
+
+@pytest.mark.parametrize('token', [None, '', 'not-a-jwt', 'a.b.c'])
+def test_garbage_is_rejected(token):
+    assert auth.verify_token(token) is None
+
+
+def test_tampered_tokens_are_rejected(clock):
+    token = auth.issue_token('ann', '7')
+    header, payload, signature = token.split('.')
+    forged = auth.issue_token('root', '1').split('.')[1]
+    flipped = signature[:-2] + ('A' if signature[-2] != 'A' else 'B') + signature[-1]
+    assert auth.verify_token(f'{header}.{forged}.{signature}') is None
+    assert auth.verify_token(f'{header}.{payload}.{flipped}') is None
+    assert auth.decode_token(f'{header}.{forged}.{signature}') is None
+    assert auth.verify_token(token) is not None
+
+
+def test_expiry_leeway(clock):
+    token = auth.issue_token('ann', '7', ttl=60)
+    clock.now += 60 + auth.JWT_LEEWAY_SECONDS - 1
+    assert auth.verify_token(token) is not None
+    clock.now += 2
+    assert auth.verify_token(token) is None  # cached entry expires too
+    assert auth.decode_token(token) is None
+
+
+def test_expired_beyond_leeway_is_never_cached(clock):
+    token = auth.issue_token('ann', '7', ttl=-(auth.JWT_LEEWAY_SECONDS + 1))
+    assert auth.verify_token(token) is None
+    assert auth.verify_token(token) is None
+    assert auth.token_cache_stats == {'hits': 0, 'misses': 2}
+
+
+def test_revoke_token(clock):
+    token = auth.issue_token('ann', '7')
+    other = auth.issue_token('ann', '7', ttl=120)
+    assert auth.verify_token(token) is not None
+    auth.revoke_token(token)
+    assert auth.verify_token(token) is None
+    assert auth.verify_token(other) is not None
+    auth.revoke_token(None)
+
+
+def test_revoke_user_kills_earlier_tokens_only(clock):
+    old = auth.issue_token('ann', '7')
+    bob = auth.issue_token('bob', '8')
+    assert auth.verify_token(old) is not None
+    auth.revoke_user('ann')
+    assert auth.verify_token(old) is None
+    assert auth.verify_token(bob) is not None
+    clock.now += 5
+    assert auth.verify_token(auth.issue_token('ann', '9')) is not None
+
+
+def test_revocations_are_purged_after_expiry(clock):
+    token = auth.issue_token('ann', '7', ttl=60)
+    auth.verify_token(token)
+    auth.revoke_token(token)
+    auth.revoke_user('bob')
+    clock.now += auth.TOKEN_TTL_SECONDS + auth.JWT_LEEWAY_SECONDS + 1
+    auth.revoke_token('unrelated')
+    assert list(auth._revoked_users) == []
+    assert list(auth._revoked_tokens) == [auth._token_digest('unrelated')]
+
+
+def test_cache_is_bounded(clock, monkeypatch):
+    monkeypatch.setattr(auth, 'JWT_CACHE_SIZE', 3)
+    tokens = [auth.issue_token(f'user{i}', str(i)) for i in range(5)]
+    for t in tokens:
+        auth.verify_token(t)
+    assert len(auth._token_cache) == 3
+    auth.verify_token(tokens[0])
+    assert auth.token_cache_stats == {'hits': 0, 'misses': 6}
+
+
+def test_revocations_reach_other_workers(clock, monkeypatch):
+    token = auth.issue_token('ann', '7')
+    cached_elsewhere = auth.issue_token('bob', '8')
+    assert auth.verify_token(cached_elsewhere) is not None
+    other_worker = (dict(auth._token_cache), auth._last_poll)
+
+    auth.revoke_token(token)
+    auth.revoke_user('bob')
+
+    # a worker that never saw the token checks the store on its cache miss
+    _fresh_worker(monkeypatch)
+    assert auth.verify_token(token) is None
+
+    # a worker holding a cached token drops it at its next poll
+    _fresh_worker(monkeypatch)
+    monkeypatch.setattr(auth, '_token_cache', type(auth._token_cache)(other_worker[0]))
+    monkeypatch.setattr(auth, '_last_poll', other_worker[1])
+    assert auth.verify_token(cached_elsewhere) is not None  # within the poll interval
+    clock.now += auth.JWT_REVOCATION_POLL_SECONDS
+    assert auth.verify_token(cached_elsewhere) is None
+
+
+def test_account_recreated_in_the_same_second(clock):
+    old = auth.issue_token('ann', '7')
+    clock.now += 0.25
+    auth.revoke_user('ann')
+    clock.now += 0.25
+    new = auth.issue_token('ann', '9')
+    assert int(auth.verify_token(new)['iat']) == int(auth.decode_token(old)['iat'])
+    assert auth.verify_token(old) is None
+    assert auth.verify_token(new)['user_id'] == '9'
+
+
+def test_store_failure_rejects_uncached_tokens(clock, monkeypatch):
+    def down(*args):
+        raise RuntimeError('mongo down')
+
+    token = auth.issue_token('ann', '7')
+    monkeypatch.setattr(revocation_model, 'lookup', down)
+    monkeypatch.setattr(revocation_model, 'revoked_since', down)
+    assert auth.verify_token(token) is None
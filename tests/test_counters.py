@@ -0,0 +1,81 @@
+import pytest
+
+import fakemongo
+from model import counters_model as counters
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = fakemongo.FakeDB()
+    fakemongo.use(monkeypatch, db, counters)
+    monkeypatch.setattr(counters, '_blocks', {})
+    return db
+
+
+def test_sequences_start_above_existing_data(db):
+    for did in ('3', '10', 'legacy-name', None):
+        db.decks.insert_one({'id': did})
+    assert counters.next_id(counters.DECKS) == 11
+    assert counters.next_id(counters.DECKS) == 12
+    assert db.counters.find_one({'_id': 'decks'})['seq'] == 12
+
+
+def test_empty_sequence_starts_at_one(db):
+    assert [counters.next_id('cards:1') for _ in range(3)] == [1, 2, 3]
+
+
+def test_users_never_go_below_the_profile_count(db):
+    for pid in ('1', '2', None, None, None):
+        db.profiles.insert_one({'id': pid})
+    assert counters.next_id(counters.USERS) == 6
+
+
+def test_card_sequences_are_per_deck(db):
+    db.cards.insert_many([{'deck_id': '1', 'id': '7'}, {'deck_id': '2', 'id': '40'}])
+    assert counters.next_id(counters.card_seq('1')) == 8
+    assert counters.next_id(counters.card_seq('2')) == 41
+    assert counters.next_id(counters.card_seq('3')) == 1
+
+
+def test_reserve_ids_returns_consecutive_ranges(db):
+    assert list(counters.reserve_ids('cards:1', 3)) == [1, 2, 3]
+    assert list(counters.reserve_ids('cards:1', 2)) == [4, 5]
+    assert list(counters.reserve_ids('cards:1', 0)) == [6]
+
+
+def test_blocks_are_served_locally_and_never_overlap(db, monkeypatch):
+    first = [counters.next_id('decks', block_size=5) for _ in range(3)]
+    assert first == [1, 2, 3]
+    assert db.counters.find_one({'_id': 'decks'})['seq'] == 5
+    # another worker (fresh block table) reserves the following block
+    other = counters._blocks
+    monkeypatch.setattr(counters, '_blocks', {})
+    assert counters.next_id('decks', block_size=5) == 6
+    monkeypatch.setattr(counters, '_blocks', other)
+    assert [counters.next_id('decks', block_size=5) for _ in range(3)] == [4, 5, 11]
+
+
+def test_observe_id_raises_the_floor(db):
+    counters.next_id('cards:1')
+    counters.observe_id('cards:1', '50')
+    counters.observe_id('cards:1', 20)
+    counters.observe_id('cards:1', 'not-a-number')
+    assert counters.next_id('cards:1') == 51
+
+
+def test_drop_sequence_reseeds_from_data(db):
+    counters.reserve_ids('cards:9', 10)
+    counters.drop_sequence('cards:9')
+    db.cards.insert_one({'deck_id': '9', 'id': '3'})
+    assert counters.next_id('cards:9') == 4
+
+
+def test_backfill_seeds_every_sequence_and_keeps_higher_values(db):
+    db.decks.insert_many([{'id': '4'}, {'id': '2'}])
+    db.profiles.insert_many([{'id': '1'}])
+    db.cards.insert_many([{'deck_id': '4', 'id': '12'}, {'deck_id': '4', 'id': 'x'}, {'deck_id': '2', 'id': '1'}])
+    counters.observe_id('cards:2', 30)
+    assert counters.backfill_counters() == {'decks': 4, 'users': 1, 'cards:4': 12, 'cards:2': 1}
+    assert counters.backfill_counters()['decks'] == 4
+    assert counters.next_id('cards:2') == 31
+    assert counters.next_id('cards:4') == 13
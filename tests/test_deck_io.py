@@ -0,0 +1,115 @@
+import csv
+import io
+
+import pytest
+
+from utils import deck_io
+from utils.deck_io import ImportFormatError, iter_text_lines, read_cards, write_cards
+
+BIG = 100_000
+
+
+def _cards(n):
+    for i in range(n):
+        yield {
+            'id': str(i),
+            'front': f'Frage {i}: "naïve", café?',
+            'back': f'Antwort {i} — ü, 漢字, 🚀',
+            'tags': ['t%d' % (i % 7), 'common'] if i % 3 else [],
+        }
+
+
+def _round_trip(fmt, cards, chunk_size=4096):
+    data = ''.join(write_cards(fmt, cards)).encode('utf-8')
+    return list(read_cards(fmt, iter_text_lines(io.BytesIO(data), chunk_size=chunk_size)))
+
+
+@pytest.mark.parametrize('fmt', deck_io.FORMATS)
+def test_round_trip_100k_cards(fmt):
+    out = _round_trip(fmt, _cards(BIG))
+    assert len(out) == BIG
+    for want, got in zip(_cards(BIG), out):
+        assert got == {'front': want['front'], 'back': want['back'], 'tags': want['tags']}
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5])
+def test_chunks_split_inside_multibyte_characters(chunk_size):
+    text = 'front,back\nü,漢字\n🚀,é\n'
+    lines = list(iter_text_lines(io.BytesIO(text.encode('utf-8')), chunk_size=chunk_size))
+    assert lines == ['front,back\n', 'ü,漢字\n', '🚀,é\n']
+    assert list(read_cards('csv', lines)) == [
+        {'front': 'ü', 'back': '漢字', 'tags': []},
+        {'front': '🚀', 'back': 'é', 'tags': []},
+    ]
+
+
+def test_bom_and_missing_final_newline():
+    lines = list(iter_text_lines(io.BytesIO('﻿a\tb'.encode('utf-8')), chunk_size=2))
+    assert lines == ['a\tb']
+    assert list(read_cards('anki', lines)) == [{'front': 'a', 'back': 'b', 'tags': []}]
+
+
+@pytest.mark.parametrize('lines', [
+    ['\n', 'front,back\n', 'a,b\n'],
+    ['﻿\n', '﻿front,back,tags\n', 'a,b\n'],
+    ['front , Back\n', 'a,b\n'],
+])
+def test_csv_header_is_first_non_empty_row(lines):
+    assert list(read_cards('csv', lines)) == [{'front': 'a', 'back': 'b', 'tags': []}]
+
+
+def test_csv_header_only_skipped_once():
+    assert len(list(read_cards('csv', ['a,b\n', 'front,back\n']))) == 2
+
+
+def test_csv_quoted_newlines_and_commas():
+    cards = [{'front': 'line 1\nline 2', 'back': 'a, "b"', 'tags': ['x']}]
+    assert _round_trip('csv', cards, chunk_size=3) == cards
+
+
+def test_anki_flattens_tabs_and_newlines():
+    out = _round_trip('anki', [{'front': 'a\tb', 'back': 'c\nd', 'tags': []}])
+    assert out == [{'front': 'a b', 'back': 'c<br>d', 'tags': []}]
+
+
+@pytest.mark.parametrize('fmt, lines, line', [
+    ('csv', ['front,back\n', 'a,b\n', 'only-one-column\n'], 3),
+    ('ndjson', ['{"front": "a", "back": "b"}\n', '{not json\n'], 2),
+    ('ndjson', ['\n', '["front", "back"]\n'], 2),
+    ('anki', ['#separator:tab\n', 'a\tb\n', 'no tab here\n'], 3),
+])
+def test_malformed_rows_report_their_line(fmt, lines, line):
+    with pytest.raises(ImportFormatError) as exc:
+        list(read_cards(fmt, lines))
+    assert exc.value.line == line
+
+
+def test_malformed_row_stops_after_earlier_cards():
+    cards = read_cards('ndjson', ['{"front": "a", "back": "b"}\n', 'garbage\n'])
+    assert next(cards)['front'] == 'a'
+    with pytest.raises(ImportFormatError):
+        next(cards)
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        read_cards('xml', [])
+    with pytest.raises(ValueError):
+        write_cards('xml', [])
+
+
+@pytest.mark.parametrize('name, fmt', [
+    ('deck.csv', 'csv'), ('deck.NDJSON', 'ndjson'), ('deck.jsonl', 'ndjson'),
+    ('deck.txt', 'anki'), ('deck.tsv', 'anki'), ('deck', 'csv'), (None, 'csv'),
+])
+def test_guess_format(name, fmt):
+    assert deck_io.guess_format(name) == fmt
+
+
+@pytest.mark.parametrize('data, error', [
+    (b'front,back\n\xff,b\n', UnicodeDecodeError),
+    (b'front,back\n' + b'a' * 200_000 + b',b\n', csv.Error),
+])
+def test_unreadable_input_raises_the_errors_the_import_route_catches(data, error):
+    with pytest.raises(error):
+        list(read_cards('csv', iter_text_lines(io.BytesIO(data), chunk_size=7)))
@@ -0,0 +1,80 @@
+import pytest
+
+import fakemongo
+from model import studyData_model as sd
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = fakemongo.FakeDB()
+    fakemongo.use(monkeypatch, db, sd)
+    return db
+
+
+def _deck(db, did, length, cards, **fields):
+    db.decks.insert_one({'id': did, 'name': did, 'len': length, **fields})
+    for i in range(cards):
+        db.cards.insert_one({'deck_id': did, 'id': str(i), 'front': 'f', 'back': 'b'})
+
+
+def _len(db, did):
+    return db.decks.find_one({'id': did})['len']
+
+
+def _write_card(did, cid):
+    """What add_card does: reserve a version, insert, publish with a +1 length delta."""
+    stamp = sd._reserve_version(did)
+    sd._cards_col.insert_one({'deck_id': did, 'id': cid, 'v': stamp})
+    sd._touch_deck(did, stamp, 1)
+
+
+def test_reports_and_fixes_drift(db):
+    _deck(db, 'a', 5, 3)
+    _deck(db, 'b', '2', 2)
+    _deck(db, 'c', 1, 1, version=4, version_seq=4)
+    assert sd.reconcile_deck_lengths(fix=False) == {'a': (5, 3), 'b': ('2', 2)}
+    assert _len(db, 'a') == 5
+    assert sd.reconcile_deck_lengths() == {'a': (5, 3), 'b': ('2', 2)}
+    assert (_len(db, 'a'), _len(db, 'b'), _len(db, 'c')) == (3, 2, 1)
+    deck = db.decks.find_one({'id': 'a'})
+    assert deck['version'] == deck['version_seq'] == 1
+    assert sd.reconcile_deck_lengths() == {}
+
+
+def test_card_written_after_the_count_is_not_lost(db, monkeypatch):
+    _deck(db, 'a', 9, 3, version=2, version_seq=2)
+    count = sd._cards_col.aggregate
+
+    def count_then_write(pipeline):
+        rows = list(count(pipeline))
+        _write_card('a', 'late')
+        return iter(rows)
+
+    monkeypatch.setattr(sd._cards_col, 'aggregate', count_then_write)
+    assert sd.reconcile_deck_lengths() == {'a': (9, 3)}
+    assert _len(db, 'a') == 4 == db.cards.count_documents({'deck_id': 'a'})
+
+
+def test_write_in_flight_is_left_to_publish_its_delta(db, monkeypatch):
+    _deck(db, 'a', 7, 3, version=2, version_seq=2)
+    stamp = sd._reserve_version('a')  # a writer has reserved but not published yet
+    db.cards.insert_one({'deck_id': 'a', 'id': 'new', 'v': stamp})
+    recounts = []
+    count = sd._cards_col.count_documents
+
+    def recount(flt):
+        recounts.append(flt)
+        if len(recounts) == 2:
+            sd._touch_deck('a', stamp, 1)  # the writer publishes while we retry
+        return count(flt)
+
+    monkeypatch.setattr(sd._cards_col, 'count_documents', recount)
+    sd.reconcile_deck_lengths()
+    assert _len(db, 'a') == 4 == count({'deck_id': 'a'})
+
+
+def test_gives_up_on_a_deck_that_keeps_changing(db, monkeypatch, capsys):
+    _deck(db, 'a', 7, 3, version=2, version_seq=5)
+    sd.reconcile_deck_lengths()
+    assert _len(db, 'a') == 7
+    assert 'left for the next run' in capsys.readouterr().out
@@ -0,0 +1,86 @@
+import pytest
+
+import fakemongo
+from model import counters_model, progress_model
+from model import studyData_model as sd
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = fakemongo.FakeDB()
+    fakemongo.use(monkeypatch, db, sd, progress_model, counters_model)
+    db.decks.insert_one({'id': '1', 'name': 'Deck', 'len': 2, 'owner': 'ann'})
+    db.cards.insert_many([{'deck_id': '1', 'id': str(i), 'front': f'f{i}', 'back': f'b{i}', 'v': 0} for i in range(2)])
+    return db
+
+
+def _deck(db):
+    return db.decks.find_one({'id': '1'})
+
+
+def _changed(since):
+    out = sd.get_deck_changes('1', since)
+    return out['version'], [c['id'] for c in out['cards']], out['deleted']
+
+
+def test_reserved_versions_are_unique_and_unpublished(db):
+    assert [sd._reserve_version('1') for _ in range(3)] == [1, 2, 3]
+    assert sd.get_deck_version('1')['version'] == 0
+    assert sd._reserve_version('missing') is None
+
+
+def test_touch_without_a_stamp_takes_the_next_number(db):
+    sd._reserve_version('1')
+    assert sd._touch_deck('1', fields={'name': 'Renamed'}) == 2
+    assert sd._touch_deck('1') == 3
+    deck = _deck(db)
+    assert (deck['version'], deck['version_seq'], deck['name']) == (3, 3, 'Renamed')
+    assert sd._touch_deck('missing') is None
+
+
+def test_touch_publishes_the_stamp_and_length_delta(db):
+    stamp = sd._reserve_version('1')
+    sd._cards_col.insert_one({'deck_id': '1', 'id': '2', 'v': stamp})
+    assert sd._touch_deck('1', stamp, 1, {'summary': '$not a field path'}) == stamp
+    deck = _deck(db)
+    assert (deck['version'], deck['len'], deck['summary']) == (stamp, 3, '$not a field path')
+    assert _changed(0) == (stamp, ['2'], [])
+    assert _changed(stamp) == (stamp, [], [])
+
+
+def test_out_of_order_publish_restamps_above_what_readers_hold(db):
+    a = sd._reserve_version('1')
+    b = sd._reserve_version('1')
+    # B writes and publishes first
+    sd._cards_col.update_one({'deck_id': '1', 'id': '1'}, {'$set': {'front': 'B', 'v': b}})
+    assert sd._touch_deck('1', b) == b
+    seen = sd.get_deck_version('1')['version']  # a reader syncs here
+    # A's writes land under the older stamp and publish late
+    sd._cards_col.update_one({'deck_id': '1', 'id': '0'}, {'$set': {'front': 'A', 'v': a}})
+    sd._cards_col.delete_one({'deck_id': '1', 'id': '1'})
+    sd._tombstone_cards('1', ['1'], a)
+    published = sd._touch_deck('1', a, -1)
+    assert published > seen
+    assert {c['id']: c['v'] for c in db.cards.find()} == {'0': published}
+    assert [t['v'] for t in db.card_tombstones.find()] == [published]
+    # the reader holding version `seen` still gets A's change and delete
+    assert _changed(seen) == (published, ['0'], ['1'])
+    deck = _deck(db)
+    assert (deck['len'], deck['version_seq']) == (1, published)
+
+
+def test_deck_changes_report_tombstones_once(db):
+    v1 = sd.save_deck_changes('1', deletes=['0', 'missing'])
+    v2 = sd.save_deck_changes('1', adds=[{'front': 'new', 'back': ''}], updates={'1': {'back': 'edited'}})
+    assert v2 > v1 > 0
+    assert _changed(0) == (v2, ['1', '2'], ['0'])
+    assert _changed(v1) == (v2, ['1', '2'], [])
+    cards = {c['id']: c for c in sd.get_deck_changes('1', v1)['cards']}
+    assert (cards['1']['front'], cards['1']['back']) == ('f1', 'edited')
+    # only the card that existed gets a tombstone
+    assert [t['id'] for t in db.card_tombstones.find()] == ['0']
+    assert _deck(db)['len'] == 2
+
+
+def test_deck_changes_for_a_missing_deck(db):
+    assert sd.get_deck_changes('missing', 0) is None
@@ -0,0 +1,51 @@
+import pytest
+
+import fakemongo
+from model import studyData_model as sd
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = fakemongo.FakeDB()
+    fakemongo.use(monkeypatch, db, sd)
+    monkeypatch.setattr(sd, 'DECK_INLINE_CARDS', 3)
+    db.deck_tags.insert_one({'deck_id': '1', 'tag': 'bio'})
+    return db
+
+
+def _deck(db, did, n):
+    db.decks.insert_one({'id': did, 'name': did, 'len': n})
+    # inserted out of order: both paths return cards sorted by id
+    db.cards.insert_many([{'deck_id': did, 'id': f'{i:02d}', 'front': f'f{i}', 'back': f'b{i}'} for i in reversed(range(n))])
+
+
+def _streamed(monkeypatch):
+    calls = []
+    real = sd.iter_deck_cards
+    monkeypatch.setattr(sd, 'iter_deck_cards', lambda *a, **k: calls.append(a) or real(*a, **k))
+    return calls
+
+
+@pytest.mark.parametrize('n, streams', [(0, False), (3, False), (4, True), (10, True)])
+def test_get_deck_by_id_joins_small_decks_and_streams_large_ones(db, monkeypatch, n, streams):
+    _deck(db, '1', n)
+    calls = _streamed(monkeypatch)
+    deck = sd.get_deck_by_id(1)
+    assert bool(calls) == streams
+    assert list(deck['cards']) == [f'{i:02d}' for i in range(n)]
+    assert deck['tags'] == ['bio']
+    if n:
+        assert (deck['cards']['00']['front'], deck['cards']['00']['back']) == ('f0', 'b0')
+
+
+def test_streamed_cards_honour_card_fields(db):
+    _deck(db, '1', 5)
+    deck = sd.get_deck_by_id('1', card_fields=('id', 'front'))
+    assert set(deck['cards']['04']) == {'id', 'front'}
+
+
+def test_metadata_only_reads_never_touch_cards(db, monkeypatch):
+    _deck(db, '1', 10)
+    calls = _streamed(monkeypatch)
+    deck = sd.get_deck_meta('1')
+    assert (deck['cards'], deck['len'], calls) == ({}, 10, [])
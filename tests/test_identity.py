@@ -0,0 +1,96 @@
+import pytest
+from flask import Flask, g
+
+from model import login_model
+from utils import identity
+
+
+class FakeProfiles:
+    def __init__(self, docs):
+        self.docs = docs
+        self.calls = []
+
+    def find(self, flt, projection):
+        self.calls.append((flt, projection))
+        names = flt['username']['$in']
+        return [{k: d[k] for k in projection if projection[k] and k in d} for d in self.docs if d['username'] in names]
+
+
+@pytest.fixture
+def profiles(monkeypatch):
+    col = FakeProfiles([
+        {'username': 'ann', 'profile_pic': '/a.png', 'name': 'Ann', 'email': 'ann@example.com'},
+        {'username': 'ben', 'profile_pic': None, 'name': 'Ben', 'email': 'ben@example.com'},
+    ])
+    monkeypatch.setattr(login_model, '_profiles_col', col)
+    return col
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    identity.init_app(app)
+    return app
+
+
+def test_get_users_by_usernames_is_one_projected_query(profiles):
+    out = login_model.get_users_by_usernames(['ann', 'ben', 'ann', None, 'ghost'])
+    assert out == {'ann': {'username': 'ann', 'profile_pic': '/a.png'},
+                   'ben': {'username': 'ben', 'profile_pic': None}}
+    assert len(profiles.calls) == 1
+    flt, projection = profiles.calls[0]
+    assert sorted(flt['username']['$in']) == ['ann', 'ben', 'ghost']
+    assert projection == {'username': 1, 'profile_pic': 1, '_id': 0}
+    assert login_model.get_users_by_usernames([]) == {}
+    assert len(profiles.calls) == 1
+
+
+def test_get_profiles_memoizes_within_a_request(profiles, app):
+    with app.test_request_context():
+        app.preprocess_request()
+        assert set(identity.get_profiles(['ann', 'ghost'])) == {'ann'}
+        assert set(identity.get_profiles(['ann', 'ghost', 'ben'])) == {'ann', 'ben'}
+        assert profiles.calls[-1][0] == {'username': {'$in': ['ben']}}
+        identity.get_profiles(['ann', 'ben'])
+        assert len(profiles.calls) == 2
+        # a wider field set is a miss; a narrower one is served from the memo
+        assert identity.get_profiles(['ann'], fields=('name',)) == {'ann': {'username': 'ann', 'name': 'Ann'}}
+        assert identity.get_profiles(['ben'], fields=()) == {'ben': {'username': 'ben'}}
+        assert len(profiles.calls) == 3
+        assert g.identity_stats == {'loads': 3, 'hits': 5}
+        identity.forget_identity()
+        identity.get_profiles(['ann'])
+        assert len(profiles.calls) == 4
+    with app.test_request_context():
+        identity.get_profiles(['ann'])
+        assert len(profiles.calls) == 5
+
+
+def test_get_profiles_outside_a_request(profiles):
+    assert identity.get_profiles(['ben']) == {'ben': {'username': 'ben', 'profile_pic': None}}
+
+
+def test_current_profile_is_loaded_once_without_credentials(app, monkeypatch):
+    loads = []
+
+    def fake_user(username):
+        loads.append(username)
+        return {'username': username, 'name': 'Ann', 'password_hash': '$argon2id$...', 'pepper_version': 'v1'}
+
+    monkeypatch.setattr(identity, 'get_user_by_username', fake_user)
+    with app.test_request_context():
+        app.preprocess_request()
+        assert identity.current_profile() is None
+        g.current_user = 'ann'
+        assert identity.current_profile() == {'username': 'ann', 'name': 'Ann'}
+        assert identity.current_profile() is identity.current_profile()
+        assert loads == ['ann']
+        response = app.process_response(app.response_class())
+        assert response.headers['Server-Timing'] == 'identity;desc="1 loads, 2 memo hits"'
+
+
+def test_current_profile_unknown_user(app, monkeypatch):
+    monkeypatch.setattr(identity, 'get_user_by_username', lambda username: None)
+    with app.test_request_context():
+        g.current_user = 'ghost'
+        assert identity.current_profile() is None
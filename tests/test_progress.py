@@ -0,0 +1,146 @@
+from datetime import datetime, timedelta
+
+import pytest
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+import fakemongo
+from model import progress_model, review_log_model
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = fakemongo.FakeDB(unique={'card_progress': [('user', 'deck_id', 'card_id')]})
+    fakemongo.use(monkeypatch, db, progress_model, review_log_model)
+    db.decks.insert_one({'id': '1', 'len': 3})
+    db.cards.insert_many([{'deck_id': '1', 'id': str(i), 'front': f'f{i}', 'back': f'b{i}'} for i in range(3)])
+    return db
+
+
+def _ev(card, correct, at=None):
+    ev = {'deck_id': '1', 'card_id': card, 'correct': correct}
+    if at is not None:
+        ev['reviewed_at'] = at.isoformat()
+    return ev
+
+
+def test_record_review_counts_and_logs(db):
+    out = progress_model.record_review('ann', 1, 0, True)
+    assert (out['id'], out['correct_count'], out['incorrect_count'], out['repetitions']) == ('0', 1, 0, 1)
+    out = progress_model.record_review('ann', 1, 0, False)
+    assert (out['correct_count'], out['incorrect_count'], out['repetitions']) == (1, 1, 0)
+    assert [(e['ok'], e['new']) for e in db.review_events.find()] == [(True, True), (False, False)]
+
+
+def test_record_review_of_a_missing_card_writes_nothing(db):
+    assert progress_model.record_review('ann', 1, 'nope', True) is None
+    assert db.card_progress.count_documents({}) == 0
+
+
+def test_record_review_retries_a_lost_upsert_race(db, monkeypatch):
+    real = db.card_progress.find_one_and_update
+    calls = []
+
+    def racing(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            # another request's first review lands between our match and our insert
+            db.card_progress.insert_one({'user': 'ann', 'deck_id': '1', 'card_id': '0', 'correct_count': 1, 'repetitions': 1, 'interval': 1})
+            raise DuplicateKeyError('E11000')
+        return real(*args, **kwargs)
+
+    monkeypatch.setattr(db.card_progress, 'find_one_and_update', racing)
+    out = progress_model.record_review('ann', 1, 0, True)
+    assert len(calls) == 2
+    assert (out['correct_count'], out['repetitions'], out['interval']) == (2, 2, 6)
+    assert db.card_progress.count_documents({}) == 1
+
+
+def test_record_reviews_folds_events_per_card(db):
+    results = progress_model.record_reviews('ann', [
+        _ev('0', True), _ev('1', False), _ev('0', False), _ev('9', True), _ev('0', True),
+    ])
+    assert results == [{'ok': True}, {'ok': True}, {'ok': True}, {'ok': False, 'error': 'card not found'}, {'ok': True}]
+    progress = progress_model.get_progress('ann', 1)
+    assert set(progress) == {'0', '1'}
+    assert (progress['0']['correct_count'], progress['0']['incorrect_count']) == (2, 1)
+    assert (progress['1']['correct_count'], progress['1']['incorrect_count']) == (0, 1)
+    # one log entry per applied event, and only the first review of a new card counts as new
+    logged = sorted((e['c'], e['new']) for e in db.review_events.find())
+    assert logged == [('0', False), ('0', False), ('0', True), ('1', True)]
+
+
+def test_record_reviews_only_moves_last_reviewed_forward(db):
+    recent, old = datetime.utcnow() - timedelta(hours=1), datetime.utcnow() - timedelta(days=5)
+    progress_model.record_reviews('ann', [_ev('0', True, recent)])
+    progress_model.record_reviews('ann', [_ev('0', True, old)])
+    doc = db.card_progress.find_one({'card_id': '0'})
+    assert doc['last_reviewed'] == recent
+    assert doc['correct_count'] == 2
+
+
+def test_record_reviews_replays_collided_upserts(db, monkeypatch):
+    real = db.card_progress.bulk_write
+    calls = []
+
+    def racing(ops, ordered=True):
+        calls.append(len(ops))
+        if len(calls) == 1:
+            db.card_progress.insert_one({'user': 'ann', 'deck_id': '1', 'card_id': '0', 'correct_count': 1})
+            applied = real(ops[1:], ordered=ordered)
+            raise BulkWriteError({
+                'writeErrors': [{'index': 0, 'code': 11000, 'errmsg': 'E11000'}],
+                'upserted': [{'index': i + 1, '_id': u} for i, u in applied.upserted_ids.items()],
+            })
+        return real(ops, ordered=ordered)
+
+    monkeypatch.setattr(db.card_progress, 'bulk_write', racing)
+    results = progress_model.record_reviews('ann', [_ev('0', True), _ev('1', True)])
+    assert results == [{'ok': True}, {'ok': True}]
+    assert calls == [2, 1]  # only the collided op is replayed
+    progress = progress_model.get_progress('ann', 1)
+    assert (progress['0']['correct_count'], progress['1']['correct_count']) == (2, 1)
+    # card 0 was first reviewed by the competing request
+    assert sorted((e['c'], e['new']) for e in db.review_events.find()) == [('0', False), ('1', True)]
+
+
+def test_record_reviews_raises_other_write_errors(db, monkeypatch):
+    def failing(ops, ordered=True):
+        raise BulkWriteError({'writeErrors': [{'index': 0, 'code': 121, 'errmsg': 'validation'}]})
+
+    monkeypatch.setattr(db.card_progress, 'bulk_write', failing)
+    with pytest.raises(BulkWriteError):
+        progress_model.record_reviews('ann', [_ev('0', True)])
+
+
+def test_review_logging_failures_do_not_fail_reviews(db, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError('log store down')
+
+    monkeypatch.setattr(db.review_events, 'insert_many', broken)
+    assert progress_model.record_reviews('ann', [_ev('0', True)]) == [{'ok': True}]
+    assert progress_model.record_review('ann', 1, 1, False)['incorrect_count'] == 1
+
+
+def test_progress_summary(db):
+    progress_model.record_reviews('ann', [
+        _ev('0', False), _ev('0', False), _ev('0', True),
+        _ev('1', False), _ev('2', True),
+    ])
+    summary = progress_model.progress_summary('ann', 1, top_k=1)
+    assert summary['totals'] == {'total_correct': 2, 'total_incorrect': 3, 'reviewed': 3}
+    assert summary['accuracy'] == [{'min': 0, 'cards': 1}, {'min': 0.25, 'cards': 1}, {'min': 0.75, 'cards': 1}]
+    assert summary['most_missed'] == [{'id': '0', 'correct_count': 1, 'incorrect_count': 2}]
+    for top_k in (0, -3):
+        assert progress_model.progress_summary('ann', 1, top_k=top_k)['most_missed'] == []
+    empty = progress_model.progress_summary('bob', 1)
+    assert empty['totals'] == {'total_correct': 0, 'total_incorrect': 0, 'reviewed': 0}
+
+
+def test_forget(db):
+    progress_model.record_reviews('ann', [_ev('0', True), _ev('1', True), _ev('2', True)])
+    progress_model.record_reviews('bob', [_ev('0', True)])
+    progress_model.forget_cards(1, [0])
+    assert set(progress_model.get_progress('ann', 1)) == {'1', '2'}
+    assert progress_model.get_progress('bob', 1) == {}
+    progress_model.forget_user('ann')
+    assert db.card_progress.count_documents({}) == 0
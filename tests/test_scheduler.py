@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import fakemongo
+from model import progress_model, review_log_model, scheduler
+from model.scheduler import DEFAULT_EASE, MIN_EASE, QUALITY_CORRECT, QUALITY_INCORRECT
+
+T0 = datetime(2026, 3, 1, 12, 0)
+
+
+def _review(doc, quality, at=T0):
+    return fakemongo.apply_pipeline(doc, scheduler.sm2_stages(quality, at))
+
+
+def _replay(qualities, doc=None):
+    doc = doc or {}
+    for q in qualities:
+        doc = _review(doc, q)
+    return doc
+
+
+def test_first_second_and_nth_intervals():
+    doc = _replay([QUALITY_CORRECT])
+    assert (doc['repetitions'], doc['interval'], doc['ease']) == (1, 1, DEFAULT_EASE)
+    doc = _review(doc, QUALITY_CORRECT)
+    assert (doc['repetitions'], doc['interval']) == (2, 6)
+    doc = _review(doc, QUALITY_CORRECT)
+    assert (doc['repetitions'], doc['interval']) == (3, 15)  # round(6 * 2.5)
+    doc = _review(doc, QUALITY_CORRECT)
+    assert (doc['repetitions'], doc['interval']) == (4, 38)  # round(15 * 2.5 = 37.5), half to even
+
+
+@pytest.mark.parametrize('quality, delta', [(5, 0.1), (4, 0.0), (3, -0.14), (2, -0.32), (1, -0.54), (0, -0.8)])
+def test_ease_follows_the_sm2_formula(quality, delta):
+    assert _review({}, quality)['ease'] == pytest.approx(DEFAULT_EASE + delta)
+
+
+def test_ease_never_drops_below_the_floor():
+    doc = _replay([QUALITY_INCORRECT] * 5)
+    assert doc['ease'] == MIN_EASE
+    assert _review(doc, 0)['ease'] == MIN_EASE
+
+
+def test_lapse_resets_repetitions_and_interval():
+    doc = _replay([QUALITY_CORRECT] * 3)
+    doc = _review(doc, QUALITY_INCORRECT)
+    assert (doc['repetitions'], doc['interval']) == (0, 1)
+    assert doc['ease'] == pytest.approx(DEFAULT_EASE - 0.54)
+    doc = _replay([QUALITY_CORRECT] * 3, doc)
+    assert (doc['repetitions'], doc['interval']) == (3, round(6 * (DEFAULT_EASE - 0.54)))
+
+
+def test_due_at_counts_from_the_review_time():
+    doc = _review({}, QUALITY_CORRECT, T0)
+    assert doc['due_at'] == T0 + timedelta(days=1)
+    doc = _review(doc, QUALITY_CORRECT, T0 + timedelta(hours=30))
+    assert doc['due_at'] == T0 + timedelta(hours=30, days=6)
+
+
+def test_stages_use_a_prefix_and_leave_other_fields_alone():
+    doc = fakemongo.apply_pipeline({'p': {'ease': 2.0, 'interval': 10, 'repetitions': 4}, 'other': 1},
+                                   scheduler.sm2_stages(QUALITY_CORRECT, T0, prefix='p.'))
+    assert doc['p'] == {'ease': 2.0, 'interval': 20, 'repetitions': 5, 'due_at': T0 + timedelta(days=20)}
+    assert doc['other'] == 1
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = fakemongo.FakeDB(unique={'card_progress': [('user', 'deck_id', 'card_id')]})
+    fakemongo.use(monkeypatch, db, progress_model, review_log_model)
+    db.decks.insert_one({'id': '1', 'len': 3})
+    db.cards.insert_many([{'deck_id': '1', 'id': str(i), 'front': f'f{i}', 'back': f'b{i}'} for i in range(3)])
+    return db
+
+
+def test_queued_reviews_are_scheduled_from_their_own_times(db):
+    day1, day2 = datetime.utcnow() - timedelta(days=3), datetime.utcnow() - timedelta(days=2)
+    progress_model.record_reviews('ann', [
+        # sent out of order, as an offline client might
+        {'deck_id': '1', 'card_id': '0', 'correct': True, 'reviewed_at': day2.isoformat() + 'Z'},
+        {'deck_id': '1', 'card_id': '0', 'correct': True, 'reviewed_at': day1.isoformat() + 'Z'},
+    ])
+    doc = db.card_progress.find_one({'card_id': '0'})
+    assert (doc['repetitions'], doc['interval']) == (2, 6)
+    assert doc['due_at'] == day2 + timedelta(days=6)
+    assert doc['last_reviewed'] == day2
+
+
+def test_future_review_times_are_clamped_to_the_server_clock(db):
+    before = datetime.utcnow()
+    progress_model.record_reviews('ann', [
+        {'deck_id': '1', 'card_id': '0', 'correct': True, 'reviewed_at': '2999-01-01T00:00:00Z'},
+    ])
+    doc = db.card_progress.find_one({'card_id': '0'})
+    assert before <= doc['last_reviewed'] <= datetime.utcnow()
+    assert doc['due_at'] == doc['last_reviewed'] + timedelta(days=1)
+
+
+def test_due_queue_puts_due_cards_first_then_new_ones(db):
+    past = datetime.utcnow() - timedelta(days=10)
+    progress_model.record_reviews('ann', [
+        {'deck_id': '1', 'card_id': '2', 'correct': True, 'reviewed_at': past.isoformat()},
+        {'deck_id': '1', 'card_id': '1', 'correct': True},
+    ])
+    cards = progress_model.get_due_cards('ann', '1', limit=5)
+    # card 2 was due 9 days ago, card 1 is due tomorrow, card 0 was never reviewed
+    assert [c['id'] for c in cards] == ['2', '0']
+    assert cards[0]['repetitions'] == 1 and cards[1]['repetitions'] == 0
+    assert [c['id'] for c in progress_model.get_due_cards('ann', '1', include_new=False)] == ['2']
@@ -0,0 +1,136 @@
+import pytest
+
+from model import acl_model, login_model, user_directory
+
+
+class FakeProfiles:
+    """Just enough of a pymongo collection for user_directory and login_model."""
+
+    def __init__(self, docs=()):
+        self.docs = [dict(d) for d in docs]
+        self.full_scans = 0
+
+    def _match(self, doc, flt):
+        for k, v in flt.items():
+            if isinstance(v, dict) and '$in' in v:
+                if doc.get(k) not in v['$in']:
+                    return False
+            elif doc.get(k) != v:
+                return False
+        return True
+
+    def _project(self, doc, projection):
+        if not projection:
+            return dict(doc)
+        keep = [k for k, on in projection.items() if on]
+        return {k: doc[k] for k in keep if k in doc}
+
+    def find(self, flt=None, projection=None):
+        if not flt:
+            self.full_scans += 1
+        return [self._project(d, projection) for d in self.docs if self._match(d, flt or {})]
+
+    def find_one(self, flt=None, projection=None):
+        found = self.find(flt, projection)
+        return found[0] if found else None
+
+    def insert_one(self, doc):
+        self.docs.append(dict(doc))
+
+
+NAMES = ['alice', 'Alicia', 'al', 'bob', 'Bobby', 'carol', 'zed']
+
+
+@pytest.fixture
+def profiles(monkeypatch):
+    col = FakeProfiles({'id': str(i), 'username': u, 'name': u.title(), 'password_hash': 'secret'}
+                       for i, u in enumerate(NAMES))
+    monkeypatch.setattr(user_directory, '_profiles_col', col)
+    monkeypatch.setattr(user_directory, '_state', None)
+    return col
+
+
+def _names(entries):
+    return [e['username'] for e in entries]
+
+
+def test_directory_is_sorted_cached_and_password_free(profiles):
+    entries = user_directory.get_user_directory()
+    assert _names(entries) == ['al', 'alice', 'Alicia', 'bob', 'Bobby', 'carol', 'zed']
+    assert all(set(e) == set(user_directory.DIRECTORY_FIELDS) for e in entries)
+    user_directory.get_user_directory()
+    assert profiles.full_scans == 1
+
+
+@pytest.mark.parametrize('prefix, expected', [
+    ('al', ['al', 'alice', 'Alicia']),
+    ('ALI', ['alice', 'Alicia']),
+    ('bobby', ['Bobby']),
+    ('c', ['carol']),
+    ('z', ['zed']),
+    ('zz', []),
+    ('', ['al', 'alice', 'Alicia', 'bob', 'Bobby', 'carol', 'zed']),
+])
+def test_search_prefix_bounds(profiles, prefix, expected):
+    entries, cursor = user_directory.search_users(prefix, limit=50)
+    assert _names(entries) == expected
+    assert cursor is None
+
+
+def test_search_pages_with_cursor(profiles):
+    page, cursor = user_directory.search_users('', limit=3)
+    assert _names(page) == ['al', 'alice', 'Alicia'] and cursor == 'Alicia'
+    page, cursor = user_directory.search_users('', limit=3, after=cursor)
+    assert _names(page) == ['bob', 'Bobby', 'carol'] and cursor == 'carol'
+    page, cursor = user_directory.search_users('', limit=3, after=cursor)
+    assert _names(page) == ['zed'] and cursor is None
+
+
+def test_search_cursor_stays_inside_prefix(profiles):
+    page, cursor = user_directory.search_users('al', limit=2)
+    assert _names(page) == ['al', 'alice'] and cursor == 'alice'
+    page, cursor = user_directory.search_users('al', limit=2, after=cursor)
+    assert _names(page) == ['Alicia'] and cursor is None
+
+
+def test_search_exact_page_reports_no_cursor(profiles):
+    page, cursor = user_directory.search_users('b', limit=2)
+    assert _names(page) == ['bob', 'Bobby'] and cursor is None
+
+
+def test_search_exclude_and_limit_cap(profiles):
+    page, _ = user_directory.search_users('al', exclude={'alice'})
+    assert _names(page) == ['al', 'Alicia']
+    profiles.docs = [{'username': 'u%03d' % i} for i in range(200)]
+    user_directory.invalidate()
+    page, cursor = user_directory.search_users('u', limit=1000)
+    assert len(page) == user_directory.SEARCH_LIMIT_MAX and cursor == page[-1]['username']
+    page, _ = user_directory.search_users('u', limit=0)
+    assert len(page) == 1
+
+
+def test_invalidate_refreshes_and_removes_one_entry(profiles):
+    user_directory.get_user_directory()
+    profiles.docs[0]['profile_pic'] = '/static/alice.png'
+    user_directory.invalidate('alice')
+    assert user_directory.get_entry('alice')['profile_pic'] == '/static/alice.png'
+    profiles.docs = [d for d in profiles.docs if d['username'] != 'bob']
+    user_directory.invalidate('bob')
+    assert user_directory.get_entry('bob') is None
+    assert 'bob' not in _names(user_directory.get_user_directory())
+    assert profiles.full_scans == 1
+
+
+def test_create_user_appears_without_reload(profiles, monkeypatch):
+    monkeypatch.setattr(login_model, '_profiles_col', profiles)
+    monkeypatch.setattr(login_model, '_auth_col', FakeProfiles())
+    monkeypatch.setattr(login_model, 'next_id', lambda name: 99)
+    bumped = []
+    monkeypatch.setattr(acl_model, '_bump', bumped.extend)
+    assert user_directory.get_entry('Beatrix') is None
+    assert login_model.create_user('Beatrix', 'b@example.com', 'hash', 'v1', 'Bea')
+    assert user_directory.get_entry('Beatrix') == {'id': '99', 'username': 'Beatrix', 'name': 'Bea', 'profile_pic': None}
+    assert _names(user_directory.search_users('bea')[0]) == ['Beatrix']
+    assert _names(user_directory.get_user_directory())[3] == 'Beatrix'
+    assert profiles.full_scans == 1
+    assert bumped == ['Beatrix']  # other workers drop any ACL cached for the name
@@ -3,8 +3,12 @@ Authentication utilities including JWT token management and decorators.
 """
 
 from flask import request, redirect, url_for, session, jsonify
+from collections import OrderedDict
 from functools import wraps
+import hashlib
 import os
+import threading
+import time
 
 from jwt import JWT
 from jwt.jwk import OctetJWK
@@ -14,6 +18,8 @@ from argon2 import PasswordHasher, exceptions as argon2_exceptions
 from dotenv import load_dotenv
 import secrets
 
+from model import revocation_model
+
 # Load .env when in development
 load_dotenv()
 load_dotenv('dev.env')
@@ -22,10 +28,214 @@ load_dotenv('dev.env')
 JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'RANDOMSECRET_KEY_CHANGE_ME')
 JWT_ALGORITHM = 'HS256'
 
-# Prepare reusable JWT instance and symmetric key
+# Prepare reusable JWT instance and symmetric key (the one shared verifier)
 _jwt = JWT()
 _jwk_key = OctetJWK(JWT_SECRET_KEY.encode())
 
+# Lifetime of tokens issued at login
+TOKEN_TTL_SECONDS = 24 * 60 * 60
+# Tolerated clock difference between the worker that issued a token and the one checking it
+JWT_LEEWAY_SECONDS = int(os.environ.get('JWT_LEEWAY_SECONDS', '30'))
+# Verified tokens remembered per process (least recently used are evicted first)
+JWT_CACHE_SIZE = int(os.environ.get('JWT_CACHE_SIZE', '4096'))
+# Upper bound on how long a token without `exp` stays cached
+JWT_CACHE_MAX_AGE = 300
+# How often a worker pulls revocations made by other workers (bounds how long
+# a cached token survives a logout elsewhere)
+JWT_REVOCATION_POLL_SECONDS = float(os.environ.get('JWT_REVOCATION_POLL_SECONDS', '1'))
+
+# digest -> (claims, valid until); only successfully verified tokens are stored
+_token_cache = OrderedDict()
+# Local mirror of revocation_model: digest -> revoked until; username -> (revoked at, until)
+_revoked_tokens = {}
+_revoked_users = {}
+_last_poll = 0.0
+_token_lock = threading.Lock()
+token_cache_stats = {'hits': 0, 'misses': 0}
+
+
+def _token_digest(token) -> bytes:
+    if isinstance(token, str):
+        token = token.encode()
+    return hashlib.sha256(token).digest()
+
+
+def _revoked(digest: bytes, claims: dict) -> bool:
+    if digest in _revoked_tokens:
+        return True
+    entry = _revoked_users.get(claims.get('username'))
+    # tokens issued before an account was deleted stay dead (old tokens carry no iat)
+    return bool(entry) and claims.get('iat', 0) <= entry[0]
+
+
+def _remember(revocation: dict) -> None:
+    """Merge one revocation_model entry into the local mirror and drop what it kills (lock held)."""
+    kind, key, until = revocation['kind'], revocation['key'], revocation['until']
+    if kind == 'token':
+        digest = bytes.fromhex(key)
+        _revoked_tokens[digest] = max(until, _revoked_tokens.get(digest, 0))
+        _token_cache.pop(digest, None)
+    elif kind == 'user':
+        at = revocation['at']
+        previous = _revoked_users.get(key)
+        if previous is None or previous[0] < at:
+            _revoked_users[key] = (at, until)
+        for digest in [d for d, (claims, _) in _token_cache.items() if claims.get('username') == key and claims.get('iat', 0) <= at]:
+            del _token_cache[digest]
+
+
+def _poll_revocations(now: float) -> None:
+    """Pull revocations written by any worker since the last poll (at most once per interval).
+
+    The window reaches back JWT_LEEWAY_SECONDS further, to cover clock
+    differences between workers.
+    """
+    global _last_poll
+    with _token_lock:
+        if now - _last_poll < JWT_REVOCATION_POLL_SECONDS:
+            return
+        since, _last_poll = _last_poll, now
+    try:
+        found = revocation_model.revoked_since(max(0.0, since - JWT_LEEWAY_SECONDS))
+    except Exception as e:
+        print(f"verify_token: could not poll revocations: {e}")
+        return
+    with _token_lock:
+        for revocation in found:
+            _remember(revocation)
+
+
+def _purge_revocations(now: float) -> None:
+    for d in [d for d, until in _revoked_tokens.items() if until < now]:
+        del _revoked_tokens[d]
+    for u in [u for u, (_, until) in _revoked_users.items() if until < now]:
+        del _revoked_users[u]
+
+
+def issue_token(username: str, user_id, ttl: int = TOKEN_TTL_SECONDS) -> str:
+    """Sign a login token for `username` that expires after `ttl` seconds."""
+    now = time.time()
+    # fractional `iat`, so a token issued right after `revoke_user` (an
+    # account re-created within the same second) is not caught by it
+    payload = {'username': username, 'user_id': user_id, 'iat': now, 'exp': int(now) + ttl}
+    return _jwt.encode(payload, _jwk_key, alg=JWT_ALGORITHM)
+
+
+def decode_token(token):
+    """Return the token's claims if its signature and exp/nbf (with leeway) check out, else None.
+
+    This is the full, uncached verification; it does not consult the
+    verified-token cache or revocations.  Use `verify_token` in requests.
+    """
+    try:
+        # exp/nbf are checked below with leeway instead of python-jwt's exact check
+        claims = _jwt.decode(token, _jwk_key, do_verify=True, algorithms={JWT_ALGORITHM}, do_time_check=False)
+    except (JWTDecodeError, ValueError):
+        return None
+    now = time.time()
+    exp = claims.get('exp')
+    if exp is not None and now > exp + JWT_LEEWAY_SECONDS:
+        return None
+    nbf = claims.get('nbf')
+    if nbf is not None and now < nbf - JWT_LEEWAY_SECONDS:
+        return None
+    return claims
+
+
+def verify_token(token):
+    """Return the token's claims if it is genuine, unexpired and not revoked, else None.
+
+    Verified tokens are cached (bounded LRU keyed by a SHA-256 digest of the
+    token) until `exp` + JWT_LEEWAY_SECONDS, so repeat requests skip the
+    signature check.  The expiry rule is the same for cached and fresh
+    verifications.
+
+    Revocations live in revocation_model so they reach every worker: a
+    cache miss looks the token and its user up there, and cached tokens
+    see other workers' revocations within JWT_REVOCATION_POLL_SECONDS.
+    """
+    if not token:
+        return None
+    now = time.time()
+    _poll_revocations(now)
+    digest = _token_digest(token)
+    with _token_lock:
+        entry = _token_cache.get(digest)
+        if entry is not None:
+            claims, valid_until = entry
+            if now <= valid_until and not _revoked(digest, claims):
+                _token_cache.move_to_end(digest)
+                token_cache_stats['hits'] += 1
+                return dict(claims)
+            del _token_cache[digest]
+        token_cache_stats['misses'] += 1
+
+    claims = decode_token(token)
+    if claims is None:
+        return None
+    try:
+        stored = revocation_model.lookup(digest.hex(), claims.get('username'))
+    except Exception as e:
+        print(f"verify_token: could not check revocations: {e}")
+        return None
+
+    exp = claims.get('exp')
+    with _token_lock:
+        for revocation in stored:
+            _remember(revocation)
+        if _revoked(digest, claims):
+            return None
+        valid_until = exp + JWT_LEEWAY_SECONDS if exp is not None else now + JWT_CACHE_MAX_AGE
+        _token_cache[digest] = (claims, valid_until)
+        _token_cache.move_to_end(digest)
+        while len(_token_cache) > JWT_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+    return dict(claims)
+
+
+def revoke_token(token) -> None:
+    """Reject `token` from now on, in every worker (logout)."""
+    if not token:
+        return
+    now = time.time()
+    digest = _token_digest(token)
+    with _token_lock:
+        entry = _token_cache.get(digest)
+        until = entry[1] if entry else now + TOKEN_TTL_SECONDS + JWT_LEEWAY_SECONDS
+        _remember({'kind': 'token', 'key': digest.hex(), 'at': now, 'until': until})
+        _purge_revocations(now)
+    try:
+        revocation_model.revoke_token(digest.hex(), until)
+    except Exception as e:
+        print(f"revoke_token: could not store revocation: {e}")
+
+
+def revoke_user(username: str) -> None:
+    """Reject every token issued to `username` so far, in every worker (account deletion)."""
+    if not username:
+        return
+    now = time.time()
+    until = now + TOKEN_TTL_SECONDS + JWT_LEEWAY_SECONDS
+    with _token_lock:
+        _remember({'kind': 'user', 'key': username, 'at': now, 'until': until})
+        _purge_revocations(now)
+    try:
+        revocation_model.revoke_user(username, now, until)
+    except Exception as e:
+        print(f"revoke_user: could not store revocation: {e}")
+
+
+def _request_token():
+    """Return (token, error) from the session or a `Bearer` Authorization header."""
+    if 'token' in session:
+        return session['token'], None
+    if 'Authorization' in request.headers:
+        try:
+            return request.headers['Authorization'].split(' ')[1], None  # Bearer <token>
+        except IndexError:
+            return None, 'Invalid token format'
+    return None, None
+
 
 def token_required(f):
     """
@@ -33,32 +243,19 @@ def token_required(f):
     """
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        
-        # Check for token in session first
-        if 'token' in session:
-            token = session['token']
-        # Also check for token in Authorization header
-        elif 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            try:
-                token = auth_header.split(' ')[1]  # Bearer <token>
-            except IndexError:
-                return jsonify({'message': 'Invalid token format'}), 401
-        
+        token, error = _request_token()
+        if error:
+            return jsonify({'message': error}), 401
         if not token:
             return redirect(url_for('auth.login'))
-        
-        try:
-            # Decode and verify the token using python-jwt's JWT instance and OctetJWK key
-            data = _jwt.decode(token, _jwk_key, do_verify=True, algorithms={JWT_ALGORITHM})
-            current_user = data.get('username')
-        except JWTDecodeError:
-            # Covers expired or otherwise invalid tokens
+
+        claims = verify_token(token)
+        if claims is None:
+            # Covers expired, revoked or otherwise invalid tokens
             session.pop('token', None)
             return redirect(url_for('auth.login'))
-        
-        return f(current_user, *args, **kwargs)
+
+        return f(claims.get('username'), *args, **kwargs)
     
     return decorated
 
@@ -69,31 +266,16 @@ def get_current_user_from_token():
     Mirrors the logic used in the `token_required` decorator but returns the username
     (or redirects to login on failure).
     """
-    token = None
-
-    # Check for token in session first
-    from flask import session, request, redirect, url_for
-
-    if 'token' in session:
-        token = session['token']
-    elif 'Authorization' in request.headers:
-        auth_header = request.headers['Authorization']
-        try:
-            token = auth_header.split(' ')[1]
-        except IndexError:
-            return redirect(url_for('auth.login'))
-
-    if not token:
+    token, error = _request_token()
+    if error or not token:
         return redirect(url_for('auth.login'))
 
-    try:
-        data = _jwt.decode(token, _jwk_key, do_verify=True, algorithms={JWT_ALGORITHM})
-        current_user = data.get('username')
-    except JWTDecodeError:
+    claims = verify_token(token)
+    if claims is None:
         session.pop('token', None)
         return redirect(url_for('auth.login'))
 
-    return current_user
+    return claims.get('username')
 
 # PASWORD HASHING UTILITIES
 # Argon2 password hasher instance
@@ -0,0 +1,199 @@
+"""
+Streaming readers and writers for deck import/export formats.
+
+Supported formats:
+- csv:    front,back[,tags] with an optional header row
+- ndjson: one JSON object per line: {"front": ..., "back": ..., "tags": [...]}
+- anki:   Anki-style tab-separated text (front<TAB>back[<TAB>tags]); `#` lines are headers
+
+Readers consume an iterable of text lines and yield card dicts one at a
+time; writers take an iterable of cards and yield text chunks.  Neither
+side ever holds a whole deck in memory.
+"""
+
+import codecs
+import csv
+import io
+import json
+
+FORMATS = ('csv', 'ndjson', 'anki')
+
+MIMETYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'anki': 'text/tab-separated-values',
+}
+
+EXTENSIONS = {
+    'csv': 'csv',
+    'ndjson': 'ndjson',
+    'anki': 'txt',
+}
+
+# cards per chunk yielded by the writers
+WRITE_CHUNK = 500
+
+
+class ImportFormatError(ValueError):
+    """Raised when an input line cannot be parsed; `line` is 1-based."""
+
+    def __init__(self, line, message):
+        super().__init__(f'line {line}: {message}')
+        self.line = line
+
+
+def guess_format(filename, default='csv'):
+    """Pick a format from a file name's extension."""
+    name = (filename or '').lower()
+    if name.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    if name.endswith(('.tsv', '.txt')):
+        return 'anki'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def iter_text_lines(stream, chunk_size=64 * 1024):
+    """Decode a binary stream as UTF-8 (BOM tolerated) and yield lines with their endings."""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    pending = ''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        pending += decoder.decode(chunk)
+        parts = pending.split('\n')
+        pending = parts.pop()
+        for part in parts:
+            yield part + '\n'
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+def _split_tags(value):
+    if not value:
+        return []
+    if isinstance(value, list):
+        return [str(t) for t in value if t]
+    return [t for t in str(value).replace(';', ' ').split() if t]
+
+
+def _bare(cell):
+    return cell.replace('\ufeff', '').strip()
+
+
+def _read_csv(lines):
+    reader = csv.reader(lines)
+    first = True
+    for row in reader:
+        if not row or not any(_bare(cell) for cell in row):
+            continue
+        # the header, if any, is the first non-empty row (a stray BOM may precede it)
+        header = first and [_bare(c).lower() for c in row[:2]] == ['front', 'back']
+        first = False
+        if header:
+            continue
+        if len(row) < 2:
+            raise ImportFormatError(reader.line_num, 'expected at least two columns (front, back)')
+        yield {'front': row[0], 'back': row[1], 'tags': _split_tags(row[2] if len(row) > 2 else '')}
+
+
+def _read_ndjson(lines):
+    for n, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            obj = json.loads(line)
+        except ValueError as e:
+            raise ImportFormatError(n, f'invalid JSON ({e})')
+        if not isinstance(obj, dict):
+            raise ImportFormatError(n, 'expected a JSON object')
+        yield {'front': obj.get('front'), 'back': obj.get('back'), 'tags': _split_tags(obj.get('tags'))}
+
+
+def _read_anki(lines):
+    for n, line in enumerate(lines, 1):
+        line = line.rstrip('\r\n')
+        if not line.strip() or line.startswith('#'):
+            continue
+        cols = line.split('\t')
+        if len(cols) < 2:
+            raise ImportFormatError(n, 'expected tab-separated front and back')
+        yield {'front': cols[0], 'back': cols[1], 'tags': _split_tags(cols[2] if len(cols) > 2 else '')}
+
+
+_READERS = {'csv': _read_csv, 'ndjson': _read_ndjson, 'anki': _read_anki}
+
+
+def read_cards(fmt, lines):
+    """Yield {'front', 'back', 'tags'} dicts parsed lazily from `lines`."""
+    if fmt not in _READERS:
+        raise ValueError(f'unsupported format: {fmt}')
+    return _READERS[fmt](lines)
+
+
+def _chunks(cards, render):
+    buf = []
+    for card in cards:
+        buf.append(render(card))
+        if len(buf) >= WRITE_CHUNK:
+            yield ''.join(buf)
+            buf = []
+    if buf:
+        yield ''.join(buf)
+
+
+def _write_csv(cards):
+    out = io.StringIO()
+    writer = csv.writer(out)
+
+    def render(card):
+        out.seek(0)
+        out.truncate()
+        writer.writerow([card.get('front') or '', card.get('back') or '', ' '.join(card.get('tags') or [])])
+        return out.getvalue()
+
+    yield 'front,back,tags\r\n'
+    yield from _chunks(cards, render)
+
+
+def _write_ndjson(cards):
+    def render(card):
+        return json.dumps({
+            'id': card.get('id'),
+            'front': card.get('front'),
+            'back': card.get('back'),
+            'tags': card.get('tags') or [],
+        }, ensure_ascii=False) + '\n'
+
+    yield from _chunks(cards, render)
+
+
+def _anki_field(value):
+    # the format has no quoting: keep each card on one line
+    return str(value or '').replace('\t', ' ').replace('\r\n', '<br>').replace('\n', '<br>')
+
+
+def _write_anki(cards):
+    def render(card):
+        return '\t'.join([
+            _anki_field(card.get('front')),
+            _anki_field(card.get('back')),
+            ' '.join(card.get('tags') or []),
+        ]) + '\n'
+
+    yield '#separator:tab\n#html:true\n#tags column:3\n'
+    yield from _chunks(cards, render)
+
+
+_WRITERS = {'csv': _write_csv, 'ndjson': _write_ndjson, 'anki': _write_anki}
+
+
+def write_cards(fmt, cards):
+    """Yield text chunks serializing `cards` in `fmt`."""
+    if fmt not in _WRITERS:
+        raise ValueError(f'unsupported format: {fmt}')
+    return _WRITERS[fmt](cards)
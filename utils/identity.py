@@ -0,0 +1,153 @@
+"""Request-scoped identity context for the signed-in user.
+
+Blueprints still authenticate in their own ``before_request`` hooks and set
+``g.current_user``; everything derived from that username (profile, study
+data, ACL, per-deck permission checks) is loaded lazily on first access
+and memoized on ``g`` for the rest of the request, so views, decorators and
+templates share one load each.
+
+`get_profiles` memoizes batched profile lookups for other users (feed
+authors, commenters) the same way.
+
+Per request, ``g.identity_stats`` counts loads and memo hits.  `init_app`
+sends the counts back in the ``Server-Timing`` header next to the DB
+totals, and it exposes `current_profile`, `current_study_data` and
+`current_permissions` to templates.
+"""
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from flask import g, has_request_context
+
+from model.acl_model import can_edit
+from model.login_model import get_user_by_username, get_users_by_usernames
+from model.studyData_model import get_user_permissions, get_user_study_data
+
+
+def _new_stats() -> Dict[str, int]:
+    return {'loads': 0, 'hits': 0}
+
+
+def get_identity_stats() -> Optional[Dict[str, int]]:
+    """Return the current request's load/memo-hit counters, or None outside a request."""
+    if not has_request_context():
+        return None
+    stats = g.get('identity_stats')
+    if stats is None:
+        stats = g.identity_stats = _new_stats()
+    return stats
+
+
+def _memo(key, loader: Callable[[str], Any]) -> Any:
+    username = g.get('current_user')
+    if not username:
+        return None
+    memo = g.get('identity')
+    if memo is None or memo.get('username') != username:
+        # first access, or the request switched users (login/signup)
+        memo = g.identity = {'username': username, 'values': {}}
+    stats = get_identity_stats()
+    if key in memo['values']:
+        stats['hits'] += 1
+        return memo['values'][key]
+    stats['loads'] += 1
+    value = memo['values'][key] = loader(username)
+    return value
+
+
+# Credential fields get_user_by_username carries for login checks only.
+_AUTH_FIELDS = ('password_hash', 'pepper_version')
+
+
+def _load_profile(username: str) -> Optional[Dict]:
+    doc = get_user_by_username(username)
+    if doc is None:
+        return None
+    return {k: v for k, v in doc.items() if k not in _AUTH_FIELDS}
+
+
+def current_profile() -> Optional[Dict]:
+    """The current user's profile (login_model.get_user_by_username), without credentials.
+
+    The memo is shared with templates and views, so the password hash and
+    pepper version are never kept in it.
+    """
+    return _memo('profile', _load_profile)
+
+
+def current_study_data() -> Optional[Dict]:
+    """The current user's study data (studyData_model.get_user_study_data)."""
+    return _memo('study_data', get_user_study_data)
+
+
+def current_permissions():
+    """The current user's owner/editor/reviewer deck lists."""
+    return _memo('permissions', get_user_permissions)
+
+
+def can_edit_deck(deck_id) -> bool:
+    """Whether the current user may edit `deck_id` (memoized per deck)."""
+    return bool(_memo(('edit', str(deck_id)), lambda u: can_edit(u, deck_id)))
+
+
+def get_profiles(usernames: Iterable[str], fields: Iterable[str] = ('profile_pic',)) -> Dict[str, Dict]:
+    """{username: profile} via login_model.get_users_by_usernames, memoized per request.
+
+    Users already fetched in this request with a superset of `fields`
+    (misses included) are answered from the memo; the rest take one query.
+    """
+    wanted = frozenset(fields) | {'username'}
+    names = {u for u in usernames if u}
+    if not has_request_context():
+        return get_users_by_usernames(names, wanted)
+    memo = g.get('profile_memo')
+    if memo is None:
+        memo = g.profile_memo = {}
+    stats = get_identity_stats()
+    out, missing = {}, []
+    for name in names:
+        hit = memo.get(name)
+        if hit is not None and wanted <= hit[0]:
+            stats['hits'] += 1
+            if hit[1] is not None:
+                out[name] = {f: hit[1].get(f) for f in wanted}
+        else:
+            missing.append(name)
+    if missing:
+        stats['loads'] += 1
+        found = get_users_by_usernames(missing, wanted)
+        for name in missing:
+            memo[name] = (wanted, found.get(name))
+        out.update(found)
+    return out
+
+
+def forget_identity() -> None:
+    """Drop everything memoized for this request (call after changing the user's data)."""
+    if has_request_context():
+        g.pop('identity', None)
+        g.pop('profile_memo', None)
+
+
+def init_app(app) -> None:
+    """Reset counters per request, report them, and expose the accessors to templates."""
+
+    @app.before_request
+    def _reset_identity():
+        g.identity_stats = _new_stats()
+
+    @app.after_request
+    def _identity_timing(response):
+        stats = g.get('identity_stats')
+        if stats and (stats['loads'] or stats['hits']):
+            entry = f'identity;desc="{stats["loads"]} loads, {stats["hits"]} memo hits"'
+            existing = response.headers.get('Server-Timing')
+            response.headers['Server-Timing'] = f'{existing}, {entry}' if existing else entry
+        return response
+
+    @app.context_processor
+    def _identity_helpers():
+        return {
+            'current_profile': current_profile,
+            'current_study_data': current_study_data,
+            'current_permissions': current_permissions,
+        }